@@ -0,0 +1,11 @@
+#!/bin/bash
+#SBATCH --time=12:00:00
+#SBATCH --cpus-per-task=4
+#SBATCH --partition=owner_fb12
+#SBATCH --mem-per-cpu=8G
+
+# CPU-only retrieval benchmarks over synthetic crawls (1k to 1M pages).
+# Pass extra arguments to override defaults, e.g. `--sizes 1000 10000`.
+pdm run python src/marcel/benchmark.py \
+    --out_path output/benchmarks/ \
+    "$@"
@@ -12,4 +12,5 @@ pdm run python src/marcel/retrievers.py \
     --retrievers bm25 dense \
     --join_weights 1 1 \
     --embedding_model all-MiniLM-L6-v2 \
-    --embedding_similarity_function cosine
+    --embedding_similarity_function cosine \
+    --embedding_workers ${SLURM_CPUS_PER_TASK:-1}
@@ -12,4 +12,5 @@ pdm run python src/marcel/retrievers.py \
     --retrievers bm25 dense \
     --join_weights 1 1 \
     --embedding_model sentence-transformers/msmarco-bert-base-dot-v5 \
-    --embedding_similarity_function dot_product
+    --embedding_similarity_function dot_product \
+    --embedding_workers ${SLURM_CPUS_PER_TASK:-1}
@@ -0,0 +1,24 @@
+#!/bin/bash
+#SBATCH --time=01:00:00
+#SBATCH --cpus-per-task=4
+#SBATCH --gres=gpu:a100_80gb:1
+#SBATCH --partition=owner_fb12
+#SBATCH --mem-per-cpu=4G
+#SBATCH --array=0-3
+
+# Merge after all array tasks have finished:
+# pdm run python src/marcel/merge_shards.py --run_path output/20250317-email/bm25_dense_rerank/
+
+RUN_ID=bm25_dense_rerank
+pdm run python src/marcel/retrievers.py \
+    --data_path data/crawls/20250317/data.jsonl \
+    --query_path data/queries/20250317-email.json \
+    --out_path output/20250317-email/$RUN_ID/ \
+    --shard_index $SLURM_ARRAY_TASK_ID \
+    --shard_count $SLURM_ARRAY_TASK_COUNT \
+    --retrievers bm25 dense \
+    --join_weights 1 1 \
+    --embedding_model sentence-transformers/msmarco-bert-base-dot-v5 \
+    --embedding_similarity_function dot_product \
+    --use_reranker \
+    --reranker_model mixedbread-ai/mxbai-rerank-base-v1
@@ -16,4 +16,6 @@ pdm run python src/marcel/retrievers.py \
     --embedding_model sentence-transformers/msmarco-bert-base-dot-v5 \
     --embedding_similarity_function dot_product \
     --use_reranker \
-    --reranker_model $2
+    --reranker_model $2 \
+    --reranker_batch_size 64 \
+    --reranker_cache_path cache/reranker_scores.sqlite
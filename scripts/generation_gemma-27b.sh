@@ -23,4 +23,5 @@ pdm run python src/marcel/retrievers.py \
     --generation_model $VLLM_MODEL \
     --generation_temperature 0.7 \
     --no-skip-without-sources \
-    --top_k 5
+    --top_k 5 \
+    --retrieval_cache_path cache/first_stage.sqlite
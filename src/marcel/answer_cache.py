@@ -0,0 +1,137 @@
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from haystack import Document, component, default_to_dict
+from haystack.dataclasses import ChatMessage
+
+from marcel.cache import SQLiteCache
+from marcel.data_loader import fingerprint
+
+
+def used_tokens(replies: List[ChatMessage]) -> int:
+    """Prompt and completion tokens reported by the OpenAI API for `replies`."""
+    return sum(reply.meta.get("usage", {}).get("total_tokens", 0) for reply in replies)
+
+
+@component
+class SemanticAnswerCache:
+    """Generator which reuses the answer to a previously answered paraphrase.
+
+    A question is answered from the cache if it has the same retrieved sources
+    (page URLs) as an earlier question and their embeddings have a cosine
+    similarity of at least `threshold`. Otherwise, `generator` is called and the
+    answer is stored. Entries are keyed by the corpus fingerprint, the generator
+    configuration, the system prompt and the sources, so a new crawl or another
+    generator invalidates them. Every question is stored in its own row, so
+    processes sharing `cache_path` do not overwrite each other's entries.
+    """
+
+    def __init__(
+        self,
+        generator,
+        embedder,
+        cache_path: Optional[str] = None,
+        threshold: float = 0.95,
+        corpus_fingerprint: str = "",
+    ):
+        self.generator = generator
+        self.embedder = embedder
+        self.cache_path = cache_path
+        self.threshold = threshold
+        self.corpus_fingerprint = corpus_fingerprint
+        self.cache = SQLiteCache(cache_path, table="answers")
+        self.generator_fingerprint = fingerprint(generator.to_dict())
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def _key(self, messages: List[ChatMessage], documents: List[Document]) -> str:
+        system_prompt = [m.text for m in messages if m.is_from("system")]
+        sources = sorted({doc.meta.get("url", doc.id) for doc in documents})
+        return fingerprint(
+            [
+                self.corpus_fingerprint,
+                self.generator_fingerprint,
+                system_prompt,
+                sources,
+            ]
+        )
+
+    def _embed(self, question: str) -> np.ndarray:
+        embedding = np.array(self.embedder.run(text=question)["embedding"])
+        return embedding / (np.linalg.norm(embedding) or 1)
+
+    @component.output_types(replies=List[ChatMessage])
+    def run(
+        self, messages: List[ChatMessage], question: str, documents: List[Document]
+    ):
+        key = self._key(messages, documents)
+        embedding = self._embed(question)
+
+        entries = list(self.cache.get_prefix(key + ":").values())
+        if entries:
+            similarities = (
+                np.array([entry["embedding"] for entry in entries]) @ embedding
+            )
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold:
+                entry = entries[best]
+                with self.lock:
+                    self.hits += 1
+                    self.saved_tokens += entry["tokens"]
+                    self.similarities.append(float(similarities[best]))
+                replies = [ChatMessage.from_dict(reply) for reply in entry["replies"]]
+                return {"replies": replies}
+
+        replies = self.generator.run(messages=messages)["replies"]
+        with self.lock:
+            self.misses += 1
+        self.cache.put(
+            f"{key}:{fingerprint(question)}",
+            {
+                "question": question,
+                "embedding": embedding.tolist(),
+                "replies": [reply.to_dict() for reply in replies],
+                "tokens": used_tokens(replies),
+            },
+        )
+        return {"replies": replies}
+
+    def warm_up(self):
+        self.embedder.warm_up()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.saved_tokens = 0
+        self.similarities: List[float] = []
+        for nested in [self.generator, self.embedder]:
+            if callable(getattr(nested, "reset_stats", None)):
+                nested.reset_stats()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        stats = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else None,
+            "saved_tokens": self.saved_tokens,
+            "mean_hit_similarity": (
+                float(np.mean(self.similarities)) if self.similarities else None
+            ),
+        }
+        # E.g., samples drawn by an adaptive generator (on cache misses).
+        generator_stats = getattr(self.generator, "stats", None)
+        if callable(generator_stats) and generator_stats():
+            stats["generator"] = generator_stats()
+        return stats
+
+    def to_dict(self) -> Dict[str, Any]:
+        return default_to_dict(
+            self,
+            generator=self.generator.to_dict(),
+            embedder=self.embedder.to_dict(),
+            cache_path=self.cache_path,
+            threshold=self.threshold,
+            corpus_fingerprint=self.corpus_fingerprint,
+        )
@@ -0,0 +1,542 @@
+"""Offline performance benchmarks for the retrieval stack.
+
+Measures the startup time of `retrievers.py`, then generates (or reads) a crawl
+in the `data.jsonl` format and measures document loading, the link normalizer,
+the joiner and every retriever configuration of `retrievers.py` (indexing time,
+per-query latency percentiles, QPS, peak RSS).
+Results are written as JSON so that runs can be compared across commits.
+
+Example:
+
+    python src/marcel/benchmark.py --sizes 1000 10000 --out_path output/benchmarks/
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from marcel.memory import peak_rss_mb
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIGS = ["bm25", "oracle", "bm25 dense", "bm25 faq"]
+
+SYLLABLES = (
+    "ma ru bur stu di en pro fung an mel dung kurs se mes ter lo ga ti ve no".split()
+)
+
+
+def synthetic_vocabulary(size: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    vocabulary = set()
+    while len(vocabulary) < size:
+        vocabulary.add("".join(rng.choices(SYLLABLES, k=rng.randint(1, 4))))
+    vocabulary = sorted(vocabulary)
+    rng.shuffle(vocabulary)  # decouple word frequency rank from spelling
+    return vocabulary
+
+
+class SyntheticCrawl:
+    """Deterministic generator of crawl records resembling `data/crawls/*/data.jsonl`.
+
+    Word frequencies follow a Zipf distribution and page lengths a log-normal
+    distribution, so that BM25 statistics and embedding padding behave roughly
+    like on the real crawl.
+    """
+
+    def __init__(
+        self,
+        vocabulary_size: int = 20000,
+        mean_words: float = 400,
+        sigma_words: float = 0.8,
+        seed: int = 0,
+    ):
+        self.vocabulary = synthetic_vocabulary(vocabulary_size, seed=seed)
+        self.mean_words = mean_words
+        self.sigma_words = sigma_words
+        self.seed = seed
+
+        ranks = np.arange(1, vocabulary_size + 1)
+        weights = 1 / ranks**1.1
+        self.cum_weights = np.cumsum(weights / weights.sum())
+
+    def _words(self, rng: np.random.Generator, n: int) -> List[str]:
+        indices = np.searchsorted(self.cum_weights, rng.random(n))
+        indices = np.minimum(indices, len(self.vocabulary) - 1)
+        return [self.vocabulary[i] for i in indices]
+
+    def record(self, i: int) -> Dict[str, Any]:
+        rng = np.random.default_rng((self.seed, 0, i))
+        n_words = max(20, int(rng.lognormal(np.log(self.mean_words), self.sigma_words)))
+        words = self._words(rng, n_words)
+        title = " ".join(words[:4]).capitalize()
+        url = f"https://www.uni-marburg.de/de/synthetic/{i // 1000}/page-{i}"
+
+        sections = [f"# {title}"]
+        n_links = int(rng.integers(0, 8))
+        for start in range(4, n_words, 120):
+            header = " ".join(self._words(rng, 3)).capitalize()
+            paragraph = " ".join(words[start : start + 120])
+            if n_links:
+                paragraph += f" [mehr ][{int(rng.integers(1, n_links + 1))}]"
+            sections.append(f"## {header}\n\n{paragraph}")
+        link_block = "\n".join(
+            f"[{j}]: https://www.uni-marburg.de/de/synthetic/link-{j}"
+            for j in range(1, n_links + 1)
+        )
+        content = "\n\n".join(sections) + "\n\n" + link_block
+
+        return {
+            "url": url,
+            "title": title,
+            "content": content,
+            "og": {"og:title": title, "og:url": url},
+        }
+
+    def query(self, i: int, n_docs: int) -> Dict[str, Any]:
+        rng = np.random.default_rng((self.seed, 1, i))
+        doc_index = int(rng.integers(0, n_docs))
+        record = self.record(doc_index)
+        words = record["content"].split()
+        start = int(rng.integers(0, max(1, len(words) - 8)))
+        question = " ".join(w for w in words[start : start + 8] if w.isalpha())
+        return {
+            "id": f"synthetic-{i}",
+            "question": question + "?",
+            "sources": [record["url"]],
+        }
+
+
+def write_synthetic_data(
+    out_dir: Path, n_docs: int, n_queries: int, n_faqs: int, seed: int = 0
+) -> Dict[str, Path]:
+    """Write a synthetic crawl, query file and FAQ file to `out_dir`.
+
+    Existing files are reused if `manifest.json` records the same parameters,
+    and regenerated otherwise.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    crawl = SyntheticCrawl(seed=seed)
+    paths = {
+        "data_path": out_dir / "data.jsonl",
+        "query_path": out_dir / "queries.json",
+        "faq_path": out_dir / "faq.json",
+    }
+
+    manifest_path = out_dir / "manifest.json"
+    manifest = {
+        "n_docs": n_docs,
+        "n_queries": n_queries,
+        "n_faqs": n_faqs,
+        "seed": seed,
+    }
+    try:
+        with open(manifest_path) as fin:
+            reuse = json.load(fin) == manifest
+    except (OSError, ValueError):
+        reuse = False
+    if not reuse:
+        manifest_path.unlink(missing_ok=True)
+        for path in paths.values():
+            path.unlink(missing_ok=True)
+
+    if not paths["data_path"].exists():
+        tmp_path = paths["data_path"].with_suffix(".tmp")
+        with open(tmp_path, "w") as fout:
+            for i in range(n_docs):
+                fout.write(json.dumps(crawl.record(i)) + "\n")
+        tmp_path.rename(paths["data_path"])
+
+    if not paths["query_path"].exists():
+        queries = [crawl.query(i, n_docs) for i in range(n_queries)]
+        with open(paths["query_path"], "w") as fout:
+            json.dump(queries, fout)
+
+    if not paths["faq_path"].exists():
+        faqs = [crawl.query(n_queries + i, n_docs) for i in range(n_faqs)]
+        for i, faq in enumerate(faqs):
+            faq["id"] = f"faq-{i}"
+        with open(paths["faq_path"], "w") as fout:
+            json.dump(faqs, fout)
+
+    # Written last, so interrupted runs are regenerated.
+    with open(manifest_path, "w") as fout:
+        json.dump(manifest, fout)
+    return paths
+
+
+def latency_stats(durations: List[float]) -> Dict[str, float]:
+    """Summarize per-query latencies (in seconds)."""
+    if not durations:
+        return {}
+    durations_ms = np.array(durations) * 1000
+    total = float(np.sum(durations))
+    return {
+        "n": len(durations),
+        "mean_ms": float(np.mean(durations_ms)),
+        "p50_ms": float(np.percentile(durations_ms, 50)),
+        "p90_ms": float(np.percentile(durations_ms, 90)),
+        "p95_ms": float(np.percentile(durations_ms, 95)),
+        "p99_ms": float(np.percentile(durations_ms, 99)),
+        "max_ms": float(np.max(durations_ms)),
+        "qps": len(durations) / total if total > 0 else float("inf"),
+    }
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def bench_components(data_path, n_queries: int, top_k: int, seed: int = 0):
+    """Micro-benchmarks for document loading, link normalization and joining."""
+    from haystack.components.joiners import DocumentJoiner
+
+    from marcel import data_loader
+    from marcel.components import ContentLinkNormalizer
+    from marcel.fusion import ScoreFusionJoiner
+
+    documents, load_seconds = timed(data_loader.load_documents, data_path)
+    result = {
+        "load_documents": {
+            "seconds": load_seconds,
+            "docs_per_second": len(documents) / load_seconds,
+        }
+    }
+
+    rng = random.Random(seed)
+    samples = [
+        rng.sample(documents, min(top_k, len(documents))) for _ in range(n_queries)
+    ]
+
+    normalizer = ContentLinkNormalizer()
+    durations = [timed(normalizer.run, documents=docs)[1] for docs in samples]
+    result["link_normalizer"] = latency_stats(durations)
+
+    pairs = []
+    for docs in samples:
+        other = list(docs)
+        rng.shuffle(other)
+        pairs.append((docs, other))
+
+    joiner = DocumentJoiner(join_mode="reciprocal_rank_fusion", top_k=top_k)
+    durations = [timed(joiner.run, documents=list(pair))[1] for pair in pairs]
+    result["document_joiner"] = latency_stats(durations)
+
+    fusion = ScoreFusionJoiner(["bm25", "dense"], top_k=top_k)
+    durations = [timed(fusion.run, bm25=a, dense=b)[1] for a, b in pairs]
+    result["score_fusion_joiner"] = latency_stats(durations)
+
+    return result
+
+
+def padded_tokens(lengths: np.ndarray, batches: List[np.ndarray]) -> int:
+    return int(sum(len(batch) * lengths[batch].max() for batch in batches))
+
+
+def bench_embedding_batching(
+    data_path,
+    model: str,
+    n_docs: int = 2000,
+    batch_size: int = 32,
+    max_batch_tokens: Optional[int] = None,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """Throughput of fixed-size batches (`SentenceTransformer.encode`) vs. token-budget batches (`encode_batched`)."""
+    from sentence_transformers import SentenceTransformer
+
+    from marcel import data_loader
+    from marcel.embedding import (
+        MAX_BATCH_TOKENS,
+        encode_batched,
+        token_budget_batches,
+        token_lengths,
+    )
+
+    max_batch_tokens = max_batch_tokens or MAX_BATCH_TOKENS
+    documents = data_loader.load_documents(data_path)
+    documents = random.Random(seed).sample(documents, min(n_docs, len(documents)))
+    texts = [doc.content or "" for doc in documents]
+
+    encoder = SentenceTransformer(model, device="cpu")
+    encoder.encode(texts[:batch_size], batch_size=batch_size)  # warm-up
+    lengths = token_lengths(encoder, texts)
+
+    # SentenceTransformer.encode sorts by character length, then cuts fixed-size batches.
+    order = np.argsort([-len(text) for text in texts], kind="stable")
+    fixed_batches = [
+        order[i : i + batch_size] for i in range(0, len(order), batch_size)
+    ]
+    budget_batches = token_budget_batches(lengths, max_batch_tokens)
+
+    _, fixed_seconds = timed(
+        encoder.encode, texts, batch_size=batch_size, show_progress_bar=False
+    )
+    _, budget_seconds = timed(encode_batched, encoder, texts, max_batch_tokens)
+
+    return {
+        "model": model,
+        "n_docs": len(texts),
+        "tokens": int(lengths.sum()),
+        "fixed": {
+            "batch_size": batch_size,
+            "batches": len(fixed_batches),
+            "padding_efficiency": float(lengths.sum())
+            / padded_tokens(lengths, fixed_batches),
+            "docs_per_second": len(texts) / fixed_seconds,
+        },
+        "token_budget": {
+            "max_batch_tokens": max_batch_tokens,
+            "batches": len(budget_batches),
+            "padding_efficiency": float(lengths.sum())
+            / padded_tokens(lengths, budget_batches),
+            "docs_per_second": len(texts) / budget_seconds,
+        },
+        "speedup": fixed_seconds / budget_seconds,
+    }
+
+
+def bench_retriever_config(paths: Dict[str, str], argv: List[str]) -> Dict[str, Any]:
+    """Index the corpus and run all queries for a single `retrievers.py` configuration.
+
+    Meant to be executed in a fresh process so that peak RSS is attributable to the configuration.
+    """
+    from marcel import data_loader
+    from marcel.experiment_runner import warm_up
+    from marcel.retrievers import get_pipeline, parse_args, run_pipeline
+
+    path_args = ["--data_path", paths["data_path"], "--query_path", paths["query_path"]]
+    if paths.get("faq_path"):
+        path_args += ["--faq_path", paths["faq_path"]]
+    config = parse_args([*path_args, "--out_path", "", *argv])
+
+    documents, load_seconds = timed(data_loader.load_documents, config.data_path)
+    queries = data_loader.load_queries(config.query_path, skip_without_sources=True)
+    faqs = data_loader.load_faqs(config.faq_path) if "faq" in config.retrievers else []
+
+    pipeline, index_seconds = timed(get_pipeline, documents, faqs, config)
+    _, warm_up_seconds = timed(pipeline.warm_up)
+    # Not one of the queries, so the first query does not hit warm caches.
+    warm_up(pipeline, run_pipeline, queries)
+
+    durations = []
+    errors = 0
+    for query in queries:
+        result, duration = timed(run_pipeline, pipeline, query)
+        if "error" in result:
+            errors += 1
+        else:
+            durations.append(duration)
+    if errors:
+        logger.warning(
+            "%d of %d queries failed (not included in the latency).",
+            errors,
+            len(queries),
+        )
+
+    return {
+        "load_seconds": load_seconds,
+        "index_seconds": index_seconds,
+        "warm_up_seconds": warm_up_seconds,
+        "errors": errors,
+        "latency": latency_stats(durations),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+HEAVY_MODULES = ["torch", "transformers", "sentence_transformers", "openai"]
+
+STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import marcel.retrievers
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "modules": [m for m in %r if m in sys.modules]}))
+"""
+
+
+def bench_startup(repeats: int = 3) -> Dict[str, Any]:
+    """Import time of `retrievers.py` and wall time of `retrievers.py --help` (fresh interpreters, median of `repeats`)."""
+    src = Path(__file__).parent.parent
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join([str(src), os.environ.get("PYTHONPATH", "")]),
+    }
+    imports, helps = [], []
+    for _ in range(repeats):
+        output = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT % HEAVY_MODULES],
+            env=env,
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout
+        imports.append(json.loads(output.splitlines()[-1]))
+        _, seconds = timed(
+            subprocess.run,
+            [sys.executable, str(src / "marcel" / "retrievers.py"), "--help"],
+            env=env,
+            capture_output=True,
+            check=True,
+        )
+        helps.append(seconds)
+    return {
+        "import_seconds": float(np.median([run["seconds"] for run in imports])),
+        "help_seconds": float(np.median(helps)),
+        "heavy_modules_on_import": imports[-1]["modules"],
+    }
+
+
+def run_isolated(fn, *args):
+    """Run `fn(*args)` in a fresh spawned process and return its result."""
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(fn, *args).result()
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": multiprocessing.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], metric="p50_ms"):
+    """Relative change of a latency metric per corpus size and configuration."""
+    changes = {}
+    for size, result in current["results"].items():
+        for name, run in result.get("retrievers", {}).items():
+            before = baseline["results"].get(size, {}).get("retrievers", {}).get(name)
+            if not before or "latency" not in before or "latency" not in run:
+                continue
+            old, new = before["latency"][metric], run["latency"][metric]
+            changes[f"{size}/{name}"] = (new - old) / old if old else None
+    return changes
+
+
+def main(args):
+    results = {}
+    startup = bench_startup()
+    print("startup", json.dumps(startup))
+    sizes = [None] if args.data_path else args.sizes
+    for size in sizes:
+        if args.data_path:
+            paths = {
+                "data_path": args.data_path,
+                "query_path": args.query_path,
+                "faq_path": args.faq_path,
+            }
+            key = Path(args.data_path).parent.name
+        else:
+            paths = write_synthetic_data(
+                Path(args.synthetic_dir) / f"{size}",
+                n_docs=size,
+                n_queries=args.n_queries,
+                n_faqs=args.n_faqs,
+                seed=args.seed,
+            )
+            key = str(size)
+        paths = {k: str(v) for k, v in paths.items() if v}
+
+        print("=" * 30, f"Corpus: {key}", "=" * 30)
+        result = {
+            "components": bench_components(
+                paths["data_path"], args.n_queries, args.top_k, seed=args.seed
+            ),
+            "retrievers": {},
+        }
+        if args.embedding_model:
+            result["embedding_batching"] = bench_embedding_batching(
+                paths["data_path"],
+                args.embedding_model,
+                n_docs=args.embedding_n_docs,
+                seed=args.seed,
+            )
+            print("embedding batching", json.dumps(result["embedding_batching"]))
+        for name in args.configs:
+            argv = ["--retrievers", *name.split(), *args.retriever_args]
+            try:
+                run = run_isolated(bench_retriever_config, paths, argv)
+            except Exception as e:
+                logger.exception("Benchmark failed for %s", name)
+                run = {"error": repr(e)}
+            print(name, json.dumps(run))
+            result["retrievers"][name] = run
+        results[key] = result
+
+    report = {
+        "environment": environment(),
+        "args": vars(args),
+        "startup": startup,
+        "results": results,
+    }
+    out_path = Path(args.out_path)
+    if out_path.suffix != ".json":
+        revision = report["environment"]["git_revision"] or "unknown"
+        out_path = out_path / f"{time.strftime('%Y%m%d-%H%M%S')}-{revision[:8]}.json"
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(out_path, "w") as fout:
+        json.dump(report, fout, indent=4)
+    print(f"Results written to {out_path}")
+
+    if args.compare_to:
+        with open(args.compare_to) as fin:
+            baseline = json.load(fin)
+        for name, change in compare(baseline, report).items():
+            print(f"{name}: {change:+.1%} p50 latency" if change is not None else name)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+
+    # fmt: off
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000], help="Synthetic corpus sizes (number of pages).")
+    parser.add_argument("--data_path", type=str, required=False, help="Benchmark a real crawl instead of synthetic corpora.")
+    parser.add_argument("--query_path", type=str, required=False, help="Queries for the real crawl.")
+    parser.add_argument("--faq_path", type=str, required=False, help="FAQs for the real crawl.")
+    parser.add_argument("--synthetic_dir", type=str, default="data/synthetic", help="Where synthetic corpora are cached.")
+    parser.add_argument("--configs", type=str, nargs="+", default=DEFAULT_CONFIGS, help="Space-separated retriever combinations, e.g. 'bm25 dense'.")
+    parser.add_argument("--retriever_args", type=str, nargs=argparse.REMAINDER, default=[], help="Extra arguments passed on to retrievers.py (must come last).")
+    parser.add_argument("--embedding_model", type=str, required=False, help="Also compare fixed-size and token-budget embedding batches with this model.")
+    parser.add_argument("--embedding_n_docs", type=int, default=2000, help="Number of pages embedded for the batching comparison.")
+    parser.add_argument("--n_queries", type=int, default=200)
+    parser.add_argument("--n_faqs", type=int, default=100)
+    parser.add_argument("--top_k", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out_path", type=str, default="output/benchmarks/", help="JSON file or directory for results.")
+    parser.add_argument("--compare_to", type=str, required=False, help="Earlier result file to compare p50 latency against.")
+    # fmt: on
+
+    args = parser.parse_args()
+    if args.data_path and not args.query_path:
+        parser.error("--query_path is required with --data_path")
+    return args
+
+
+if __name__ == "__main__":
+    main(parse_args())
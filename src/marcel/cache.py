@@ -0,0 +1,100 @@
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+# SQLite limits the number of host parameters per statement.
+MAX_VARIABLES = 500
+
+
+class SQLiteCache:
+    """Persistent key-value store for JSON-serializable values.
+
+    The cache is safe to share between threads, and between processes on one
+    host: SQLite's file locks serialize writers, which wait up to `timeout`
+    seconds for a lock. On network filesystems, this depends on their support of
+    file locks, so jobs on different nodes should not write to one file unless
+    it is known to work. Without a path, values are kept in memory only.
+    """
+
+    def __init__(
+        self, path: Optional[str] = None, table: str = "cache", timeout: float = 60
+    ):
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.table = table
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            path or ":memory:", check_same_thread=False, timeout=timeout
+        )
+        with self.lock, self.connection:
+            if path:
+                # Not WAL, which needs memory shared by all processes (one host).
+                self.connection.execute("PRAGMA journal_mode=DELETE")
+            self.connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT)"
+            )
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(dict.fromkeys(keys))
+        result = {}
+        with self.lock:
+            for i in range(0, len(keys), MAX_VARIABLES):
+                chunk = keys[i : i + MAX_VARIABLES]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.connection.execute(
+                    f"SELECT key, value FROM {self.table} WHERE key IN ({placeholders})",
+                    chunk,
+                )
+                result.update((key, json.loads(value)) for key, value in rows)
+        return result
+
+    def put_many(self, items: Dict[str, Any]):
+        rows = [(key, json.dumps(value)) for key, value in items.items()]
+        with self.lock, self.connection:
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, value) VALUES (?, ?)", rows
+            )
+
+    def get_prefix(self, prefix: str) -> Dict[str, Any]:
+        """All entries whose key starts with `prefix`."""
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT key, value FROM {self.table} WHERE key >= ? AND key < ?",
+                (prefix, prefix + "\U0010ffff"),
+            ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def get(self, key: str, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def put(self, key: str, value: Any):
+        self.put_many({key: value})
+
+    def delete_many(self, keys: Iterable[str]):
+        with self.lock, self.connection:
+            self.connection.executemany(
+                f"DELETE FROM {self.table} WHERE key = ?", [(key,) for key in keys]
+            )
+
+    def items(self):
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT key, value FROM {self.table}"
+            ).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.get_many([key])
+
+    def __len__(self) -> int:
+        with self.lock:
+            (count,) = self.connection.execute(
+                f"SELECT COUNT(*) FROM {self.table}"
+            ).fetchone()
+        return count
+
+    def close(self):
+        self.connection.close()
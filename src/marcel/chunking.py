@@ -0,0 +1,133 @@
+import re
+from dataclasses import replace
+from typing import Any, Dict, List, Literal, Optional
+
+from haystack import Document, component, default_to_dict
+
+HEADER_PATTERN = re.compile(r"^#{1,6}[^\S\n]", re.MULTILINE)
+
+# Parent metadata which is not needed on passages (restored on aggregation).
+PARENT_ONLY_META = ["links"]
+
+
+def count_tokens(text: str) -> int:
+    """Approximate token count (whitespace-separated words)."""
+    return len(text.split())
+
+
+def split_sections(content: str) -> List[str]:
+    """Split markdown into sections, each starting at a header."""
+    starts = [m.start() for m in HEADER_PATTERN.finditer(content)]
+    if not starts or starts[0] != 0:
+        starts = [0] + starts
+    sections = [content[a:b] for a, b in zip(starts, starts[1:] + [len(content)])]
+    return [s.strip() for s in sections if s.strip()]
+
+
+def split_long(text: str, max_tokens: int) -> List[str]:
+    """Split text exceeding `max_tokens` at paragraph boundaries, then into word windows."""
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        words = paragraph.split()
+        if len(words) <= max_tokens:
+            pieces.append(paragraph.strip())
+        else:
+            pieces.extend(
+                " ".join(words[i : i + max_tokens])
+                for i in range(0, len(words), max_tokens)
+            )
+    return pack([p for p in pieces if p], max_tokens)
+
+
+def pack(pieces: List[str], max_tokens: int) -> List[str]:
+    """Greedily merge consecutive pieces as long as they fit into `max_tokens`."""
+    chunks, current, current_tokens = [], [], 0
+    for piece in pieces:
+        tokens = count_tokens(piece)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def split_markdown(content: str, max_tokens: int = 200) -> List[str]:
+    """Split cleaned markdown content into passages of at most `max_tokens` at header boundaries.
+
+    Small consecutive sections are merged, long sections are split at paragraphs.
+    """
+    pieces = []
+    for section in split_sections(content):
+        if count_tokens(section) > max_tokens:
+            pieces.extend(split_long(section, max_tokens))
+        else:
+            pieces.append(section)
+    return pack(pieces, max_tokens)
+
+
+def chunk_documents(documents: List[Document], max_tokens: int = 200) -> List[Document]:
+    passages = []
+    for doc in documents:
+        meta = {k: v for k, v in doc.meta.items() if k not in PARENT_ONLY_META}
+        for i, chunk in enumerate(split_markdown(doc.content or "", max_tokens)):
+            passages.append(
+                Document(
+                    content=chunk,
+                    meta={**meta, "parent_id": doc.id, "chunk_index": i},
+                )
+            )
+    return passages
+
+
+@component
+class ParentAggregator:
+    """Aggregates ranked passages to their parent pages using a precomputed id index.
+
+    A parent is scored by its best passage and ranked by first occurrence. In
+    `passages` mode the parent's content is replaced by its retrieved passages
+    (in page order) to keep prompts short; `parent` mode returns the full page.
+    Documents without a `parent_id` (e.g., pages from the FAQ retriever) are
+    treated as their own parent.
+    """
+
+    def __init__(
+        self,
+        parents: List[Document],
+        mode: Literal["passages", "parent"] = "passages",
+        top_k: Optional[int] = None,
+    ):
+        if mode not in ["passages", "parent"]:
+            raise ValueError(f"Invalid mode {mode}.")
+        self.parents = {doc.id: doc for doc in parents}
+        self.mode = mode
+        self.top_k = top_k
+
+    @component.output_types(documents=List[Document])
+    def run(self, documents: List[Document]):
+        groups: Dict[str, List[Document]] = {}
+        for doc in documents:
+            groups.setdefault(doc.meta.get("parent_id", doc.id), []).append(doc)
+
+        result = []
+        for parent_id, group in list(groups.items())[: self.top_k]:
+            parent = self.parents.get(parent_id)
+            scores = [doc.score for doc in group if doc.score is not None]
+            score = max(scores, default=None)
+            if parent is None:
+                result.append(replace(group[0], score=score))
+            elif self.mode == "parent" or any(
+                "parent_id" not in doc.meta for doc in group
+            ):
+                result.append(replace(parent, score=score))
+            else:
+                passages = sorted(group, key=lambda doc: doc.meta["chunk_index"])
+                content = "\n\n".join(doc.content for doc in passages)
+                result.append(replace(parent, content=content, score=score))
+        return {"documents": result}
+
+    def to_dict(self) -> Dict[str, Any]:
+        # Parents are omitted to keep the serialized pipeline small.
+        return default_to_dict(self, parents=[], mode=self.mode, top_k=self.top_k)
@@ -1,5 +1,6 @@
 import random
 import re
+import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Any, Dict, List
 
@@ -108,31 +109,133 @@ class ContentLinkNormalizer:
         return {"documents": result}
 
 
+NON_ANSWER = re.compile(
+    r"(do not|don't|don’t) have any (knowledge|information)"
+    r"|leider (habe ich )?keine (informationen|kenntnisse)",
+    re.IGNORECASE,
+)
+
+
+def is_non_answer(text: str) -> bool:
+    """The apology which the RAG prompt asks for if the documents have no answer."""
+    return bool(NON_ANSWER.search(text or ""))
+
+
+def word_overlap(a: str, b: str) -> float:
+    """Jaccard similarity of the (lowercased) words of two texts."""
+    words_a = set(re.findall(r"\w+", (a or "").lower()))
+    words_b = set(re.findall(r"\w+", (b or "").lower()))
+    if not words_a and not words_b:
+        return 1.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
+def samples_agree(texts: List[str], threshold: float) -> bool:
+    """All samples are non-answers, or all are answers with pairwise word overlap >= `threshold`."""
+    non_answers = [is_non_answer(text) for text in texts]
+    if all(non_answers):
+        return True
+    if any(non_answers):
+        return False
+    return all(
+        word_overlap(a, b) >= threshold
+        for i, a in enumerate(texts)
+        for b in texts[i + 1 :]
+    )
+
+
 @component
 class OpenAIChatGeneratorMultipleSamples:
-    def __init__(self, base_generator: OpenAIChatGenerator, n: int = 1):
+    """Draws `n` samples with independent requests.
+
+    With `adaptive`, it draws `min_samples` first and then `wave_size` more at a
+    time, and stops before `n` once the samples agree (see `samples_agree`).
+    """
+
+    def __init__(
+        self,
+        base_generator: OpenAIChatGenerator,
+        n: int = 1,
+        adaptive: bool = False,
+        min_samples: int = 2,
+        wave_size: int = 1,
+        agreement_threshold: float = 0.7,
+    ):
+        if min(n, min_samples, wave_size) < 1:
+            raise ValueError("n, min_samples and wave_size must be at least 1.")
+        if adaptive and min_samples > n:
+            raise ValueError(f"min_samples must be at most n ({n}).")
         self.n = n
         self.base_generator = base_generator
+        self.adaptive = adaptive
+        self.min_samples = min_samples
+        self.wave_size = wave_size
+        self.agreement_threshold = agreement_threshold
 
-    @component.output_types(replies=List[ChatMessage])
-    def run(self, messages: List[ChatMessage]):
-        all_responses = []
+        self.lock = threading.Lock()
+        self.reset_stats()
 
-        with ThreadPoolExecutor(max_workers=self.n) as executor:
+    def _sample(self, messages: List[ChatMessage], n: int) -> List[ChatMessage]:
+        responses = []
+        with ThreadPoolExecutor(max_workers=n) as executor:
             futures = [
                 executor.submit(self.base_generator.run, messages=messages)
-                for _ in range(self.n)
+                for _ in range(n)
             ]
 
             for future in as_completed(futures):
                 result = future.result()
-                all_responses.append(result["replies"][0])
+                responses.append(result["replies"][0])
+        return responses
 
+    @component.output_types(replies=List[ChatMessage])
+    def run(self, messages: List[ChatMessage]):
+        if not self.adaptive:
+            return {"replies": self._sample(messages, self.n)}
+
+        all_responses = self._sample(messages, min(self.min_samples, self.n))
+        while len(all_responses) < self.n and not samples_agree(
+            [response.text for response in all_responses], self.agreement_threshold
+        ):
+            wave = min(self.wave_size, self.n - len(all_responses))
+            all_responses += self._sample(messages, wave)
+
+        with self.lock:
+            self.queries += 1
+            self.samples += len(all_responses)
+            self.early_stops += len(all_responses) < self.n
         return {"replies": all_responses}
 
+    def reset_stats(self):
+        self.queries = 0
+        self.samples = 0
+        self.early_stops = 0
+
+    def stats(self) -> Dict[str, Any]:
+        if not self.adaptive:
+            return {}
+        with self.lock:
+            return {
+                "queries": self.queries,
+                "samples": self.samples,
+                "mean_samples": self.samples / self.queries if self.queries else None,
+                "early_stops": self.early_stops,
+                "saved_samples": self.n * self.queries - self.samples,
+            }
+
     def to_dict(self) -> Dict[str, Any]:
+        adaptive = {}
+        if self.adaptive:
+            # Only then, so that answer caches of non-adaptive runs stay valid.
+            adaptive = {
+                "adaptive": True,
+                "min_samples": self.min_samples,
+                "wave_size": self.wave_size,
+                "agreement_threshold": self.agreement_threshold,
+            }
         return default_to_dict(
             self,
             n=self.n,
+            **adaptive,
             **self.base_generator.to_dict(),
         )
@@ -0,0 +1,36 @@
+from typing import Any, Dict, Optional, Set
+
+from haystack import AsyncPipeline
+
+from marcel.inference import serialize_model_calls
+
+
+class ConcurrentPipeline(AsyncPipeline):
+    """Pipeline which runs independent branches (e.g., the retrievers before the joiner) concurrently.
+
+    A component runs as soon as all of its inputs are available. Components
+    without `run_async` run in threads, which covers both CPU-light work and
+    blocking LLM requests (HyDE). Models shared by several branches (e.g., the
+    dense and FAQ query embedders) are called by one thread at a time. The
+    latency of a query is that of its slowest branch instead of their sum.
+    """
+
+    def __init__(self, concurrency_limit: int = 4, **kwargs):
+        AsyncPipeline.__init__(self, **kwargs)
+        self.concurrency_limit = concurrency_limit
+
+    def run(  # type: ignore[override]
+        self,
+        data: Dict[str, Any],
+        include_outputs_from: Optional[Set[str]] = None,
+    ) -> Dict[str, Any]:
+        return AsyncPipeline.run(
+            self,
+            data,
+            include_outputs_from=include_outputs_from,
+            concurrency_limit=self.concurrency_limit,
+        )
+
+    def warm_up(self):
+        AsyncPipeline.warm_up(self)
+        serialize_model_calls(self)
@@ -2,7 +2,7 @@ import json
 import logging
 import re
 from hashlib import sha256
-from typing import List
+from typing import Dict, List, Optional
 
 from haystack import Document
 from w3lib.url import canonicalize_url
@@ -125,7 +125,13 @@ def fingerprint(data):
     return sha256(str(data).encode("utf-8")).hexdigest()
 
 
-def load_documents(data_path) -> List[Document]:
+def corpus_fingerprint(documents: List[Document]) -> str:
+    return fingerprint([doc.meta.get("fingerprint", doc.id) for doc in documents])
+
+
+def load_documents(
+    data_path, dedup_threshold: Optional[float] = None
+) -> List[Document]:
     raw_docs = load_raw_docs(data_path)
     docs = []
     for doc in raw_docs:
@@ -141,15 +147,28 @@ def load_documents(data_path) -> List[Document]:
         data["fingerprint"] = fingerprint(data)
         doc = Document.from_dict(data)
         docs.append(doc)
+
+    if dedup_threshold:
+        from marcel.dedup import collapse_near_duplicates
+
+        docs = collapse_near_duplicates(
+            docs, threshold=dedup_threshold, fingerprint=fingerprint
+        )
     return docs
 
 
-def load_queries(path, skip_without_sources=False):
+def load_queries(
+    path, skip_without_sources=False, aliases: Optional[Dict[str, str]] = None
+):
     with open(path) as fin:
         queries = json.load(fin)
 
     for query in queries:
         query["sources"] = [clean_url(url) for url in query["sources"]]
+        if aliases:
+            from marcel.dedup import resolve_urls
+
+            query["sources"] = resolve_urls(query["sources"], aliases)
 
     if skip_without_sources:
         queries = [q for q in queries if len(q["sources"]) > 0]
@@ -157,7 +176,7 @@ def load_queries(path, skip_without_sources=False):
     return queries
 
 
-def load_faqs(faq_path) -> List[Document]:
+def load_faqs(faq_path, aliases: Optional[Dict[str, str]] = None) -> List[Document]:
     with open(faq_path) as fin:
         raw_faqs = json.load(fin)
 
@@ -176,9 +195,11 @@ def load_faqs(faq_path) -> List[Document]:
             logger.debug("Skipping %s (reason: empty sources)", question["id"])
             continue
 
-        doc = Document(
-            content=question["question"],
-            meta={"sources": [clean_url(url) for url in question["sources"]]},
-        )
+        sources = [clean_url(url) for url in question["sources"]]
+        if aliases:
+            from marcel.dedup import resolve_urls
+
+            sources = resolve_urls(sources, aliases)
+        doc = Document(content=question["question"], meta={"sources": sources})
         faqs.append(doc)
     return faqs
@@ -0,0 +1,155 @@
+"""Near-duplicate detection of crawled pages with MinHash and locality-sensitive hashing.
+
+Pages are represented by their word shingles. Candidate pairs share at least one
+LSH band of their MinHash signatures and are confirmed if their estimated Jaccard
+similarity reaches the threshold. Clusters of near-duplicates are collapsed to
+one canonical page (the shortest URL) which lists the other URLs as `aliases`.
+"""
+
+import logging
+import zlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from haystack import Document
+
+logger = logging.getLogger(__name__)
+
+SHINGLE_SIZE = 5
+NUM_PERM = 128
+
+
+def shingles(text: str, k: int = SHINGLE_SIZE) -> np.ndarray:
+    """32-bit hashes of the word k-shingles of `text`."""
+    words = text.lower().split()
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    windows = [" ".join(words[i : i + k]) for i in range(max(len(words) - k + 1, 1))]
+    return np.unique(
+        np.fromiter(
+            (zlib.crc32(w.encode("utf-8")) for w in windows),
+            dtype=np.uint64,
+            count=len(windows),
+        )
+    )
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hashing: h(x) = ((a * x + b) mod 2^64) >> 32 with odd a.
+        self.a = rng.integers(0, 2**63, num_perm, dtype=np.uint64) * 2 + 1
+        self.b = rng.integers(0, 2**63, num_perm, dtype=np.uint64)
+        self.num_perm = num_perm
+
+    def signature(self, hashes: np.ndarray) -> np.ndarray:
+        if not len(hashes):
+            return np.full(self.num_perm, np.iinfo(np.uint32).max, dtype=np.uint32)
+        with np.errstate(over="ignore"):
+            values = (np.outer(self.a, hashes) + self.b[:, None]) >> np.uint64(32)
+        return values.min(axis=1).astype(np.uint32)
+
+
+def lsh_params(threshold: float, num_perm: int = NUM_PERM) -> Tuple[int, int]:
+    """Number of bands and rows per band whose S-curve threshold (1/b)^(1/r) is closest to `threshold`."""
+    options = [(b, num_perm // b) for b in range(1, num_perm + 1) if num_perm % b == 0]
+    return min(options, key=lambda br: abs((1 / br[0]) ** (1 / br[1]) - threshold))
+
+
+def near_duplicate_clusters(
+    texts: List[str], threshold: float = 0.9, num_perm: int = NUM_PERM
+) -> List[List[int]]:
+    """Clusters (lists of indices into `texts`) with more than one member."""
+    hasher = MinHasher(num_perm)
+    hashes = [shingles(text) for text in texts]
+    signatures = np.stack([hasher.signature(h) for h in hashes]) if texts else None
+    bands, rows = lsh_params(threshold, num_perm)
+
+    parent = list(range(len(texts)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for band in range(bands):
+        buckets: Dict[bytes, List[int]] = {}
+        columns = slice(band * rows, (band + 1) * rows)
+        for i, h in enumerate(hashes):
+            if len(h):
+                buckets.setdefault(signatures[i, columns].tobytes(), []).append(i)
+        for members in buckets.values():
+            # All pairs of the bucket: a page may only be similar to later members.
+            for n, j in enumerate(members[1:], start=1):
+                for i in members[:n]:
+                    root_i, root_j = find(i), find(j)
+                    if root_i == root_j:
+                        continue
+                    similarity = np.mean(signatures[i] == signatures[j])
+                    if similarity >= threshold:
+                        parent[root_j] = root_i
+
+    clusters: Dict[int, List[int]] = {}
+    for i in range(len(texts)):
+        clusters.setdefault(find(i), []).append(i)
+    return [members for members in clusters.values() if len(members) > 1]
+
+
+def collapse_near_duplicates(
+    documents: List[Document],
+    threshold: float = 0.9,
+    fingerprint: Optional[Callable] = None,
+) -> List[Document]:
+    """Keep one canonical page per cluster of near-duplicates and record the others as aliases.
+
+    With `fingerprint`, the `fingerprint` meta field of canonical pages is
+    updated to include their aliases.
+    """
+    clusters = near_duplicate_clusters(
+        [doc.content or "" for doc in documents], threshold
+    )
+
+    canonical = {}
+    dropped = set()
+    for members in clusters:
+        keep = min(members, key=lambda i: (len(documents[i].meta["url"]), i))
+        canonical[keep] = [documents[i].meta["url"] for i in members if i != keep]
+        dropped.update(i for i in members if i != keep)
+
+    result = []
+    for i, doc in enumerate(documents):
+        if i in dropped:
+            continue
+        if i in canonical:
+            meta = {
+                **doc.meta,
+                "aliases": sorted(set(canonical[i]) - {doc.meta["url"]}),
+            }
+            if fingerprint is not None and "fingerprint" in meta:
+                meta["fingerprint"] = fingerprint(
+                    [meta["fingerprint"], meta["aliases"]]
+                )
+            doc = Document(content=doc.content, meta=meta)
+        result.append(doc)
+
+    logger.info(
+        "Collapsed %d near-duplicate pages into %d canonical pages",
+        len(dropped),
+        len(canonical),
+    )
+    return result
+
+
+def alias_map(documents: List[Document]) -> Dict[str, str]:
+    """Maps alias URLs to the URL of their canonical page."""
+    return {
+        alias: doc.meta["url"]
+        for doc in documents
+        for alias in doc.meta.get("aliases", [])
+    }
+
+
+def resolve_urls(urls: List[str], aliases: Dict[str, str]) -> List[str]:
+    """Replace alias URLs by canonical URLs, removing duplicates while keeping order."""
+    return list(dict.fromkeys(aliases.get(url, url) for url in urls))
@@ -0,0 +1,232 @@
+"""Embedding utilities: token-budget batching and a pool of CPU worker processes.
+
+`encode_batched` sorts texts by token length and forms batches whose padded
+size (batch size x longest text) stays under a token budget, so short texts are
+embedded in large batches and long ones in small batches. `BatchedDocumentEmbedder`
+uses it in place of `SentenceTransformersDocumentEmbedder`.
+
+For corpus indexing with `embed_texts`, texts are sorted by length (longest
+first) and split into shards which are handed to a pool of worker processes as
+they become free. Every worker holds its own model replica and uses `threads`
+torch threads, so that `workers * threads` does not exceed the CPUs available
+to the job (e.g., `--cpus-per-task` in Slurm). Shard embeddings are written into
+the result matrix as soon as they arrive.
+"""
+
+import logging
+import multiprocessing
+import os
+from dataclasses import replace
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from haystack import Document, component
+from haystack.components.embedders import SentenceTransformersDocumentEmbedder
+from tqdm import tqdm
+
+from marcel.inference import load_sentence_transformer
+
+logger = logging.getLogger(__name__)
+
+# Padded tokens per batch (e.g., 32 texts of 256 tokens).
+MAX_BATCH_TOKENS = 8192
+
+_model: Any = None
+
+
+def token_lengths(model, texts: List[str]) -> np.ndarray:
+    """Number of tokens of every text after truncation (words if the model has no tokenizer)."""
+    tokenizer = getattr(model, "tokenizer", None)
+    if tokenizer is None:
+        return np.array([len(text.split()) + 2 for text in texts], dtype=np.int64)
+    input_ids = tokenizer(
+        texts, truncation=True, max_length=model.max_seq_length, verbose=False
+    )["input_ids"]
+    return np.array([len(ids) for ids in input_ids], dtype=np.int64)
+
+
+def token_budget_batches(
+    lengths: np.ndarray, max_tokens: int = MAX_BATCH_TOKENS
+) -> List[np.ndarray]:
+    """Indices of length-sorted batches with `len(batch) * max(lengths[batch]) <= max_tokens` (at least one text per batch)."""
+    order = np.argsort(-np.asarray(lengths), kind="stable")
+    batches = []
+    start = 0
+    while start < len(order):
+        # Texts are sorted by decreasing length, so the first one determines the padding.
+        size = max(1, max_tokens // max(int(lengths[order[start]]), 1))
+        batches.append(order[start : start + size])
+        start += size
+    return batches
+
+
+def encode_batched(
+    model,
+    texts: List[str],
+    max_tokens: int = MAX_BATCH_TOKENS,
+    progress_bar: bool = False,
+    **encode_kwargs,
+) -> np.ndarray:
+    """`model.encode(texts)` with token-budget batches, returned in input order."""
+    batches = token_budget_batches(token_lengths(model, texts), max_tokens)
+    embeddings = None
+    for batch in tqdm(batches, desc="Batches", disable=not progress_bar):
+        batch_embeddings = np.asarray(
+            model.encode(
+                [texts[i] for i in batch],
+                batch_size=len(batch),
+                convert_to_numpy=True,
+                show_progress_bar=False,
+                **encode_kwargs,
+            )
+        )
+        if embeddings is None:
+            embeddings = np.empty(
+                (len(texts), batch_embeddings.shape[1]), dtype=batch_embeddings.dtype
+            )
+        embeddings[batch] = batch_embeddings
+    if embeddings is None:
+        return np.empty((0, 0), dtype=np.float32)
+    return embeddings
+
+
+@component
+class BatchedDocumentEmbedder(SentenceTransformersDocumentEmbedder):
+    """`SentenceTransformersDocumentEmbedder` batching by token budget (`max_batch_tokens`) instead of `batch_size`."""
+
+    def __init__(self, *args, max_batch_tokens: int = MAX_BATCH_TOKENS, **kwargs):
+        # Explicit base calls, as @component re-creates the class (no zero-argument super()).
+        SentenceTransformersDocumentEmbedder.__init__(self, *args, **kwargs)
+        self.max_batch_tokens = max_batch_tokens
+
+    @component.output_types(documents=List[Document])
+    def run(self, documents: List[Document]):
+        if self.embedding_backend is None:
+            raise RuntimeError(
+                "The embedding model has not been loaded. Please call warm_up() before running."
+            )
+
+        texts = []
+        for doc in documents:
+            meta_values_to_embed = [
+                str(doc.meta[key])
+                for key in self.meta_fields_to_embed
+                if key in doc.meta and doc.meta[key]
+            ]
+            texts.append(
+                self.prefix
+                + self.embedding_separator.join(
+                    meta_values_to_embed + [doc.content or ""]
+                )
+                + self.suffix
+            )
+
+        embeddings = encode_batched(
+            self.embedding_backend.model,  # type: ignore
+            texts,
+            max_tokens=self.max_batch_tokens,
+            progress_bar=self.progress_bar,
+            normalize_embeddings=self.normalize_embeddings,
+            precision=self.precision,
+            **(self.encode_kwargs or {}),
+        )
+        # Copies, so callers holding the input documents do not keep the embeddings alive.
+        return {
+            "documents": [
+                replace(doc, embedding=embedding.tolist())
+                for doc, embedding in zip(documents, embeddings)
+            ]
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = SentenceTransformersDocumentEmbedder.to_dict(self)
+        data["init_parameters"]["max_batch_tokens"] = self.max_batch_tokens
+        return data
+
+
+def available_cpus() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _init_worker(model_factory: Callable[[], Any], threads: Optional[int]):
+    global _model
+    if threads:
+        import torch
+
+        torch.set_num_threads(threads)
+    _model = model_factory()
+
+
+def _encode_shard(shard):
+    start, texts, max_tokens = shard
+    return start, encode_batched(_model, texts, max_tokens).astype(np.float32)
+
+
+def embed_texts(
+    texts: List[str],
+    model: str,
+    workers: int = 1,
+    max_tokens: int = MAX_BATCH_TOKENS,
+    shard_size: int = 512,
+    threads: Optional[int] = None,
+    inference_backend: str = "torch",
+    model_factory: Optional[Callable[[], Any]] = None,
+) -> np.ndarray:
+    """Embeds `texts` with `workers` processes and returns a float32 matrix in input order."""
+    model_factory = model_factory or partial(
+        load_sentence_transformer, model, inference_backend
+    )
+    workers = max(1, min(workers, len(texts)))
+    threads = threads or max(1, available_cpus() // workers)
+
+    order = np.argsort([-len(text) for text in texts], kind="stable")
+    shards = [
+        (start, [texts[i] for i in order[start : start + shard_size]], max_tokens)
+        for start in range(0, len(texts), shard_size)
+    ]
+
+    embeddings = None
+
+    def collect(results):
+        nonlocal embeddings
+        with tqdm(total=len(texts), desc="Embedding") as progress:
+            for start, shard_embeddings in results:
+                if embeddings is None:
+                    embeddings = np.empty(
+                        (len(texts), shard_embeddings.shape[1]), dtype=np.float32
+                    )
+                embeddings[order[start : start + len(shard_embeddings)]] = (
+                    shard_embeddings
+                )
+                progress.update(len(shard_embeddings))
+
+    if workers == 1:
+        _init_worker(model_factory, threads=None)
+        collect(map(_encode_shard, shards))
+    else:
+        logger.info("Embedding with %d workers x %d threads", workers, threads)
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(
+            workers, initializer=_init_worker, initargs=(model_factory, threads)
+        ) as pool:
+            collect(pool.imap_unordered(_encode_shard, shards))
+
+    if embeddings is None:
+        return np.empty((0, 0), dtype=np.float32)
+    return embeddings
+
+
+def embed_documents_parallel(
+    documents: List[Document], model: str, workers: int, **kwargs
+) -> List[Document]:
+    """Same as running `BatchedDocumentEmbedder` (default settings) on `documents`, using `embed_texts`."""
+    embeddings = embed_texts(
+        [doc.content or "" for doc in documents], model, workers=workers, **kwargs
+    )
+    return [
+        replace(doc, embedding=embedding.tolist())
+        for doc, embedding in zip(documents, embeddings)
+    ]
@@ -0,0 +1,135 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from haystack import component, default_to_dict
+
+from marcel.cache import SQLiteCache
+from marcel.data_loader import fingerprint
+
+
+class QueryEmbeddingCache:
+    """LRU cache of query embeddings, optionally backed by a persistent SQLite cache.
+
+    One instance is shared by all query embedders of a pipeline (dense retriever
+    and FAQ retriever), so a question embedded with the same model and prefix is
+    encoded once per run, and once across runs with `path`.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_size: int = 10000):
+        self.path = path
+        self.max_size = max_size
+        self.memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self.store = SQLiteCache(path, table="query_embeddings") if path else None
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self.lock:
+            embedding = self.memory.get(key)
+            if embedding is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return embedding
+        embedding = self.store.get(key) if self.store is not None else None
+        with self.lock:
+            if embedding is None:
+                self.misses += 1
+            else:
+                self.persistent_hits += 1
+                self._remember(key, embedding)
+        return embedding
+
+    def put(self, key: str, embedding: List[float]):
+        if self.store is not None:
+            self.store.put(key, embedding)
+        with self.lock:
+            self._remember(key, embedding)
+
+    def _remember(self, key: str, embedding: List[float]):
+        self.memory[key] = embedding
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_size:
+            self.memory.popitem(last=False)
+
+    def reset_stats(self):
+        """Reset the counters (embeddings are kept)."""
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.persistent_hits + self.misses
+        return {
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.persistent_hits) / total if total else None,
+            "size": len(self.memory),
+        }
+
+
+@component
+class CachedTextEmbedder:
+    """`SentenceTransformersTextEmbedder` which looks up embeddings in a `QueryEmbeddingCache` first.
+
+    Embeddings are keyed by model (and inference backend), the embedding settings,
+    prefix, suffix and text.
+    """
+
+    def __init__(
+        self,
+        base_embedder,
+        cache: QueryEmbeddingCache,
+        inference_backend: str = "torch",
+    ):
+        self.base_embedder = base_embedder
+        self.cache = cache
+        self.inference_backend = inference_backend
+        self.reset_stats()
+
+    def _key(self, text: str) -> str:
+        embedder = self.base_embedder
+        model = embedder.model
+        if self.inference_backend != "torch":
+            model = f"{model}:{self.inference_backend}"
+        settings = [embedder.normalize_embeddings, embedder.precision]
+        return fingerprint([model, settings, embedder.prefix, embedder.suffix, text])
+
+    @component.output_types(embedding=List[float])
+    def run(self, text: str):
+        key = self._key(text)
+        embedding = self.cache.get(key)
+        if embedding is None:
+            self.misses += 1
+            embedding = self.base_embedder.run(text=text)["embedding"]
+            self.cache.put(key, list(embedding))
+        else:
+            self.hits += 1
+        return {"embedding": embedding}
+
+    def warm_up(self):
+        self.base_embedder.warm_up()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.cache.reset_stats()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else None,
+            "cache": self.cache.stats(),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return default_to_dict(
+            self,
+            cache_path=self.cache.path,
+            cache_max_size=self.cache.max_size,
+            inference_backend=self.inference_backend,
+            **self.base_embedder.to_dict(),
+        )
@@ -1,10 +1,22 @@
 import json
 import time
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
 from tqdm.auto import tqdm
 
+from marcel.llm_scheduler import schedulers
+from marcel.memory import MemoryProfiler, memory_stage
+from marcel.run_output import output_exists, write_predictions
+from marcel.stats import collect_stats, reset_stats
+
+# Run once before the queries. Cached results (retrievals, reranker scores, answers)
+# of this question are never reused for one of the queries.
+WARM_UP_QUESTION = "Warm-up question, not part of the query set."
+
+# Not part of config.json, so sharded (merged) and unsharded runs have the same configuration.
+SHARD_ARGS = ["shard_index", "shard_count"]
+
 
 def run_experiment(
     pipeline,
@@ -13,49 +25,102 @@ def run_experiment(
     run_path,
     config: Dict[str, Any],
     max_workers=8,  # deprecated, no-op
+    shard_index: Optional[int] = None,
+    shard_count: Optional[int] = None,
+    output_format: str = "json",
+    memory_profiler: Optional[MemoryProfiler] = None,
     **pipeline_args,
 ):
     run_path = Path(run_path)
-    output_json = run_path / "output.json"
+    if shard_count is not None and shard_count > 1:
+        if output_exists(run_path):
+            print(f"{run_path} has merged outputs. SKIP.")
+            return
+        queries = shard_queries(queries, shard_index or 0, shard_count)
+        run_path = shard_path(run_path, shard_index or 0, shard_count)
+
     pipeline_json = run_path / "pipeline.json"
     config_json = run_path / "config.json"
+    stats_json = run_path / "stats.json"
 
-    if Path(output_json).exists():
-        print(f"{output_json} exists. SKIP.")
+    if output_exists(run_path):
+        print(f"{run_path} has outputs. SKIP.")
         return
     else:
         print("=" * 30, f"Run: {run_path}", "=" * 30)
 
-    pipeline.warm_up()
-    pipeline_runner(pipeline, queries[0])  # run one query to warmup the pipeline
+    with memory_stage(memory_profiler, "model_load"):
+        warm_up(pipeline, pipeline_runner, queries)
 
+    llm_schedulers = schedulers(pipeline)
     predictions = []
-    for query in tqdm(queries):
-        start = time.time()
-        result = pipeline_runner(pipeline, query)
-        end = time.time()
-        duration = end - start
-
-        # convert results into canonical evaluation format
-        prediction = {
-            **query,
-            "generated_answer": result["generated_answer"],  # type: ignore
-            "contexts": [
-                {
-                    "content": doc.content,
-                    "url": doc.meta["url"],
-                    "score": float(doc.score),
-                }
-                for doc in result["documents"]  # type: ignore
-            ],
-            "duration": duration,
-        }
-        predictions.append(prediction)
+    with memory_stage(memory_profiler, "queries"):
+        for query in tqdm(queries):
+            for scheduler in llm_schedulers:
+                scheduler.wait_for_capacity()
+            start = time.time()
+            result = pipeline_runner(pipeline, query)
+            end = time.time()
+            duration = end - start
+
+            predictions.append(to_prediction(query, result, duration))
+            if memory_profiler is not None:
+                memory_profiler.record_query()
 
     run_path.mkdir(exist_ok=True, parents=True)
-    with open(output_json, "w") as fout:
-        json.dump(predictions, fout)
+    write_predictions(run_path, predictions, output_format)
     with open(pipeline_json, "w") as fout:
         json.dump(pipeline.to_dict(), fout, indent=4)
     with open(config_json, "w") as fout:
-        json.dump(config, fout, indent=4)
+        json.dump(
+            {k: v for k, v in config.items() if k not in SHARD_ARGS}, fout, indent=4
+        )
+
+    stats = collect_stats(pipeline)
+    if stats:
+        with open(stats_json, "w") as fout:
+            json.dump(stats, fout, indent=4)
+    if memory_profiler is not None:
+        memory = memory_profiler.write(run_path)
+        print(f"peak RSS = {memory['peak_rss_mb']:.0f} MB")
+
+
+def warm_up(pipeline, pipeline_runner, queries: List[Dict[str, Any]]):
+    """Load the models and run `WARM_UP_QUESTION` through the pipeline.
+
+    The statistics of the components are reset afterwards, so they only count
+    the queries.
+    """
+    pipeline.warm_up()
+    if queries:
+        query = {**queries[0], "id": "warm-up", "question": WARM_UP_QUESTION}
+        pipeline_runner(pipeline, query)
+    reset_stats(pipeline)
+
+
+def shard_queries(queries: List[Any], shard_index: int, shard_count: int):
+    """Every `shard_count`-th query, starting at `shard_index`."""
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f"Invalid shard {shard_index} of {shard_count}.")
+    return queries[shard_index::shard_count]
+
+
+def shard_path(run_path, shard_index: int, shard_count: int) -> Path:
+    return Path(run_path) / "shards" / f"{shard_index:03d}-of-{shard_count:03d}"
+
+
+def to_prediction(query, result, duration: float) -> Dict[str, Any]:
+    """Convert a `pipeline_runner` result into the canonical evaluation format."""
+    return {
+        **query,
+        "generated_answer": result["generated_answer"],
+        "contexts": [
+            {
+                "content": doc.content,
+                "url": doc.meta["url"],
+                "score": float(doc.score),
+            }
+            for doc in result["documents"]
+        ],
+        "duration": duration,
+    }
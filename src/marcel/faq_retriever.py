@@ -1,17 +1,21 @@
+import asyncio
+import functools
 import logging
-from typing import List, Literal
+from typing import Any, Dict, List, Literal, Optional
 
 from haystack import Document, Pipeline, component, super_component
-from haystack.components.embedders import (
-    SentenceTransformersDocumentEmbedder,
-    SentenceTransformersTextEmbedder,
-)
+from haystack.components.embedders import SentenceTransformersTextEmbedder
 from haystack.components.retrievers import (
     InMemoryEmbeddingRetriever,
 )
 from haystack.components.writers import DocumentWriter
 from haystack.document_stores.in_memory import InMemoryDocumentStore
 
+from marcel.embedding import BatchedDocumentEmbedder
+from marcel.embedding_cache import CachedTextEmbedder, QueryEmbeddingCache
+from marcel.inference import haystack_backend, with_inference_backend
+from marcel.stats import collect_stats, reset_stats
+
 logger = logging.getLogger(__name__)
 
 
@@ -69,9 +73,12 @@ class FAQRetriever:
         embedding_model="all-MiniLM-L6-v2",
         embedding_similarity_function: Literal["dot_product", "cosine"] = "cosine",
         top_k=1,
+        inference_backend="torch",
+        embedding_cache: Optional[QueryEmbeddingCache] = None,
     ):
         # Assign parent IDs to FAQs.
-        # NOTE: this assumes 1-1 mapping of url to doc. Needs to be revisited if we chunk documents (1-n relation).
+        # NOTE: this assumes 1-1 mapping of url to doc, so pass pages rather than passages.
+        # With chunking, passages are aggregated to the same pages downstream (ParentAggregator).
         url_to_doc_id = {doc.meta["url"]: doc.id for doc in documents}
         faqs_with_parent = []
         for faq in faqs:
@@ -91,19 +98,34 @@ class FAQRetriever:
         faq_indexing = Pipeline()
         faq_indexing.add_component(
             "embedder",
-            SentenceTransformersDocumentEmbedder(
-                model=embedding_model, progress_bar=False
+            with_inference_backend(
+                BatchedDocumentEmbedder(
+                    model=embedding_model,
+                    progress_bar=False,
+                    backend=haystack_backend(inference_backend),
+                ),
+                inference_backend,
             ),
         )
         faq_indexing.add_component("writer", DocumentWriter(document_store=faq_store))
         faq_indexing.connect("embedder", "writer")
         faq_indexing.run({"documents": faqs_with_parent})
 
-        pipeline = Pipeline()
-        pipeline.add_component(
-            "query_embedder",
-            SentenceTransformersTextEmbedder(model=embedding_model, progress_bar=False),
+        query_embedder = with_inference_backend(
+            SentenceTransformersTextEmbedder(
+                model=embedding_model,
+                progress_bar=False,
+                backend=haystack_backend(inference_backend),
+            ),
+            inference_backend,
         )
+        if embedding_cache is not None:
+            query_embedder = CachedTextEmbedder(
+                query_embedder, embedding_cache, inference_backend=inference_backend
+            )
+
+        pipeline = Pipeline()
+        pipeline.add_component("query_embedder", query_embedder)
         pipeline.add_component(
             "faq_retriever",
             InMemoryEmbeddingRetriever(document_store=faq_store, top_k=top_k),
@@ -125,3 +147,20 @@ class FAQRetriever:
         self.embedding_model = embedding_model
         self.embedding_similarity_function = embedding_similarity_function
         self.top_k = top_k
+        self.inference_backend = inference_backend
+        self.embedding_cache = (
+            {"path": embedding_cache.path, "max_size": embedding_cache.max_size}
+            if embedding_cache is not None
+            else None
+        )
+
+    async def run_async(self, **kwargs: Any) -> Dict[str, Any]:
+        # The inner pipeline is synchronous, so it runs in a thread (e.g., in ConcurrentPipeline).
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(self.run, **kwargs))
+
+    def stats(self):
+        return collect_stats(self.pipeline)
+
+    def reset_stats(self):
+        reset_stats(self.pipeline)
@@ -0,0 +1,138 @@
+from dataclasses import replace
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from haystack import Document, component, default_to_dict
+
+JOIN_MODES = [
+    "reciprocal_rank_fusion",
+    "merge",
+    "comb_mnz",
+    "concatenate",
+    "distribution_based_rank_fusion",
+]
+
+# Same constant as Haystack's DocumentJoiner (60 from the paper, +1 for 0-based ranks).
+RRF_K = 61
+
+
+@component
+class ScoreFusionJoiner:
+    """Fuses the ranked lists of several retrievers into one list.
+
+    Unlike Haystack's `DocumentJoiner`, every retriever has its own named input
+    (e.g., `bm25`, `dense`), so that `weights` are matched to retrievers
+    deterministically. Fusion is computed on arrays of (document index, score)
+    and new `Document` objects are only created for the final `top_k`.
+
+    Join modes:
+
+    - reciprocal_rank_fusion: weighted RRF, normalized as in `DocumentJoiner`
+    - merge: weighted sum of retriever scores
+    - comb_mnz: weighted sum of min-max normalized scores times the number of retrievers returning the document
+    - concatenate, distribution_based_rank_fusion: as in `DocumentJoiner` (unweighted)
+    """
+
+    def __init__(
+        self,
+        retrievers: List[str],
+        weights: Optional[List[float]] = None,
+        join_mode: str = "reciprocal_rank_fusion",
+        top_k: Optional[int] = None,
+    ):
+        if join_mode not in JOIN_MODES:
+            raise ValueError(f"Invalid join mode {join_mode}.")
+        if weights and len(weights) != len(retrievers):
+            raise ValueError("Expected one weight per retriever.")
+
+        self.retrievers = retrievers
+        self.weights = weights
+        self.join_mode = join_mode
+        self.top_k = top_k
+        weights = weights or [1] * len(retrievers)
+        self.normalized_weights = np.array(weights, dtype=float) / sum(weights)
+
+        component.set_input_types(self, **{name: List[Document] for name in retrievers})
+
+    @component.output_types(documents=List[Document])
+    def run(self, **documents: List[Document]):
+        document_lists = [documents.get(name) or [] for name in self.retrievers]
+
+        # Map documents to indices, keeping the first instance of every document.
+        index: Dict[str, int] = {}
+        unique: List[Document] = []
+        positions = []
+        scores = []
+        for docs in document_lists:
+            position = np.empty(len(docs), dtype=np.intp)
+            for i, doc in enumerate(docs):
+                j = index.get(doc.id)
+                if j is None:
+                    j = index[doc.id] = len(unique)
+                    unique.append(doc)
+                position[i] = j
+            positions.append(position)
+            scores.append(
+                np.array(
+                    [np.nan if doc.score is None else doc.score for doc in docs],
+                    dtype=float,
+                )
+            )
+
+        fused = getattr(self, f"_{self.join_mode}")(positions, scores, len(unique))
+
+        top = np.argsort(-fused, kind="stable")[: self.top_k]
+        return {"documents": [replace(unique[j], score=float(fused[j])) for j in top]}
+
+    def _reciprocal_rank_fusion(self, positions, scores, n):
+        fused = np.zeros(n)
+        n_lists = len(positions)
+        for position, weight in zip(positions, self.normalized_weights):
+            ranks = np.arange(len(position))
+            np.add.at(fused, position, weight * n_lists / (RRF_K + ranks))
+        return fused / (n_lists / RRF_K)
+
+    def _merge(self, positions, scores, n):
+        fused = np.zeros(n)
+        for position, score, weight in zip(positions, scores, self.normalized_weights):
+            np.add.at(fused, position, weight * np.nan_to_num(score))
+        return fused
+
+    def _comb_mnz(self, positions, scores, n):
+        fused = np.zeros(n)
+        hits = np.zeros(n)
+        for position, score, weight in zip(positions, scores, self.normalized_weights):
+            if not len(position):
+                continue
+            score = np.nan_to_num(score)
+            delta = score.max() - score.min()
+            normalized = (score - score.min()) / delta if delta else np.ones_like(score)
+            np.add.at(fused, position, weight * normalized)
+            hits[np.unique(position)] += 1
+        return fused * hits
+
+    def _concatenate(self, positions, scores, n):
+        fused = np.full(n, -np.inf)
+        for position, score in zip(positions, scores):
+            np.maximum.at(fused, position, np.nan_to_num(score, nan=-np.inf))
+        return fused
+
+    def _distribution_based_rank_fusion(self, positions, scores, n):
+        normalized = []
+        for score in scores:
+            score = np.nan_to_num(score)
+            if len(score):
+                low = score.mean() - 3 * score.std()
+                delta = 6 * score.std()
+                score = (score - low) / delta if delta else np.zeros_like(score)
+            normalized.append(score)
+        return self._concatenate(positions, normalized, n)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return default_to_dict(
+            self,
+            retrievers=self.retrievers,
+            weights=self.weights,
+            join_mode=self.join_mode,
+            top_k=self.top_k,
+        )
@@ -4,11 +4,13 @@ from typing import List
 import numpy as np
 from haystack import Pipeline, component
 from haystack.components.builders import ChatPromptBuilder
-from haystack.components.embedders import SentenceTransformersDocumentEmbedder
 from haystack.components.generators.chat import OpenAIChatGenerator
 from haystack.dataclasses import ChatMessage, Document
 from haystack.utils import Secret
 
+from marcel.embedding import BatchedDocumentEmbedder
+from marcel.inference import haystack_backend, with_inference_backend
+
 system_prompt = """You are an employee at the University of Marburg. Your task is to generate documents that provide useful information to help students with their study-related questions. Your response should be formatted as a Markdown page, suitable for publication on the university website. Make sure that the page includes all relevant information, but keep the length below 300 words."""
 
 user_prompt = "This is a student question: {{question}}\n\nGenerated page:"
@@ -41,12 +43,14 @@ class HyDE:
         temperature=0.75,
         max_tokens=512,
         embedding_prefix="",
+        inference_backend="torch",
     ):
         self.embedding_model = embedding_model
         self.n = n
         self.temperature = temperature
         self.max_tokens = max_tokens
         self.embedding_prefix = embedding_prefix
+        self.inference_backend = inference_backend
 
         pipeline = Pipeline()
         pipeline.add_component("prompt_builder", ChatPromptBuilder())
@@ -68,8 +72,14 @@ class HyDE:
         pipeline.add_component("document_converter", ChatMessagesToDocuments())
         pipeline.add_component(
             "document_embedder",
-            SentenceTransformersDocumentEmbedder(
-                model=embedding_model, progress_bar=False, prefix=embedding_prefix
+            with_inference_backend(
+                BatchedDocumentEmbedder(
+                    model=embedding_model,
+                    progress_bar=False,
+                    prefix=embedding_prefix,
+                    backend=haystack_backend(inference_backend),
+                ),
+                inference_backend,
             ),
         )
         pipeline.add_component("embedding_aggregator", AverageDocumentEmbedding())
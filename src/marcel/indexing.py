@@ -0,0 +1,343 @@
+"""Build and incrementally update a persistent document index.
+
+An index directory holds the indexed documents (pages or passages) with their
+embeddings and the settings used to build them:
+
+    <index_path>/index.json        settings, number and fingerprint of the documents
+    <index_path>/documents.jsonl   documents without embeddings
+    <index_path>/embeddings.npy    embedding matrix (row i belongs to line i)
+
+`index.json` is removed before and written after the other files, so an
+interrupted update leaves no index (rebuilt on the next run) rather than a mix
+of old and new files. Indexes whose files do not match `index.json` are rebuilt
+as well.
+
+Updating an index with a new crawl snapshot diffs the pages by their
+`fingerprint` (see `data_loader.load_documents`): documents of removed or
+changed pages are dropped and only added or changed pages are chunked and
+embedded.
+Sparse-only runs (without an embedding model) use the documents of an embedded
+index without their embeddings. They embed no added pages and leave the index
+as it is.
+
+Example:
+
+    python src/marcel/indexing.py \\
+        --data_path data/crawls/20250317/data.jsonl \\
+        --index_path indexes/minilm \\
+        --embedding_model all-MiniLM-L6-v2
+"""
+
+import argparse
+import json
+import logging
+from dataclasses import replace
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from haystack import Document, Pipeline
+from haystack.document_stores.in_memory import InMemoryDocumentStore
+
+from marcel import data_loader
+from marcel.chunking import chunk_documents
+from marcel.inference import (
+    INFERENCE_BACKENDS,
+    haystack_backend,
+    with_inference_backend,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def index_settings(
+    embedding_model: Optional[str] = None,
+    chunking: str = "none",
+    chunk_max_tokens: int = 200,
+    inference_backend: str = "torch",
+) -> Dict[str, Any]:
+    """Settings which must match for an index to be updated incrementally."""
+    return {
+        "embedding_model": embedding_model,
+        "inference_backend": inference_backend if embedding_model else None,
+        "chunking": chunking,
+        "chunk_max_tokens": chunk_max_tokens if chunking != "none" else None,
+    }
+
+
+def prepare_documents(
+    pages: List[Document], settings: Dict[str, Any]
+) -> List[Document]:
+    if settings["chunking"] == "markdown":
+        return chunk_documents(pages, max_tokens=settings["chunk_max_tokens"])
+    return pages
+
+
+def embed_documents(
+    documents: List[Document],
+    embedding_model: Optional[str],
+    workers: int = 1,
+    inference_backend: Optional[str] = None,
+) -> List[Document]:
+    if not embedding_model or not documents:
+        return documents
+    # Imported here as it loads torch (not needed for sparse-only indexes).
+    from marcel.embedding import BatchedDocumentEmbedder, embed_documents_parallel
+
+    inference_backend = inference_backend or "torch"
+    if workers > 1:
+        return embed_documents_parallel(
+            documents,
+            embedding_model,
+            workers=workers,
+            inference_backend=inference_backend,
+        )
+    embedder = BatchedDocumentEmbedder(
+        model=embedding_model, backend=haystack_backend(inference_backend)
+    )
+    pipeline = Pipeline()
+    pipeline.add_component(
+        "embedder", with_inference_backend(embedder, inference_backend)
+    )
+    return pipeline.run({"documents": documents})["embedder"]["documents"]
+
+
+def page_fingerprint(doc: Document) -> str:
+    return doc.meta.get("fingerprint", doc.id)
+
+
+def update_documents(
+    indexed: List[Document],
+    pages: List[Document],
+    settings: Dict[str, Any],
+    workers: int = 1,
+) -> Tuple[List[Document], Dict[str, int]]:
+    """Bring `indexed` documents in line with `pages`, embedding only what changed."""
+    new_fingerprints = {page_fingerprint(page) for page in pages}
+    old_fingerprints = {page_fingerprint(doc) for doc in indexed}
+
+    kept = [doc for doc in indexed if page_fingerprint(doc) in new_fingerprints]
+    added_pages = [p for p in pages if page_fingerprint(p) not in old_fingerprints]
+    added = embed_documents(
+        prepare_documents(added_pages, settings),
+        settings["embedding_model"],
+        workers=workers,
+        inference_backend=settings.get("inference_backend"),
+    )
+
+    stats = {
+        "pages": len(pages),
+        "pages_added": len(added_pages),
+        "pages_removed": len(old_fingerprints - new_fingerprints),
+        "documents_kept": len(kept),
+        "documents_added": len(added),
+        "documents_removed": len(indexed) - len(kept),
+    }
+    return kept + added, stats
+
+
+def documents_fingerprint(documents: List[Document]) -> str:
+    return data_loader.fingerprint([doc.id for doc in documents])
+
+
+def load_index(index_path) -> Tuple[Dict[str, Any], List[Document]]:
+    """Settings and documents of the index at `index_path`.
+
+    Raises a `ValueError` if the files do not belong together.
+    """
+    index_path = Path(index_path)
+    with open(index_path / "index.json") as fin:
+        index = json.load(fin)
+    settings = index["settings"]
+
+    with open(index_path / "documents.jsonl") as fin:
+        documents = [Document.from_dict(json.loads(line)) for line in fin]
+    if len(documents) != index.get("documents") or documents_fingerprint(
+        documents
+    ) != index.get("fingerprint"):
+        raise ValueError(f"{index_path}/documents.jsonl does not match index.json.")
+
+    if settings["embedding_model"]:
+        embeddings = np.load(index_path / "embeddings.npy")
+        if len(embeddings) != len(documents):
+            raise ValueError(
+                f"{index_path}/embeddings.npy has {len(embeddings)} rows "
+                f"for {len(documents)} documents."
+            )
+        documents = [
+            replace(doc, embedding=embedding.tolist())
+            for doc, embedding in zip(documents, embeddings)
+        ]
+    return settings, documents
+
+
+def save_index(index_path, settings: Dict[str, Any], documents: List[Document]):
+    index_path = Path(index_path)
+    index_path.mkdir(parents=True, exist_ok=True)
+    # Invalidates the index until all files are written.
+    (index_path / "index.json").unlink(missing_ok=True)
+
+    tmp_path = index_path / "documents.jsonl.tmp"
+    with open(tmp_path, "w") as fout:
+        for doc in documents:
+            fout.write(json.dumps(replace(doc, embedding=None).to_dict()) + "\n")
+    tmp_path.rename(index_path / "documents.jsonl")
+
+    embeddings_path = index_path / "embeddings.npy"
+    if settings["embedding_model"]:
+        embeddings = np.array([doc.embedding for doc in documents], dtype=np.float32)
+        with open(index_path / "embeddings.npy.tmp", "wb") as fout:
+            np.save(fout, embeddings)
+        (index_path / "embeddings.npy.tmp").rename(embeddings_path)
+    elif embeddings_path.exists():
+        embeddings_path.unlink()
+
+    with open(index_path / "index.json.tmp", "w") as fout:
+        json.dump(
+            {
+                "settings": settings,
+                "documents": len(documents),
+                "fingerprint": documents_fingerprint(documents),
+            },
+            fout,
+            indent=4,
+        )
+    (index_path / "index.json.tmp").rename(index_path / "index.json")
+
+
+def update_index(
+    pages: List[Document], index_path, settings: Dict[str, Any], workers: int = 1
+) -> Tuple[List[Document], Dict[str, int]]:
+    """Load the index at `index_path` (if compatible), update it with `pages` and save it."""
+    indexed = []
+    old_settings = None
+    if (Path(index_path) / "index.json").exists():
+        try:
+            old_settings, old_documents = load_index(index_path)
+        except (OSError, ValueError) as e:
+            logger.warning("Rebuilding index %s (%s)", index_path, e)
+    if old_settings is not None:
+        if settings["embedding_model"] is None and old_settings["embedding_model"]:
+            return update_sparse(
+                old_settings, old_documents, pages, settings, index_path
+            )
+        if old_settings == settings:
+            indexed = old_documents
+        else:
+            logger.warning(
+                "Rebuilding index %s (settings changed from %s to %s)",
+                index_path,
+                old_settings,
+                settings,
+            )
+
+    documents, stats = update_documents(indexed, pages, settings, workers=workers)
+    if stats["documents_added"] or stats["documents_removed"] or not indexed:
+        save_index(index_path, settings, documents)
+    return documents, stats
+
+
+def update_sparse(
+    old_settings: Dict[str, Any],
+    old_documents: List[Document],
+    pages: List[Document],
+    settings: Dict[str, Any],
+    index_path,
+) -> Tuple[List[Document], Dict[str, int]]:
+    """Update the documents of an embedded index for sparse retrievers only.
+
+    Added pages are not embedded, so no embedding model is loaded. The index is
+    left as it is, as its documents would no longer all have embeddings.
+    """
+    embedded_settings = {
+        **settings,
+        "embedding_model": old_settings["embedding_model"],
+        "inference_backend": old_settings.get("inference_backend"),
+    }
+    if old_settings != embedded_settings:
+        logger.warning(
+            "Not using index %s (settings %s differ from %s)",
+            index_path,
+            old_settings,
+            embedded_settings,
+        )
+        return update_documents([], pages, settings)
+    indexed = [replace(doc, embedding=None) for doc in old_documents]
+    documents, stats = update_documents(indexed, pages, settings)
+    if stats["documents_added"] or stats["documents_removed"]:
+        logger.warning(
+            "Index %s is out of date; it is updated by runs with the embedding model %s.",
+            index_path,
+            old_settings["embedding_model"],
+        )
+    return documents, stats
+
+
+def build_documents(
+    pages: List[Document],
+    settings: Dict[str, Any],
+    index_path: Optional[str] = None,
+    embedding_workers: int = 1,
+) -> List[Document]:
+    """Indexed (and possibly embedded) documents of `pages`, using the persistent index at `index_path` if given."""
+    if index_path:
+        documents, stats = update_index(
+            pages, index_path, settings, workers=embedding_workers
+        )
+        print("Index update:", stats)
+        return documents
+    return embed_documents(
+        prepare_documents(pages, settings),
+        settings["embedding_model"],
+        workers=embedding_workers,
+        inference_backend=settings.get("inference_backend"),
+    )
+
+
+def build_document_store(
+    pages: List[Document],
+    settings: Dict[str, Any],
+    embedding_similarity_function: str = "cosine",
+    index_path: Optional[str] = None,
+    embedding_workers: int = 1,
+) -> InMemoryDocumentStore:
+    documents = build_documents(pages, settings, index_path, embedding_workers)
+    document_store = InMemoryDocumentStore(
+        embedding_similarity_function=embedding_similarity_function
+    )
+    document_store.write_documents(documents)
+    return document_store
+
+
+def main(args):
+    pages = data_loader.load_documents(args.data_path)
+    settings = index_settings(
+        embedding_model=args.embedding_model,
+        chunking=args.chunking,
+        chunk_max_tokens=args.chunk_max_tokens,
+        inference_backend=args.inference_backend,
+    )
+    _, stats = update_index(
+        pages, args.index_path, settings, workers=args.embedding_workers
+    )
+    print(json.dumps(stats, indent=4))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+
+    # fmt: off
+    parser.add_argument("--data_path", type=str, required=True, help="Path to the JSONL file containing documents (new crawl snapshot).")
+    parser.add_argument("--index_path", type=str, required=True, help="Index directory to create or update.")
+    parser.add_argument("--embedding_model", type=str, required=False, help="Embedding model (omit for a BM25-only index).")
+    parser.add_argument("--chunking", type=str, choices=["none", "markdown"], default="none")
+    parser.add_argument("--chunk_max_tokens", type=int, default=200)
+    parser.add_argument("--inference_backend", type=str, choices=INFERENCE_BACKENDS, default="torch")
+    parser.add_argument("--embedding_workers", type=int, default=1, help="Embed with this many CPU worker processes (see embedding.py).")
+    # fmt: on
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,247 @@
+"""Inference backends for the SentenceTransformers embedders and cross-encoder rankers.
+
+- torch: PyTorch eager inference (default)
+- onnx: ONNX Runtime via SentenceTransformers (requires `optimum[onnxruntime]`; models are exported on first use)
+- torch_qint8: PyTorch with dynamic int8 quantization of all linear layers (CPU only)
+
+Running this module compares the backends on the crawl: latency per model and
+parity of embeddings (cosine similarity) and reranker scores with torch.
+
+Example:
+
+    python src/marcel/inference.py \\
+        --data_path data/crawls/20250317/data.jsonl \\
+        --query_path data/queries/20250317-email.json \\
+        --embedding_models all-MiniLM-L6-v2 sentence-transformers/msmarco-bert-base-dot-v5 \\
+        --reranker_models mixedbread-ai/mxbai-rerank-base-v1 jinaai/jina-reranker-v1-tiny-en \\
+        --out_path output/benchmarks/inference_backends.json
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+INFERENCE_BACKENDS = ["torch", "onnx", "torch_qint8"]
+
+
+def haystack_backend(inference_backend: str) -> str:
+    """Value of the `backend` init parameter of Haystack's SentenceTransformers components."""
+    return "onnx" if inference_backend == "onnx" else "torch"
+
+
+def quantize_dynamic(model):
+    import torch
+
+    torch.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+    )
+    return model
+
+
+def loaded_model(component):
+    """The torch module of a warmed-up embedder or ranker."""
+    embedding_backend = getattr(component, "embedding_backend", None)
+    if embedding_backend is not None:
+        return embedding_backend.model
+    return component._cross_encoder
+
+
+def with_inference_backend(component, inference_backend: str):
+    """Quantize the model of `component` after loading it (`torch_qint8`).
+
+    The `onnx` backend is selected through the component's `backend` parameter
+    instead (see `haystack_backend`). For `torch_qint8`, `to_dict()` records the
+    backend as `inference_backend`, as `backend` is "torch".
+    """
+    if inference_backend == "torch_qint8":
+        warm_up = component.warm_up
+
+        def warm_up_quantized():
+            warm_up()
+            # Already quantized layers are no longer nn.Linear, so this is idempotent.
+            quantize_dynamic(loaded_model(component))
+
+        component.warm_up = warm_up_quantized
+
+        to_dict = getattr(component, "to_dict", None)
+        if to_dict is not None:
+
+            def to_dict_with_backend():
+                data = to_dict()
+                data["init_parameters"]["inference_backend"] = inference_backend
+                return data
+
+            component.to_dict = to_dict_with_backend
+    return component
+
+
+def load_sentence_transformer(model: str, inference_backend: str = "torch"):
+    from sentence_transformers import SentenceTransformer
+
+    encoder = SentenceTransformer(
+        model, device="cpu", backend=haystack_backend(inference_backend)
+    )
+    if inference_backend == "torch_qint8":
+        quantize_dynamic(encoder)
+    return encoder
+
+
+def load_cross_encoder(model: str, inference_backend: str = "torch"):
+    from sentence_transformers import CrossEncoder
+
+    ranker = CrossEncoder(
+        model, device="cpu", backend=haystack_backend(inference_backend)
+    )
+    if inference_backend == "torch_qint8":
+        quantize_dynamic(ranker)
+    return ranker
+
+
+def serialize_calls(model, methods=("encode", "predict", "rank")):
+    """Guard the inference methods of a model shared between threads with one lock (idempotent)."""
+    if getattr(model, "_marcel_lock", None) is not None:
+        return
+    lock = threading.RLock()
+    for method in methods:
+        call = getattr(model, method, None)
+        if call is None:
+            continue
+
+        def locked(*args, call=call, **kwargs):
+            with lock:
+                return call(*args, **kwargs)
+
+        setattr(model, method, locked)
+    model._marcel_lock = lock
+
+
+def model_components(instance):
+    """Components holding a model, including those nested in pipelines and ranker wrappers."""
+    if hasattr(instance, "_cross_encoder") or hasattr(instance, "embedding_backend"):
+        yield instance
+    nested = getattr(instance, "pipeline", None)
+    if nested is not None:
+        for name in nested.graph.nodes:
+            yield from model_components(nested.get_component(name))
+    for attribute in ["base_ranker", "base_embedder", "first_stage", "second_stage"]:
+        nested = getattr(instance, attribute, None)
+        if nested is not None and hasattr(nested, "run"):
+            yield from model_components(nested)
+
+
+def pipeline_models(pipeline):
+    return [
+        component
+        for name in pipeline.graph.nodes
+        for component in model_components(pipeline.get_component(name))
+    ]
+
+
+def serialize_model_calls(pipeline):
+    """Serialize calls into the (warmed-up) models of `pipeline`, which may be shared between threads.
+
+    Fast tokenizers of a model must not be used by two threads at once.
+    """
+    for component in pipeline_models(pipeline):
+        model = getattr(component, "_cross_encoder", None)
+        if model is None and getattr(component, "embedding_backend", None) is not None:
+            model = component.embedding_backend.model
+        if model is not None:
+            serialize_calls(model)
+
+
+def compare_embedders(model: str, texts: List[str], backends: List[str]):
+    results: Dict[str, Any] = {}
+    reference = None
+    for backend in backends:
+        encoder = load_sentence_transformer(model, backend)
+        encoder.encode(texts[:8])  # warm-up
+        start = time.perf_counter()
+        embeddings = encoder.encode(texts, normalize_embeddings=True)
+        seconds = time.perf_counter() - start
+        results[backend] = {"docs_per_second": len(texts) / seconds}
+        if reference is None:
+            reference = embeddings
+        cosine = np.sum(embeddings * reference, axis=1)
+        results[backend]["cosine_vs_reference_mean"] = float(np.mean(cosine))
+        results[backend]["cosine_vs_reference_min"] = float(np.min(cosine))
+    return results
+
+
+def compare_rankers(model: str, candidates: List[List[List[str]]], backends):
+    """`candidates` holds the (query, document) pairs of every query."""
+    results: Dict[str, Any] = {}
+    reference = None
+    for backend in backends:
+        ranker = load_cross_encoder(model, backend)
+        ranker.predict(candidates[0][:8])  # warm-up
+        start = time.perf_counter()
+        scores = [ranker.predict(pairs) for pairs in candidates]
+        seconds = time.perf_counter() - start
+        n_pairs = sum(len(pairs) for pairs in candidates)
+        results[backend] = {"pairs_per_second": n_pairs / seconds}
+        if reference is None:
+            reference = scores
+        results[backend]["max_abs_score_diff"] = float(
+            max(np.max(np.abs(a - b)) for a, b in zip(scores, reference))
+        )
+        results[backend]["top1_agreement"] = float(
+            np.mean([np.argmax(a) == np.argmax(b) for a, b in zip(scores, reference)])
+        )
+    return results
+
+
+def main(args):
+    from marcel import data_loader
+
+    rng = random.Random(args.seed)
+    documents = data_loader.load_documents(args.data_path)
+    texts = [doc.content or "" for doc in documents]
+    queries = data_loader.load_queries(args.query_path)
+
+    report: Dict[str, Any] = {"args": vars(args), "embedders": {}, "rankers": {}}
+    sample = rng.sample(texts, min(args.n_docs, len(texts)))
+    for model in args.embedding_models:
+        report["embedders"][model] = compare_embedders(model, sample, args.backends)
+        print(model, json.dumps(report["embedders"][model]))
+
+    candidates = [
+        [[query["question"], text] for text in rng.sample(texts, min(20, len(texts)))]
+        for query in rng.sample(queries, min(args.n_queries, len(queries)))
+    ]
+    for model in args.reranker_models:
+        report["rankers"][model] = compare_rankers(model, candidates, args.backends)
+        print(model, json.dumps(report["rankers"][model]))
+
+    out_path = Path(args.out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(out_path, "w") as fout:
+        json.dump(report, fout, indent=4)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+
+    # fmt: off
+    parser.add_argument("--data_path", type=str, required=True)
+    parser.add_argument("--query_path", type=str, required=True)
+    parser.add_argument("--embedding_models", type=str, nargs="*", default=["all-MiniLM-L6-v2"])
+    parser.add_argument("--reranker_models", type=str, nargs="*", default=["mixedbread-ai/mxbai-rerank-base-v1"])
+    parser.add_argument("--backends", type=str, nargs="+", choices=INFERENCE_BACKENDS, default=INFERENCE_BACKENDS, help="The first backend is the reference for parity.")
+    parser.add_argument("--n_docs", type=int, default=500, help="Pages embedded per model and backend.")
+    parser.add_argument("--n_queries", type=int, default=20, help="Queries reranked (20 pages each) per model and backend.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out_path", type=str, default="output/benchmarks/inference_backends.json")
+    # fmt: on
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,212 @@
+"""Client-side admission control for requests to the LLM server.
+
+All generators of a process which talk to the same server share one
+`LLMScheduler`, which lets at most `max_concurrency` requests run at once.
+Waiting requests are started in order of their priority class:
+
+- interactive: questions of users (e.g., the retrieval server).
+- batch: answers of evaluation runs.
+- prefetch: HyDE documents of queries which have not reached the generator yet.
+
+Within a class, requests of the query with the fewest running requests go
+first, so the `n` samples of one query do not hold up other queries. With
+`reserved_slots`, batch and prefetch requests leave that many slots to
+interactive requests, which bounds their latency while batch jobs use the
+remaining capacity. With `max_queued`, `wait_for_capacity` blocks callers
+(e.g., `run_experiment` before starting the next query) while that many batch or
+prefetch requests are waiting.
+"""
+
+import itertools
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from marcel.data_loader import fingerprint
+
+PRIORITIES = ["interactive", "batch", "prefetch"]
+
+
+class LLMScheduler:
+    def __init__(
+        self,
+        max_concurrency: int,
+        reserved_slots: int = 0,
+        max_queued: Optional[int] = None,
+    ):
+        if not 0 <= reserved_slots < max_concurrency:
+            raise ValueError(
+                f"reserved_slots must be less than max_concurrency ({max_concurrency})."
+            )
+        self.max_concurrency = max_concurrency
+        self.reserved_slots = reserved_slots
+        self.max_queued = max_queued
+
+        self.condition = threading.Condition()
+        self.sequence = itertools.count()
+        self.waiting: List[List[Any]] = []  # [priority, sequence, key]
+        self.in_flight = 0
+        self.in_flight_by_key: Counter = Counter()
+        self.reset_stats()
+
+    def settings(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "reserved_slots": self.reserved_slots,
+            "max_queued": self.max_queued,
+        }
+
+    def _capacity(self, priority: int) -> int:
+        if priority == 0:
+            return self.max_concurrency
+        return self.max_concurrency - self.reserved_slots
+
+    def _is_next(self, ticket) -> bool:
+        if self.in_flight >= self._capacity(ticket[0]):
+            return False
+        first = min(
+            self.waiting,
+            key=lambda other: (other[0], self.in_flight_by_key[other[2]], other[1]),
+        )
+        return first is ticket
+
+    @contextmanager
+    def slot(self, priority: str = "batch", key: Optional[str] = None):
+        """Wait until the request may be sent; `key` identifies its query."""
+        ticket = [PRIORITIES.index(priority), next(self.sequence), key]
+        start = time.perf_counter()
+        with self.condition:
+            self.waiting.append(ticket)
+            while not self._is_next(ticket):
+                self.condition.wait()
+            self.waiting.remove(ticket)
+            self.in_flight += 1
+            self.in_flight_by_key[key] += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+            waited = time.perf_counter() - start
+            self.requests[priority] += 1
+            self.wait_seconds[priority] += waited
+            self.max_wait_seconds[priority] = max(
+                self.max_wait_seconds[priority], waited
+            )
+            # Another request may fit as well (e.g., after the reserve was freed).
+            self.condition.notify_all()
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.in_flight -= 1
+                self.in_flight_by_key[key] -= 1
+                if not self.in_flight_by_key[key]:
+                    del self.in_flight_by_key[key]
+                self.condition.notify_all()
+
+    def _queued(self) -> int:
+        """Waiting batch and prefetch requests."""
+        return sum(1 for ticket in self.waiting if ticket[0] > 0)
+
+    def wait_for_capacity(self):
+        """Backpressure: block while `max_queued` batch or prefetch requests are waiting."""
+        if self.max_queued is None:
+            return
+        with self.condition:
+            while self._queued() >= self.max_queued:
+                self.condition.wait()
+
+    def reset_stats(self):
+        with self.condition:
+            self.max_in_flight = self.in_flight
+            self.requests = Counter()
+            self.wait_seconds: Dict[str, float] = Counter()
+            self.max_wait_seconds: Dict[str, float] = Counter()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.condition:
+            return {
+                **self.settings(),
+                "max_in_flight": self.max_in_flight,
+                "queued": self._queued(),
+                "priorities": {
+                    name: {
+                        "requests": self.requests[name],
+                        "mean_wait_ms": 1000
+                        * self.wait_seconds[name]
+                        / self.requests[name],
+                        "max_wait_ms": 1000 * self.max_wait_seconds[name],
+                    }
+                    for name in PRIORITIES
+                    if self.requests[name]
+                },
+            }
+
+
+_schedulers: Dict[str, LLMScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def shared_scheduler(
+    base_url: str,
+    max_concurrency: int,
+    reserved_slots: int = 0,
+    max_queued: Optional[int] = None,
+) -> LLMScheduler:
+    """The scheduler of the server at `base_url`, shared by all pipelines of the process."""
+    with _schedulers_lock:
+        scheduler = _schedulers.get(base_url)
+        if scheduler is None:
+            scheduler = LLMScheduler(max_concurrency, reserved_slots, max_queued)
+            _schedulers[base_url] = scheduler
+        elif scheduler.settings() != {
+            "max_concurrency": max_concurrency,
+            "reserved_slots": reserved_slots,
+            "max_queued": max_queued,
+        }:
+            raise ValueError(
+                f"The scheduler of {base_url} already exists with {scheduler.settings()}."
+            )
+        return scheduler
+
+
+def schedule_calls(generator, scheduler: LLMScheduler, priority: str = "batch"):
+    """Send every request of a chat generator through `scheduler`.
+
+    The `run` method of the instance is wrapped (idempotent). Requests with the
+    same messages (the samples of one query) share a fair-share key.
+    """
+    if priority not in PRIORITIES:
+        raise ValueError(f"Invalid priority {priority}.")
+    if getattr(generator, "_marcel_scheduler", None) is not None:
+        return generator
+    run = generator.run
+
+    def scheduled_run(messages, **kwargs):
+        key = fingerprint([(message.role, message.text) for message in messages])
+        with scheduler.slot(priority, key):
+            return run(messages=messages, **kwargs)
+
+    generator.run = scheduled_run
+    generator._marcel_scheduler = scheduler
+    return generator
+
+
+def schedulers(instance) -> List[LLMScheduler]:
+    """Schedulers used by the generators of a pipeline or component (including nested ones)."""
+    found = []
+    scheduler = getattr(instance, "_marcel_scheduler", None)
+    if scheduler is not None:
+        found.append(scheduler)
+    nested = getattr(instance, "pipeline", None)
+    if nested is not None:
+        for name in nested.graph.nodes:
+            found += schedulers(nested.get_component(name))
+    if hasattr(instance, "graph"):
+        for name in instance.graph.nodes:
+            found += schedulers(instance.get_component(name))
+    for attribute in ["generator", "base_generator"]:
+        nested = getattr(instance, attribute, None)
+        if nested is not None and hasattr(nested, "run"):
+            found += schedulers(nested)
+    return list({id(scheduler): scheduler for scheduler in found}.values())
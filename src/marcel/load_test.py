@@ -0,0 +1,313 @@
+"""Load tests and capacity report of the full RAG pipeline, without GPUs.
+
+Starts a mock OpenAI-compatible server (see `mock_llm.py`) in the background,
+builds the pipeline of every configuration from the usual `retrievers.py`
+arguments (after `--`, extended by each of `--configs`) and replays the query
+file with `run_pipeline` under two kinds of load:
+
+- closed loop (`--concurrency`): every client sends its next query once the
+  previous one is answered.
+- open loop (`--arrival_rates`): queries arrive as a Poisson process (queries
+  per second) and are served by at most `--max_clients` concurrent clients.
+  Queries wait for a free client, which is reported as queueing delay, and
+  their latency includes that wait.
+
+For every configuration and load, the report contains throughput, latency
+percentiles, queueing delay, failed queries (after the retries of the OpenAI
+client) and the counters of the mock server. With `--slo_p99_ms`, it also gives
+the highest throughput per configuration which meets the p99 latency and error
+rate objectives. Results are written as JSON, with a Markdown table next to it.
+
+Example:
+
+    python src/marcel/load_test.py --concurrency 1 4 16 --arrival_rates 1 2 4 \\
+        --slo_p99_ms 5000 --configs "" "--use_reranker --reranker_model jinaai/jina-reranker-v1-tiny-en" -- \\
+        --data_path data/crawls/20250317/data.jsonl \\
+        --query_path data/queries/20250317-email.example.json \\
+        --retrievers bm25 dense --use_generator
+
+With `--base_url`, the same load is sent to a real server (e.g., vLLM) instead.
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import random
+import shlex
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from marcel.benchmark import environment, latency_stats
+from marcel.mock_llm import add_mock_args, mock_from_args, start_server
+
+logger = logging.getLogger(__name__)
+
+
+def failed(result: Dict[str, Any]) -> bool:
+    """`run_pipeline` logs errors and returns a result with an `error` instead of raising."""
+    return "error" in result
+
+
+def summarize(runs, wall_seconds: float) -> Dict[str, Any]:
+    """`runs` are tuples of pipeline result, queueing delay and latency (in seconds)."""
+    latencies = [latency for result, _, latency in runs if not failed(result)]
+    failures = len(runs) - len(latencies)
+    return {
+        "queries": len(runs),
+        "failures": failures,
+        "error_rate": failures / len(runs) if runs else None,
+        "wall_seconds": wall_seconds,
+        "throughput_qps": len(latencies) / wall_seconds if wall_seconds else None,
+        "latency": latency_stats(latencies),
+        "queue_delay": latency_stats([delay for _, delay, _ in runs]),
+    }
+
+
+def closed_loop(pipeline, pipeline_runner, queries, concurrency: int):
+    """Run `queries` with `concurrency` clients, each waiting for its previous answer."""
+
+    def run(query):
+        start = time.perf_counter()
+        result = pipeline_runner(pipeline, query)
+        return result, 0.0, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        runs = list(pool.map(run, queries))
+    wall_seconds = time.perf_counter() - start
+    return {
+        "mode": "closed",
+        "concurrency": concurrency,
+        **summarize(runs, wall_seconds),
+    }
+
+
+def arrival_times(n: int, rate: float, seed: int = 0) -> List[float]:
+    """Arrival times (seconds from the start) of a Poisson process with `rate` per second."""
+    rng = random.Random(seed)
+    return list(itertools.accumulate(rng.expovariate(rate) for _ in range(n)))
+
+
+def open_loop(
+    pipeline,
+    pipeline_runner,
+    queries,
+    arrival_rate: float,
+    max_clients: int = 64,
+    seed: int = 0,
+):
+    """Send `queries` at Poisson arrivals, independent of how fast they are answered."""
+    start = time.perf_counter()
+
+    def run(query, arrival):
+        started = time.perf_counter()
+        result = pipeline_runner(pipeline, query)
+        end = time.perf_counter()
+        return result, started - (start + arrival), end - (start + arrival)
+
+    futures = []
+    with ThreadPoolExecutor(max_clients) as pool:
+        for query, arrival in zip(
+            queries, arrival_times(len(queries), arrival_rate, seed)
+        ):
+            time.sleep(max(0.0, start + arrival - time.perf_counter()))
+            futures.append(pool.submit(run, query, arrival))
+        runs = [future.result() for future in futures]
+    wall_seconds = time.perf_counter() - start
+    return {
+        "mode": "open",
+        "arrival_rate": arrival_rate,
+        "max_clients": max_clients,
+        **summarize(runs, wall_seconds),
+    }
+
+
+def load_label(result: Dict[str, Any]) -> str:
+    if result["mode"] == "closed":
+        return f"{result['concurrency']} clients"
+    return f"{result['arrival_rate']:g} q/s"
+
+
+def capacity(
+    results: List[Dict[str, Any]],
+    slo_p99_ms: float,
+    slo_error_rate: float = 0.01,
+) -> Dict[str, Any]:
+    """Highest throughput per configuration among the loads which meet the objectives."""
+    report: Dict[str, Any] = {}
+    for result in results:
+        report.setdefault(result["config"], None)
+        latency = result["latency"]
+        if not latency or latency["p99_ms"] > slo_p99_ms:
+            continue
+        if result["error_rate"] > slo_error_rate:
+            continue
+        best = report[result["config"]]
+        if best is None or result["throughput_qps"] > best["throughput_qps"]:
+            report[result["config"]] = {
+                "load": load_label(result),
+                "throughput_qps": result["throughput_qps"],
+                "p99_ms": latency["p99_ms"],
+            }
+    return report
+
+
+def capacity_table(results: List[Dict[str, Any]]) -> str:
+    """Markdown table of throughput, latency, queueing delay and errors per configuration and load."""
+
+    def ms(stats, key):
+        return f"{stats[key]:.0f}" if stats else "-"
+
+    lines = [
+        "| config | load | throughput (q/s) | p50 (ms) | p95 (ms) | p99 (ms) | queue p95 (ms) | errors |",
+        "|---|---|---|---|---|---|---|---|",
+    ]
+    for result in results:
+        latency, queue = result["latency"], result["queue_delay"]
+        lines.append(
+            f"| {result['config'] or 'default'} | {load_label(result)} "
+            f"| {result['throughput_qps']:.2f} "
+            f"| {ms(latency, 'p50_ms')} | {ms(latency, 'p95_ms')} | {ms(latency, 'p99_ms')} "
+            f"| {ms(queue, 'p95_ms')} | {result['error_rate']:.1%} |"
+        )
+    return "\n".join(lines)
+
+
+def repeat(queries: List[Any], n: int) -> List[Any]:
+    """The first `n` queries, cycling through them if there are fewer."""
+    return list(itertools.islice(itertools.cycle(queries), n)) if queries else []
+
+
+def main(args, configs: Dict[str, Any]):
+    from marcel.experiment_runner import warm_up
+    from marcel.retrievers import run_pipeline
+    from marcel.sweep import SharedResources
+
+    mock = server = None
+    if args.base_url:
+        os.environ["OPENAI_BASE_URL"] = args.base_url
+    else:
+        mock = mock_from_args(args)
+        server, base_url = start_server(mock)
+        os.environ["OPENAI_BASE_URL"] = base_url
+        os.environ["OPENAI_API_KEY"] = "mock"
+        print(f"mock server = {base_url}")
+    if args.max_retries is not None:
+        os.environ["OPENAI_MAX_RETRIES"] = str(args.max_retries)
+    if args.timeout is not None:
+        os.environ["OPENAI_TIMEOUT"] = str(args.timeout)
+
+    loads = [("closed", concurrency) for concurrency in args.concurrency]
+    loads += [("open", rate) for rate in args.arrival_rates]
+
+    resources = SharedResources()
+    results = []
+    try:
+        for name, config in configs.items():
+            if config.generation_model is None:
+                config.generation_model = "mock"
+            if not config.use_generator and "hyde" not in config.retrievers:
+                logger.warning("%r sends no requests to the LLM.", name or "default")
+            queries = resources.get_queries(config)
+            queries = repeat(queries, args.n_queries or len(queries))
+            print("=" * 30, f"Config: {name or 'default'}", "=" * 30)
+            print(f"queries = {len(queries)}")
+
+            # Warmed up and safe to share between clients.
+            pipeline = resources.get_pipeline(config)
+            warm_up(pipeline, run_pipeline, queries)
+
+            for mode, load in loads:
+                if mock is not None:
+                    mock.reset_stats()
+                if mode == "closed":
+                    result = closed_loop(pipeline, run_pipeline, queries, load)
+                else:
+                    result = open_loop(
+                        pipeline,
+                        run_pipeline,
+                        queries,
+                        load,
+                        max_clients=args.max_clients,
+                        seed=args.seed,
+                    )
+                result["config"] = name
+                if mock is not None:
+                    result["server"] = mock.stats()
+                results.append(result)
+                print(capacity_table([result]).splitlines()[-1])
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    report = {
+        "environment": environment(),
+        "args": vars(args),
+        "configs": {name: vars(config) for name, config in configs.items()},
+        "mock": mock.config() if mock is not None else None,
+        "results": results,
+    }
+    if args.slo_p99_ms is not None:
+        report["capacity"] = capacity(results, args.slo_p99_ms, args.slo_error_rate)
+
+    out_path = Path(args.out_path)
+    if out_path.suffix != ".json":
+        out_path = out_path / f"{time.strftime('%Y%m%d-%H%M%S')}-load-test.json"
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(out_path, "w") as fout:
+        json.dump(report, fout, indent=4)
+    table = capacity_table(results)
+    with open(out_path.with_suffix(".md"), "w") as fout:
+        fout.write(table + "\n")
+    print(table)
+    for name, best in report.get("capacity", {}).items():
+        print(f"capacity of {name or 'default'}: {best}")
+    print(f"Results written to {out_path}")
+    return report
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    from marcel.retrievers import parse_args as parse_retriever_args
+
+    parser = argparse.ArgumentParser(
+        usage="%(prog)s [load test options] -- <retrievers.py options>",
+        allow_abbrev=False,
+    )
+
+    # fmt: off
+    parser.add_argument("--concurrency", type=int, nargs="*", default=[1, 4, 16], help="Closed loop: number of concurrent clients (one run per level).")
+    parser.add_argument("--arrival_rates", type=float, nargs="*", default=[], help="Open loop: Poisson arrival rates in queries per second (one run per rate).")
+    parser.add_argument("--max_clients", type=int, default=64, help="Open loop: queries answered at once; further queries wait.")
+    parser.add_argument("--configs", type=str, nargs="+", default=[""], help="Arguments added to the retrievers.py arguments, one quoted string per configuration.")
+    parser.add_argument("--n_queries", type=int, required=False, help="Queries per run (cycles through the query file; default: all queries).")
+    parser.add_argument("--slo_p99_ms", type=float, required=False, help="Report the highest throughput with at most this p99 latency.")
+    parser.add_argument("--slo_error_rate", type=float, default=0.01, help="... and at most this fraction of failed queries.")
+    parser.add_argument("--base_url", type=str, required=False, help="Load test this OpenAI-compatible server instead of the mock server.")
+    parser.add_argument("--max_retries", type=int, required=False, help="Retries of the OpenAI client (OPENAI_MAX_RETRIES, default 5).")
+    parser.add_argument("--timeout", type=float, required=False, help="Request timeout of the OpenAI client in seconds (OPENAI_TIMEOUT, default 30).")
+    parser.add_argument("--out_path", type=str, default="output/load_tests/", help="JSON file or directory for results.")
+    # fmt: on
+    add_mock_args(parser)
+
+    args, retriever_argv = parser.parse_known_args(argv)
+    if retriever_argv[:1] == ["--"]:
+        retriever_argv = retriever_argv[1:]
+    configs = {
+        name: parse_retriever_args(
+            [*retriever_argv, *shlex.split(name)], require_io=False
+        )
+        for name in args.configs
+    }
+    if not all(config.query_path for config in configs.values()):
+        parser.error("--query_path (of retrievers.py) is required")
+    return args, configs
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main(*parse_args())
@@ -0,0 +1,180 @@
+"""Memory accounting of a run (`retrievers.py --profile_memory`).
+
+For every stage (loading data, embedding the corpus, writing the document
+store, indexing FAQs, loading models and answering queries), `memory.json` in
+the run directory records:
+
+- The resident set size (RSS) of the process before and after the stage, and
+  its peak so far.
+- Python allocations traced by `tracemalloc`: the net growth, the peak within
+  the stage, and the files that allocated most. numpy arrays are traced, but
+  memory of native libraries (e.g., torch tensors) is only visible in the RSS.
+
+For the queries, the growth of RSS and traced memory per query shows leaks
+(e.g., unbounded caches). The report ends with a suggested Slurm memory request
+(peak RSS plus 20%). Tracing slows down the run and adds its own overhead to the
+RSS, so the peak is an upper bound.
+"""
+
+import json
+import math
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+MB = 1024**2
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of the current process (Linux reports KiB, macOS bytes)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak / MB
+    return peak / 1024
+
+
+def rss_mb() -> Optional[float]:
+    """Current RSS of the process (Linux only)."""
+    try:
+        with open("/proc/self/statm") as fin:
+            pages = int(fin.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / MB
+
+
+def top_allocations(after, before, limit: int = 5) -> List[Dict[str, Any]]:
+    """Files with the largest growth of traced memory between two snapshots."""
+    return [
+        {
+            "file": stat.traceback[0].filename,
+            "size_mb": stat.size_diff / MB,
+        }
+        for stat in after.compare_to(before, "filename")[:limit]
+        if stat.size_diff > 0
+    ]
+
+
+def growth_per_query(values: List[float]) -> Optional[float]:
+    """Slope of a least-squares line through per-query measurements (in MB)."""
+    if len(values) < 2:
+        return None
+    return float(np.polyfit(np.arange(len(values)), values, 1)[0])
+
+
+class MemoryProfiler:
+    def __init__(self, trace: bool = True):
+        self.trace = trace
+        self.started_tracing = False
+        if trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        # Peak of traced memory of the enclosing stages (a nested stage resets it).
+        self.open_peaks: List[int] = []
+        self.query_rss: List[float] = []
+        self.query_traced: List[float] = []
+
+    @contextmanager
+    def stage(self, name: str):
+        rss_before = rss_mb()
+        traced_before = 0
+        snapshot = None
+        if self.trace:
+            traced_before, peak = tracemalloc.get_traced_memory()
+            if self.open_peaks:
+                self.open_peaks[-1] = max(self.open_peaks[-1], peak)
+            tracemalloc.reset_peak()
+            snapshot = tracemalloc.take_snapshot()
+            self.open_peaks.append(0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record: Dict[str, Any] = {
+                "seconds": time.perf_counter() - start,
+                "rss_before_mb": rss_before,
+                "rss_after_mb": rss_mb(),
+                "peak_rss_mb": peak_rss_mb(),
+            }
+            if rss_before is not None and record["rss_after_mb"] is not None:
+                record["rss_delta_mb"] = record["rss_after_mb"] - rss_before
+            if self.trace:
+                current, peak = tracemalloc.get_traced_memory()
+                peak = max(peak, self.open_peaks.pop())
+                if self.open_peaks:
+                    self.open_peaks[-1] = max(self.open_peaks[-1], peak)
+                record["traced_delta_mb"] = (current - traced_before) / MB
+                record["traced_peak_mb"] = (peak - traced_before) / MB
+                record["top_allocations"] = top_allocations(
+                    tracemalloc.take_snapshot(), snapshot
+                )
+
+            key, i = name, 2
+            while key in self.stages:
+                key, i = f"{name}#{i}", i + 1
+            self.stages[key] = record
+
+    def record_query(self):
+        """Call after every query."""
+        rss = rss_mb()
+        if rss is not None:
+            self.query_rss.append(rss)
+        if self.trace:
+            self.query_traced.append(tracemalloc.get_traced_memory()[0] / MB)
+
+    def report(self) -> Dict[str, Any]:
+        peak = peak_rss_mb()
+        report: Dict[str, Any] = {
+            "tracemalloc": self.trace,
+            "peak_rss_mb": peak,
+            "stages": self.stages,
+        }
+        if self.query_rss or self.query_traced:
+            report["queries"] = {
+                "n": max(len(self.query_rss), len(self.query_traced)),
+                "rss_growth_per_query_kb": self._kb(growth_per_query(self.query_rss)),
+                "traced_growth_per_query_kb": self._kb(
+                    growth_per_query(self.query_traced)
+                ),
+            }
+
+        suggested = math.ceil(peak * 1.2 / 256) * 256
+        slurm: Dict[str, Any] = {"mem": f"{suggested}M"}
+        cpus = int(os.environ.get("SLURM_CPUS_PER_TASK", 0))
+        if cpus:
+            slurm["mem-per-cpu"] = f"{math.ceil(suggested / cpus / 256) * 256}M"
+        report["suggested_slurm_request"] = slurm
+        return report
+
+    @staticmethod
+    def _kb(mb: Optional[float]) -> Optional[float]:
+        return mb * 1024 if mb is not None else None
+
+    def write(self, run_path):
+        """Write `memory.json` and stop tracing."""
+        report = self.report()
+        run_path = Path(run_path)
+        run_path.mkdir(parents=True, exist_ok=True)
+        with open(run_path / "memory.json", "w") as fout:
+            json.dump(report, fout, indent=4)
+        self.close()
+        return report
+
+    def close(self):
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+        self.trace = False
+
+
+def memory_stage(profiler: Optional[MemoryProfiler], name: str):
+    """`profiler.stage(name)`, or nothing without a profiler."""
+    return profiler.stage(name) if profiler is not None else nullcontext()
@@ -0,0 +1,135 @@
+"""Merge the shards of a sharded run into the canonical run directory.
+
+`retrievers.py --shard_index i --shard_count n` writes the i-th shard of a run
+to `<out_path>/shards/<i>-of-<n>/`. Once all shards have finished, this
+assembles the predictions (in the order of the query file, in the
+`--output_format` of the run), `pipeline.json`,
+`config.json` and `stats.json` in `<out_path>/`. It fails if a shard is
+missing or if query ids are missing or duplicated.
+
+Example:
+
+    python src/marcel/merge_shards.py --run_path output/20250317-email/bm25
+"""
+
+import argparse
+import json
+import logging
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List
+
+from marcel import data_loader
+from marcel.experiment_runner import SHARD_ARGS, shard_path
+from marcel.run_output import load_predictions, output_exists, write_predictions
+
+logger = logging.getLogger(__name__)
+
+
+def load_json(path: Path):
+    with open(path) as fin:
+        return json.load(fin)
+
+
+def find_shards(run_path: Path) -> List[Path]:
+    paths = sorted((run_path / "shards").glob("*-of-*"))
+    counts = {int(path.name.split("-of-")[1]) for path in paths}
+    if len(counts) != 1:
+        raise ValueError(
+            f"Expected shards of one shard count in {run_path}, found {sorted(counts)}."
+        )
+    (count,) = counts
+    shards = [shard_path(run_path, index, count) for index in range(count)]
+    missing = [path.name for path in shards if not output_exists(path)]
+    if missing:
+        raise ValueError(f"Missing or unfinished shards: {missing}")
+    return shards
+
+
+def interleave(shard_predictions: List[List[Any]]) -> List[Any]:
+    """Inverse of `shard_queries`: restores the order of the query file."""
+    count = len(shard_predictions)
+    total = sum(len(predictions) for predictions in shard_predictions)
+    merged: List[Any] = [None] * total
+    for index, predictions in enumerate(shard_predictions):
+        for position, prediction in enumerate(predictions):
+            if position * count + index >= total:
+                raise ValueError("Shard sizes do not match a split of one query file.")
+            merged[position * count + index] = prediction
+    return merged
+
+
+def validate_ids(predictions: List[Dict[str, Any]], expected_ids=None):
+    ids = [prediction["id"] for prediction in predictions]
+    duplicates = sorted((id_ for id_, n in Counter(ids).items() if n > 1), key=str)
+    if duplicates:
+        raise ValueError(f"Duplicate query ids: {duplicates}")
+    if expected_ids is not None:
+        found = set(ids)
+        missing = [id_ for id_ in expected_ids if id_ not in found]
+        unexpected = sorted(found - set(expected_ids), key=str)
+        if missing or unexpected:
+            raise ValueError(
+                f"Query ids do not match the query file: missing {missing}, unexpected {unexpected}"
+            )
+
+
+def merge_shards(run_path, query_path=None):
+    run_path = Path(run_path)
+    shards = find_shards(run_path)
+
+    configs = [load_json(path / "config.json") for path in shards]
+    config = {k: v for k, v in configs[0].items() if k not in SHARD_ARGS}
+    for path, other in zip(shards, configs):
+        other = {k: v for k, v in other.items() if k not in SHARD_ARGS}
+        if other != config:
+            raise ValueError(
+                f"Configuration of shard {path.name} differs from the first shard."
+            )
+
+    predictions = interleave([load_predictions(path) for path in shards])
+
+    query_path = query_path or config.get("query_path")
+    expected_ids = None
+    if query_path and Path(query_path).exists():
+        queries = data_loader.load_queries(
+            query_path,
+            skip_without_sources=config.get("skip_without_sources", False),
+        )
+        expected_ids = [query["id"] for query in queries]
+    else:
+        logger.warning("Query file not found, only checking for duplicate ids.")
+    validate_ids(predictions, expected_ids)
+
+    write_predictions(run_path, predictions, config.get("output_format", "json"))
+    with open(run_path / "pipeline.json", "w") as fout:
+        json.dump(load_json(shards[0] / "pipeline.json"), fout, indent=4)
+    with open(run_path / "config.json", "w") as fout:
+        json.dump(config, fout, indent=4)
+
+    stats = {
+        path.name: load_json(path / "stats.json")
+        for path in shards
+        if (path / "stats.json").exists()
+    }
+    if stats:
+        with open(run_path / "stats.json", "w") as fout:
+            json.dump(stats, fout, indent=4)
+
+    print(f"Merged {len(shards)} shards ({len(predictions)} queries) into {run_path}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+
+    # fmt: off
+    parser.add_argument("--run_path", type=str, required=True, help="--out_path of the sharded run.")
+    parser.add_argument("--query_path", type=str, required=False, help="Query file to validate ids against (default: --query_path of the run).")
+    # fmt: on
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    merge_shards(args.run_path, query_path=args.query_path)
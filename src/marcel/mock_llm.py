@@ -0,0 +1,393 @@
+"""Local stand-in for an OpenAI-compatible (vLLM) chat completions server.
+
+Answers `POST /v1/chat/completions` with filler text after a simulated delay:
+the time to the first token is drawn from `--latency_distribution` (mean
+`--ttft_ms`), and tokens follow at `--tokens_per_second` per request. A request
+generates `--completion_tokens` tokens per sample (at most `max_tokens`), and
+`n` samples of a request are generated in parallel. With `--error_rate`, a
+fraction of the requests fails with `--error_status`, and with
+`--max_concurrency`, further requests wait for a free slot (like the running
+batch of vLLM). `"stream": true` returns server-sent events token by token.
+
+    GET /health, GET /v1/models, GET /stats
+
+Example (use the printed `OPENAI_BASE_URL` instead of `scripts/vllm_serve.sh`):
+
+    python src/marcel/mock_llm.py --port 8000 --ttft_ms 300 --tokens_per_second 40
+"""
+
+import argparse
+import json
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+LATENCY_DISTRIBUTIONS = ["constant", "uniform", "exponential", "lognormal"]
+
+FILLER = (
+    "The application deadline for the winter semester is July 15 and the "
+    "examination office answers questions about modules credits and enrollment"
+).split()
+
+
+def count_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Rough token count (words) of the prompt."""
+    tokens = 0
+    for message in messages:
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content)
+        tokens += len(content.split())
+    return tokens
+
+
+def filler_text(n_tokens: int, offset: int = 0) -> List[str]:
+    return [FILLER[(offset + i) % len(FILLER)] + " " for i in range(n_tokens)]
+
+
+class MockLLM:
+    """Latency model, error injection and counters of the mock server."""
+
+    def __init__(
+        self,
+        ttft_ms: float = 200,
+        latency_distribution: str = "constant",
+        latency_sigma: float = 0.5,
+        tokens_per_second: float = 50,
+        completion_tokens: int = 100,
+        error_rate: float = 0.0,
+        error_status: int = 500,
+        max_concurrency: Optional[int] = None,
+        seed: int = 0,
+    ):
+        if latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Invalid latency distribution {latency_distribution}.")
+        self.ttft_ms = ttft_ms
+        self.latency_distribution = latency_distribution
+        self.latency_sigma = latency_sigma
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.max_concurrency = max_concurrency
+        self.seed = seed
+
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.slots = (
+            threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+        )
+        self.reset_stats()
+
+    def config(self) -> Dict[str, Any]:
+        return {
+            "ttft_ms": self.ttft_ms,
+            "latency_distribution": self.latency_distribution,
+            "latency_sigma": self.latency_sigma,
+            "tokens_per_second": self.tokens_per_second,
+            "completion_tokens": self.completion_tokens,
+            "error_rate": self.error_rate,
+            "error_status": self.error_status,
+            "max_concurrency": self.max_concurrency,
+            "seed": self.seed,
+        }
+
+    def reset_stats(self):
+        with self.lock:
+            self.requests = 0
+            self.streamed = 0
+            self.errors = 0
+            self.in_flight = 0
+            self.max_in_flight = 0
+            self.prompt_tokens = 0
+            self.completion_tokens_sent = 0
+            self.queue_seconds = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "streamed": self.streamed,
+                "errors": self.errors,
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens_sent,
+                "mean_queue_ms": (
+                    1000 * self.queue_seconds / self.requests if self.requests else None
+                ),
+            }
+
+    def sample_ttft(self) -> float:
+        """Time to the first token in seconds."""
+        mean = self.ttft_ms / 1000
+        with self.lock:
+            if self.latency_distribution == "uniform":
+                return self.rng.uniform(0, 2 * mean)
+            if self.latency_distribution == "exponential":
+                return self.rng.expovariate(1 / mean) if mean > 0 else 0.0
+            if self.latency_distribution == "lognormal":
+                if mean <= 0:
+                    return 0.0
+                mu = math.log(mean) - self.latency_sigma**2 / 2
+                return self.rng.lognormvariate(mu, self.latency_sigma)
+            return mean
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            return self.rng.random() < self.error_rate
+
+    def token_interval(self) -> float:
+        return 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def acquire(self, body: Dict[str, Any]):
+        """Wait for a free slot and count the request."""
+        start = time.perf_counter()
+        if self.slots is not None:
+            self.slots.acquire()
+        waited = time.perf_counter() - start
+        with self.lock:
+            self.requests += 1
+            self.streamed += bool(body.get("stream"))
+            self.queue_seconds += waited
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+        if self.slots is not None:
+            self.slots.release()
+
+    def plan(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Token counts of a (successful) request."""
+        max_tokens = body.get("max_completion_tokens") or body.get("max_tokens")
+        tokens = self.completion_tokens
+        if max_tokens is not None:
+            tokens = min(tokens, max_tokens)
+        prompt_tokens = count_tokens(body.get("messages", []))
+        n = body.get("n") or 1
+        with self.lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens_sent += n * tokens
+        return {
+            "n": n,
+            "tokens": tokens,
+            "finish_reason": "length" if tokens < self.completion_tokens else "stop",
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": n * tokens,
+                "total_tokens": prompt_tokens + n * tokens,
+            },
+        }
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    server: Any
+
+    def _reply(self, status: int, body: Any):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._reply(200, {"status": "ok"})
+        elif self.path == "/v1/models":
+            self._reply(200, {"object": "list", "data": []})
+        elif self.path == "/stats":
+            self._reply(200, self.server.mock.stats())
+        else:
+            self._reply(404, {"error": f"Unknown path {self.path}."})
+
+    def do_POST(self):
+        if self.path != "/v1/chat/completions":
+            self._reply(404, {"error": {"message": f"Unknown path {self.path}."}})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        except (TypeError, ValueError) as error:
+            self._reply(400, {"error": {"message": f"Invalid request: {error}"}})
+            return
+
+        mock: MockLLM = self.server.mock
+        mock.acquire(body)
+        try:
+            if mock.should_fail():
+                with mock.lock:
+                    mock.errors += 1
+                self._reply(
+                    mock.error_status,
+                    {
+                        "error": {
+                            "message": "Injected error.",
+                            "type": "server_error",
+                            "code": mock.error_status,
+                        }
+                    },
+                )
+                return
+            plan = mock.plan(body)
+            time.sleep(mock.sample_ttft())
+            if body.get("stream"):
+                self._stream(body, plan)
+            else:
+                time.sleep(plan["tokens"] * mock.token_interval())
+                self._reply(200, self._completion(body, plan))
+        finally:
+            mock.release()
+
+    def _completion(self, body: Dict[str, Any], plan: Dict[str, Any]):
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model") or "mock",
+            "choices": [
+                {
+                    "index": index,
+                    "message": {
+                        "role": "assistant",
+                        "content": "".join(filler_text(plan["tokens"], index)),
+                    },
+                    "finish_reason": plan["finish_reason"],
+                }
+                for index in range(plan["n"])
+            ],
+            "usage": plan["usage"],
+        }
+
+    def _stream(self, body: Dict[str, Any], plan: Dict[str, Any]):
+        chunk_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = body.get("model") or "mock"
+
+        def send(choices, usage=None):
+            chunk = {
+                "id": chunk_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": choices,
+            }
+            if usage is not None:
+                chunk["usage"] = usage
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        n = plan["n"]
+        send(
+            [
+                {"index": i, "delta": {"role": "assistant", "content": ""}}
+                for i in range(n)
+            ]
+        )
+        tokens = [filler_text(plan["tokens"], i) for i in range(n)]
+        for position in range(plan["tokens"]):
+            time.sleep(self.server.mock.token_interval())
+            send(
+                [
+                    {"index": i, "delta": {"content": tokens[i][position]}}
+                    for i in range(n)
+                ]
+            )
+        send(
+            [
+                {"index": i, "delta": {}, "finish_reason": plan["finish_reason"]}
+                for i in range(n)
+            ]
+        )
+        if (body.get("stream_options") or {}).get("include_usage"):
+            send([], usage=plan["usage"])
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+def make_server(mock: MockLLM, host: str = "127.0.0.1", port: int = 8000):
+    server = MockServer((host, port), RequestHandler)
+    server.mock = mock
+    return server
+
+
+def start_server(mock: MockLLM, host: str = "127.0.0.1", port: int = 0):
+    """Serve `mock` on a background thread. Returns the server and its OpenAI base URL."""
+    server = make_server(mock, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}/v1"
+
+
+def mock_from_args(args) -> MockLLM:
+    return MockLLM(
+        ttft_ms=args.ttft_ms,
+        latency_distribution=args.latency_distribution,
+        latency_sigma=args.latency_sigma,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        max_concurrency=args.max_concurrency,
+        seed=args.seed,
+    )
+
+
+def add_mock_args(parser: argparse.ArgumentParser):
+    # fmt: off
+    parser.add_argument("--ttft_ms", type=float, default=200, help="Mean time to the first token.")
+    parser.add_argument("--latency_distribution", type=str, default="lognormal", choices=LATENCY_DISTRIBUTIONS, help="Distribution of the time to the first token.")
+    parser.add_argument("--latency_sigma", type=float, default=0.5, help="Sigma of the lognormal distribution (tail heaviness).")
+    parser.add_argument("--tokens_per_second", type=float, default=50, help="Decoding speed per request.")
+    parser.add_argument("--completion_tokens", type=int, default=100, help="Tokens per sample (at most max_tokens of the request).")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="Fraction of requests which fail with --error_status.")
+    parser.add_argument("--error_status", type=int, default=500, help="E.g., 500 or 429 (both are retried by the OpenAI client).")
+    parser.add_argument("--max_concurrency", type=int, required=False, help="Requests processed at once; further requests wait.")
+    parser.add_argument("--seed", type=int, default=0)
+    # fmt: on
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+
+    # fmt: off
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    # fmt: on
+    add_mock_args(parser)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    server = make_server(mock_from_args(args), args.host, args.port)
+    print(f"export OPENAI_BASE_URL=http://{args.host}:{args.port}/v1")
+    print("export OPENAI_API_KEY=mock")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
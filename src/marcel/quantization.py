@@ -0,0 +1,209 @@
+"""Compressed (float16 / int8) document embeddings with exact rescoring.
+
+`QuantizedEmbeddingIndex` keeps the document embeddings as float16 or as int8
+codes with one scale per vector (symmetric quantization, `x ~ code * scale`).
+The float32 embeddings are moved to a memory-mapped temporary file, so they do
+not count towards the resident memory of the process; only the rows of the
+candidates that are rescored are read from it. Documents are kept without
+embeddings.
+"""
+
+import tempfile
+import time
+from dataclasses import replace
+from typing import Any, Dict, List, Literal, Optional
+
+import numpy as np
+from haystack import Document, component, default_to_dict
+
+EMBEDDING_DTYPES = ["float32", "float16", "int8"]
+
+# As in InMemoryDocumentStore.
+DOT_PRODUCT_SCALING_FACTOR = 100
+
+# Rows scored per block in the first pass (bounds the temporary float32 copy).
+BLOCK_SIZE = 16384
+
+
+def quantize(embeddings: np.ndarray, dtype: str):
+    """Returns (codes, scales); scales are None unless `dtype` is int8."""
+    if dtype == "float16":
+        return embeddings.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.abs(embeddings).max(axis=1) / 127
+        scales[scales == 0] = 1
+        codes = np.round(embeddings / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    raise ValueError(f"Invalid embedding dtype {dtype}.")
+
+
+def memmap_copy(embeddings: np.ndarray) -> np.ndarray:
+    """Read-only memory-mapped float32 copy of `embeddings` in an unlinked temporary file."""
+    with tempfile.NamedTemporaryFile(suffix=".npy") as tmp:
+        mapped = np.lib.format.open_memmap(
+            tmp.name, mode="w+", dtype=np.float32, shape=embeddings.shape
+        )
+        mapped[:] = embeddings
+        mapped.flush()
+        return np.load(tmp.name, mmap_mode="r")
+
+
+class QuantizedEmbeddingIndex:
+    def __init__(
+        self,
+        documents: List[Document],
+        dtype: str = "int8",
+        similarity_function: Literal["cosine", "dot_product"] = "cosine",
+    ):
+        embeddings = np.array([doc.embedding for doc in documents], dtype=np.float32)
+        if similarity_function == "cosine":
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings /= np.where(norms == 0, 1, norms)
+
+        self.documents = [replace(doc, embedding=None) for doc in documents]
+        self.dtype = dtype
+        self.similarity_function = similarity_function
+        self.codes, self.scales = quantize(embeddings, dtype)
+        self.embeddings = memmap_copy(embeddings)
+
+    def _query(self, query_embedding: List[float]) -> np.ndarray:
+        query = np.array(query_embedding, dtype=np.float32)
+        if self.similarity_function == "cosine":
+            query /= np.linalg.norm(query) or 1
+        return query
+
+    def approximate_scores(self, query: np.ndarray) -> np.ndarray:
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        for start in range(0, len(self.codes), BLOCK_SIZE):
+            block = self.codes[start : start + BLOCK_SIZE].astype(np.float32)
+            scores[start : start + BLOCK_SIZE] = block @ query
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+    def exact_scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None):
+        if rows is None:
+            scores = np.empty(len(self.embeddings), dtype=np.float32)
+            for start in range(0, len(self.embeddings), BLOCK_SIZE):
+                block = np.asarray(self.embeddings[start : start + BLOCK_SIZE])
+                scores[start : start + BLOCK_SIZE] = block @ query
+            return scores
+        # Sorted rows for sequential reads from the memory map.
+        order = np.argsort(rows)
+        scores = np.empty(len(rows), dtype=np.float32)
+        scores[order] = np.asarray(self.embeddings[rows[order]]) @ query
+        return scores
+
+    def search(self, query_embedding: List[float], top_k: int, rescore_k: int):
+        """Row indices and exact scores of the top_k documents among the rescore_k best approximate matches."""
+        query = self._query(query_embedding)
+        scores = self.approximate_scores(query)
+        rescore_k = min(max(rescore_k, top_k), len(scores))
+        candidates = np.argpartition(-scores, rescore_k - 1)[:rescore_k]
+        exact = self.exact_scores(query, candidates)
+        top = np.argsort(-exact, kind="stable")[:top_k]
+        return candidates[top], exact[top]
+
+    def search_exact(self, query_embedding: List[float], top_k: int):
+        scores = self.exact_scores(self._query(query_embedding))
+        top = np.argsort(-scores, kind="stable")[:top_k]
+        return top, scores[top]
+
+    def scale(self, scores: np.ndarray) -> np.ndarray:
+        if self.similarity_function == "dot_product":
+            from scipy.special import expit
+
+            return expit(scores / DOT_PRODUCT_SCALING_FACTOR)
+        return (scores + 1) / 2
+
+    def memory(self) -> Dict[str, int]:
+        compressed = self.codes.nbytes + (
+            self.scales.nbytes if self.scales is not None else 0
+        )
+        return {
+            "float32_bytes": int(self.embeddings.nbytes),
+            "compressed_bytes": int(compressed),
+        }
+
+
+@component
+class QuantizedEmbeddingRetriever:
+    """Embedding retriever searching a `QuantizedEmbeddingIndex`.
+
+    The top `top_k * rescore_factor` documents by compressed vectors are rescored
+    with the exact float32 embeddings. Scores follow `InMemoryEmbeddingRetriever`
+    (including `scale_score`). With `compare_to_exact`, every query is also
+    searched exhaustively in float32 to report recall@k of the compressed search
+    in `stats()`.
+    """
+
+    def __init__(
+        self,
+        index: QuantizedEmbeddingIndex,
+        top_k: int = 10,
+        scale_score: bool = False,
+        rescore_factor: int = 4,
+        compare_to_exact: bool = False,
+    ):
+        self.index = index
+        self.top_k = top_k
+        self.scale_score = scale_score
+        self.rescore_factor = rescore_factor
+        self.compare_to_exact = compare_to_exact
+        self.reset_stats()
+
+    @component.output_types(documents=List[Document])
+    def run(self, query_embedding: List[float], top_k: Optional[int] = None):
+        top_k = top_k or self.top_k
+        if not self.index.documents:
+            return {"documents": []}
+
+        start = time.perf_counter()
+        rows, scores = self.index.search(
+            query_embedding, top_k, rescore_k=top_k * self.rescore_factor
+        )
+        self.seconds["search"] += time.perf_counter() - start
+        self.queries += 1
+
+        if self.compare_to_exact:
+            start = time.perf_counter()
+            exact_rows, _ = self.index.search_exact(query_embedding, top_k)
+            self.seconds["exact"] += time.perf_counter() - start
+            self.recall.append(len(set(rows) & set(exact_rows)) / len(exact_rows))
+
+        if self.scale_score:
+            scores = self.index.scale(scores)
+        documents = [
+            replace(self.index.documents[row], score=float(score))
+            for row, score in zip(rows, scores)
+        ]
+        return {"documents": documents}
+
+    def reset_stats(self):
+        self.queries = 0
+        self.seconds = {"search": 0.0, "exact": 0.0}
+        self.recall = []
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {
+            "dtype": self.index.dtype,
+            "rescore_factor": self.rescore_factor,
+            "queries": self.queries,
+            "seconds": dict(self.seconds),
+            **self.index.memory(),
+        }
+        if self.recall:
+            stats["recall_at_k_vs_float32"] = float(np.mean(self.recall))
+        return stats
+
+    def to_dict(self) -> Dict[str, Any]:
+        # The index is omitted to keep the serialized pipeline small.
+        return default_to_dict(
+            self,
+            dtype=self.index.dtype,
+            similarity_function=self.index.similarity_function,
+            top_k=self.top_k,
+            scale_score=self.scale_score,
+            rescore_factor=self.rescore_factor,
+            compare_to_exact=self.compare_to_exact,
+        )
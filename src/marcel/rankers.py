@@ -0,0 +1,259 @@
+import time
+from dataclasses import replace
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from haystack import Document, component, default_to_dict
+from haystack.components.rankers import SentenceTransformersSimilarityRanker
+
+from marcel.cache import SQLiteCache
+from marcel.data_loader import fingerprint
+
+
+@component
+class CachedSimilarityRanker:
+    """Cross-encoder ranker which caches the score of every (query, document) pair.
+
+    Scores are keyed by reranker model (and inference backend), query hash and
+    document fingerprint and persisted to `cache_path`, so re-running a
+    configuration (e.g., with another `--top_k` or generator) never recomputes
+    them. Uncached pairs are scored in a single call to the cross-encoder, which
+    batches them with `batch_size` of the base ranker. The model is only loaded
+    once the first cache miss occurs.
+    """
+
+    def __init__(
+        self,
+        base_ranker: SentenceTransformersSimilarityRanker,
+        cache_path: Optional[str] = None,
+        inference_backend: str = "torch",
+    ):
+        self.base_ranker = base_ranker
+        self.cache_path = cache_path
+        self.inference_backend = inference_backend
+        self.cache = SQLiteCache(cache_path, table="reranker_scores")
+        self.reset_stats()
+
+    def _prepare(self, query: str, document: Document) -> Tuple[str, str]:
+        ranker = self.base_ranker
+        meta_values_to_embed = [
+            str(document.meta[key])
+            for key in ranker.meta_fields_to_embed
+            if key in document.meta and document.meta[key]
+        ]
+        text = ranker.document_prefix + ranker.embedding_separator.join(
+            meta_values_to_embed + [document.content or ""]
+        )
+        return ranker.query_prefix + query, text
+
+    def _key(self, query: str, text: str) -> str:
+        ranker = self.base_ranker
+        model = f"{ranker.model}:{'sigmoid' if ranker.scale_score else 'logit'}"
+        if self.inference_backend != "torch":
+            model = f"{model}:{self.inference_backend}"
+        return f"{model}:{fingerprint(query)}:{fingerprint(text)}"
+
+    def score_pairs(self, pairs: List[Tuple[str, Document]]) -> List[float]:
+        """Scores (query, document) pairs, possibly from different queries."""
+        prepared = [self._prepare(query, doc) for query, doc in pairs]
+        keys = [self._key(query, text) for query, text in prepared]
+        scores = self.cache.get_many(keys)
+
+        missing = {}
+        for key, pair in zip(keys, prepared):
+            if key not in scores:
+                missing[key] = pair
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            if self.base_ranker._cross_encoder is None:
+                self.base_ranker.warm_up()
+            predictions = self.base_ranker._cross_encoder.predict(  # type: ignore
+                list(missing.values()),
+                batch_size=self.base_ranker.batch_size,
+                activation_fn=self._activation_fn(),
+                convert_to_numpy=True,
+            )
+            new_scores = {key: float(score) for key, score in zip(missing, predictions)}
+            self.cache.put_many(new_scores)
+            scores.update(new_scores)
+
+        return [scores[key] for key in keys]
+
+    def _activation_fn(self):
+        from torch.nn import Identity, Sigmoid
+
+        return Sigmoid() if self.base_ranker.scale_score else Identity()
+
+    @component.output_types(documents=List[Document])
+    def run(self, query: str, documents: List[Document], top_k: Optional[int] = None):
+        top_k = top_k or self.base_ranker.top_k
+        scores = self.score_pairs([(query, doc) for doc in documents])
+        ranked = sorted(
+            (replace(doc, score=score) for doc, score in zip(documents, scores)),
+            key=lambda doc: doc.score,
+            reverse=True,
+        )
+        if self.base_ranker.score_threshold is not None:
+            ranked = [
+                doc for doc in ranked if doc.score >= self.base_ranker.score_threshold
+            ]
+        return {"documents": ranked[:top_k]}
+
+    def warm_up(self):
+        # Deferred until the first cache miss.
+        pass
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else None,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return default_to_dict(
+            self,
+            cache_path=self.cache_path,
+            inference_backend=self.inference_backend,
+            **self.base_ranker.to_dict(),
+        )
+
+
+@component
+class CascadeRanker:
+    """Two-stage reranking: a cheap cross-encoder scores all candidates and only the top `m` are rescored by an expensive one.
+
+    Candidates beyond the `m` survivors are appended in first-stage order when
+    `top_k > m`. As first- and second-stage scores are not comparable, their
+    scores are placed just below the lowest second-stage score, and the
+    first-stage score is kept in `meta["first_stage_score"]`. With `compare_to_full`, all
+    candidates are additionally ranked by the expensive model to report how much
+    ranking quality the cascade gives up (see `stats()`). This is meant for
+    analysis only, as it removes the cost savings.
+    """
+
+    def __init__(
+        self,
+        first_stage,
+        second_stage,
+        m: int = 10,
+        top_k: int = 10,
+        compare_to_full: bool = False,
+    ):
+        self.first_stage = first_stage
+        self.second_stage = second_stage
+        self.m = m
+        self.top_k = top_k
+        self.compare_to_full = compare_to_full
+        self.reset_stats()
+
+    @component.output_types(documents=List[Document])
+    def run(self, query: str, documents: List[Document], top_k: Optional[int] = None):
+        top_k = top_k or self.top_k
+        if not documents:
+            return {"documents": []}
+
+        start = time.perf_counter()
+        first = self.first_stage.run(
+            query=query, documents=documents, top_k=len(documents)
+        )["documents"]
+        self.seconds["first_stage"] += time.perf_counter() - start
+
+        survivors, tail = first[: self.m], first[self.m :]
+        start = time.perf_counter()
+        second = self.second_stage.run(
+            query=query, documents=survivors, top_k=len(survivors)
+        )["documents"]
+        self.seconds["second_stage"] += time.perf_counter() - start
+        ranked = (second + self._below(tail, second))[:top_k]
+
+        self.queries += 1
+        self.candidates += len(documents)
+        self.second_stage_pairs += len(survivors)
+
+        if self.compare_to_full:
+            start = time.perf_counter()
+            full = self.second_stage.run(
+                query=query, documents=documents, top_k=len(documents)
+            )["documents"]
+            self.seconds["full"] += time.perf_counter() - start
+            full_ids = {doc.id for doc in full[:top_k]}
+            overlap = sum(doc.id in full_ids for doc in ranked) / len(full_ids)
+            self.overlap.append(overlap)
+            self.top1_agreement.append(float(ranked[0].id == full[0].id))
+
+        return {"documents": ranked}
+
+    @staticmethod
+    def _below(tail: List[Document], second: List[Document]) -> List[Document]:
+        """Rescore `tail` below the second-stage scores, keeping its order."""
+        floor = min((doc.score for doc in second), default=0.0)
+        return [
+            replace(
+                doc,
+                score=floor - (i + 1) * 1e-6,
+                meta={**doc.meta, "first_stage_score": doc.score},
+            )
+            for i, doc in enumerate(tail)
+        ]
+
+    def warm_up(self):
+        self.first_stage.warm_up()
+        self.second_stage.warm_up()
+
+    def reset_stats(self):
+        self.queries = 0
+        self.candidates = 0
+        self.second_stage_pairs = 0
+        self.seconds = {"first_stage": 0.0, "second_stage": 0.0, "full": 0.0}
+        self.overlap = []
+        self.top1_agreement = []
+        for ranker in [self.first_stage, self.second_stage]:
+            if callable(getattr(ranker, "reset_stats", None)):
+                ranker.reset_stats()
+
+    def stats(self) -> Dict[str, Any]:
+        """Cost saved (second-stage pairs avoided) and quality lost versus the full reranker."""
+        stats: Dict[str, Any] = {
+            "queries": self.queries,
+            "m": self.m,
+            "candidates": self.candidates,
+            "second_stage_pairs": self.second_stage_pairs,
+            "second_stage_pairs_saved": (
+                1 - self.second_stage_pairs / self.candidates
+                if self.candidates
+                else None
+            ),
+            "seconds": dict(self.seconds),
+        }
+        if self.overlap:
+            stats["overlap_at_k_vs_full"] = float(np.mean(self.overlap))
+            stats["top1_agreement_vs_full"] = float(np.mean(self.top1_agreement))
+            cascade_seconds = self.seconds["first_stage"] + self.seconds["second_stage"]
+            stats["time_saved_vs_full"] = (
+                1 - cascade_seconds / self.seconds["full"]
+                if self.seconds["full"]
+                else None
+            )
+        for name in ["first_stage", "second_stage"]:
+            ranker = getattr(self, name)
+            if callable(getattr(ranker, "stats", None)):
+                stats[name] = ranker.stats()
+        return stats
+
+    def to_dict(self) -> Dict[str, Any]:
+        return default_to_dict(
+            self,
+            first_stage=self.first_stage.to_dict(),
+            second_stage=self.second_stage.to_dict(),
+            m=self.m,
+            top_k=self.top_k,
+            compare_to_full=self.compare_to_full,
+        )
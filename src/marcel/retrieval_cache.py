@@ -0,0 +1,89 @@
+from dataclasses import replace
+from typing import Any, Callable, Dict, List, Optional
+
+from haystack import Document, Pipeline, component, default_to_dict
+
+from marcel.cache import SQLiteCache
+from marcel.data_loader import fingerprint
+from marcel.stats import collect_stats, reset_stats
+
+
+@component
+class CachedFirstStage:
+    """Runs the first retrieval stage (retrievers and joiner) and caches its output per query.
+
+    Entries are keyed by the corpus fingerprint, the first-stage configuration
+    (retrievers, their settings and the join mode) and the query (id, question and
+    sources). Untruncated joiner outputs are stored so that runs with a different
+    `top_k` share the cache. On a hit, none of the first-stage components run,
+    which also means stochastic retrievers such as HyDE are replayed from the
+    cache.
+    """
+
+    def __init__(
+        self,
+        pipeline: Pipeline,
+        pipeline_runner: Callable[[Pipeline, Dict[str, Any]], List[Document]],
+        cache_path: Optional[str] = None,
+        corpus_fingerprint: str = "",
+        config: Optional[Dict[str, Any]] = None,
+        top_k: Optional[int] = None,
+    ):
+        self.pipeline = pipeline
+        self.pipeline_runner = pipeline_runner
+        self.cache_path = cache_path
+        self.corpus_fingerprint = corpus_fingerprint
+        self.config = config or {}
+        self.top_k = top_k
+        self.config_fingerprint = fingerprint(sorted(self.config.items()))
+        self.cache = SQLiteCache(cache_path, table="first_stage")
+        self.reset_stats()
+
+    def _key(self, query: Dict[str, Any]) -> str:
+        query_fingerprint = fingerprint(
+            [query.get("id"), query["question"], query.get("sources", [])]
+        )
+        return fingerprint(
+            [self.corpus_fingerprint, self.config_fingerprint, query_fingerprint]
+        )
+
+    @component.output_types(documents=List[Document])
+    def run(self, query: Dict[str, Any]):
+        key = self._key(query)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.hits += 1
+            documents = [Document.from_dict(doc) for doc in cached]
+        else:
+            self.misses += 1
+            documents = self.pipeline_runner(self.pipeline, query)
+            documents = [replace(doc, embedding=None) for doc in documents]
+            self.cache.put(key, [doc.to_dict(flatten=False) for doc in documents])
+        return {"documents": documents[: self.top_k]}
+
+    def warm_up(self):
+        self.pipeline.warm_up()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        reset_stats(self.pipeline)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else None,
+            **collect_stats(self.pipeline),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return default_to_dict(
+            self,
+            pipeline=self.pipeline.to_dict(),
+            cache_path=self.cache_path,
+            corpus_fingerprint=self.corpus_fingerprint,
+            config=self.config,
+            top_k=self.top_k,
+        )
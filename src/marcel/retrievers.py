@@ -2,35 +2,67 @@ import argparse
 import logging
 import os
 from pathlib import Path
-from typing import List
+from typing import Any, Dict, List, Optional
 
 from haystack import Pipeline
-from haystack.components.builders import ChatPromptBuilder
-from haystack.components.embedders import (
-    SentenceTransformersDocumentEmbedder,
-    SentenceTransformersTextEmbedder,
-)
-from haystack.components.generators.chat import OpenAIChatGenerator
-from haystack.components.joiners import DocumentJoiner
-from haystack.components.rankers import SentenceTransformersSimilarityRanker
 from haystack.components.retrievers.in_memory import (
     InMemoryBM25Retriever,
     InMemoryEmbeddingRetriever,
 )
-from haystack.components.writers import DocumentWriter
 from haystack.dataclasses import ChatMessage, Document
 from haystack.document_stores.in_memory import InMemoryDocumentStore
-from haystack.utils import Secret
 
 from marcel import data_loader
-from marcel.components import (
-    ContentLinkNormalizer,
-    OpenAIChatGeneratorMultipleSamples,
-)
+from marcel.chunking import ParentAggregator
+from marcel.concurrent_pipeline import ConcurrentPipeline
+from marcel.dedup import alias_map
+from marcel.embedding_cache import CachedTextEmbedder, QueryEmbeddingCache
 from marcel.experiment_runner import run_experiment
-from marcel.faq_retriever import FAQRetriever
-from marcel.hyde import HyDE
+from marcel.fusion import JOIN_MODES, ScoreFusionJoiner
+from marcel.indexing import build_documents, index_settings
+from marcel.inference import (
+    INFERENCE_BACKENDS,
+    haystack_backend,
+    with_inference_backend,
+)
+from marcel.llm_scheduler import PRIORITIES, schedule_calls, shared_scheduler
+from marcel.memory import MemoryProfiler, memory_stage
 from marcel.oracle_retriever import BM25RetrieverWithOracle
+from marcel.quantization import (
+    EMBEDDING_DTYPES,
+    QuantizedEmbeddingIndex,
+    QuantizedEmbeddingRetriever,
+)
+from marcel.retrieval_cache import CachedFirstStage
+from marcel.run_output import OUTPUT_FORMATS
+
+# NOTE: components which load torch/transformers (SentenceTransformers embedders,
+# rankers, FAQRetriever, HyDE) or the OpenAI client are imported where they are
+# needed, so that e.g. BM25-only runs and `--help` start quickly. Importing this
+# module must not import torch (see tests/test_retrievers.py).
+
+# Arguments which determine the output of the first stage (retrievers and joiner).
+FIRST_STAGE_ARGS = [
+    "retrievers",
+    "join_mode",
+    "join_weights",
+    "bm25_k",
+    "dense_k",
+    "faq_k",
+    "faq_embedding_model",
+    "faq_embedding_similarity_function",
+    "hyde_k",
+    "hyde_n",
+    "hyde_generator_model",
+    "embedding_model",
+    "embedding_similarity_function",
+    "embedding_dtype",
+    "inference_backend",
+    "embedding_rescore_factor",
+    "chunking",
+    "chunk_max_tokens",
+    "chunk_aggregation",
+]
 
 system_prompt_rag = """
 You are a helpful and engaging chatbot called Marcel. If someone asks you, your name is Marcel and you are employed at the Marburg University. You answer questions of students around their studies. Please answer the questions based on the provided documents only. Ignore your own knowledge. Don't say that you are looking at a set of documents. If you cannot find the answer to a given question in the documents you must apologize and say that you don't have any information about the topic (e.g., "Unfortunately, I do not have any knowledge about <rephrase the question>").
@@ -53,28 +85,141 @@ Given these documents, answer the question.
 """.strip()
 
 
-def get_pipeline(documents: List[Document], faqs: List[Document], config):
-    assert len(config.retrievers) == len(config.join_weights)
+def get_ranker(model: str, config):
+    from haystack.components.rankers import SentenceTransformersSimilarityRanker
 
-    document_store = InMemoryDocumentStore(
-        embedding_similarity_function=config.embedding_similarity_function
+    from marcel.rankers import CachedSimilarityRanker
+
+    ranker = SentenceTransformersSimilarityRanker(
+        model=model,
+        top_k=config.top_k,
+        batch_size=config.reranker_batch_size,
+        backend=haystack_backend(config.inference_backend),
     )
-    indexing_pipeline = Pipeline()
-    indexing_pipeline.add_component(
-        "embedder",
-        SentenceTransformersDocumentEmbedder(model=config.embedding_model),
+    ranker = with_inference_backend(ranker, config.inference_backend)
+    if config.reranker_cache_path:
+        ranker = CachedSimilarityRanker(
+            ranker,
+            cache_path=config.reranker_cache_path,
+            inference_backend=config.inference_backend,
+        )
+    return ranker
+
+
+def get_embedding_retriever(document_store, embedding_index, top_k: int, config):
+    if embedding_index is None:
+        return InMemoryEmbeddingRetriever(
+            document_store=document_store, top_k=top_k, scale_score=True
+        )
+    return QuantizedEmbeddingRetriever(
+        embedding_index,
+        top_k=top_k,
+        scale_score=True,
+        rescore_factor=config.embedding_rescore_factor,
+        compare_to_exact=config.embedding_quantization_report,
     )
-    indexing_pipeline.add_component(
-        "writer", DocumentWriter(document_store=document_store)
+
+
+def corpus_index_settings(config) -> Dict[str, Any]:
+    # Sparse retrievers only: skip embedding the corpus.
+    embedding_model = None
+    if "dense" in config.retrievers or "hyde" in config.retrievers:
+        embedding_model = config.embedding_model
+    return index_settings(
+        embedding_model=embedding_model,
+        chunking=config.chunking,
+        chunk_max_tokens=config.chunk_max_tokens,
+        inference_backend=config.inference_backend,
     )
-    indexing_pipeline.connect("embedder", "writer")
-    indexing_pipeline.run({"documents": documents})
+
+
+def store_settings(config) -> Dict[str, Any]:
+    """Settings which determine the contents of the document store."""
+    settings = corpus_index_settings(config)
+    settings["embedding_similarity_function"] = config.embedding_similarity_function
+    if settings["embedding_model"]:
+        settings["embedding_dtype"] = config.embedding_dtype
+    return settings
+
+
+def get_document_store(
+    documents: List[Document],
+    config,
+    memory_profiler: Optional[MemoryProfiler] = None,
+):
+    """Returns the document store and, for compressed embeddings, the `QuantizedEmbeddingIndex`."""
+    settings = corpus_index_settings(config)
+    embedding_model = settings["embedding_model"]
+    with memory_stage(memory_profiler, "corpus_embedding"):
+        indexed = build_documents(
+            documents,
+            settings,
+            index_path=config.index_path,
+            embedding_workers=config.embedding_workers,
+        )
+    with memory_stage(memory_profiler, "store_write"):
+        embedding_index = None
+        if embedding_model and config.embedding_dtype != "float32":
+            embedding_index = QuantizedEmbeddingIndex(
+                indexed,
+                dtype=config.embedding_dtype,
+                similarity_function=config.embedding_similarity_function,
+            )
+            indexed = embedding_index.documents
+        document_store = InMemoryDocumentStore(
+            embedding_similarity_function=config.embedding_similarity_function
+        )
+        document_store.write_documents(indexed)
     print("Number of documents in store:", document_store.count_documents())
+    return document_store, embedding_index
+
+
+def get_pipeline(
+    documents: List[Document],
+    faqs: List[Document],
+    config,
+    document_store: Optional[InMemoryDocumentStore] = None,
+    embedding_index: Optional[QuantizedEmbeddingIndex] = None,
+    memory_profiler: Optional[MemoryProfiler] = None,
+):
+    """`document_store` and `embedding_index` can be shared by pipelines with the same `store_settings`."""
+    assert len(config.retrievers) == len(config.join_weights)
 
-    pipeline = Pipeline()
+    if document_store is None:
+        document_store, embedding_index = get_document_store(
+            documents, config, memory_profiler
+        )
+
+    embedding_cache = None
+    if config.query_embedding_cache_size > 0 or config.query_embedding_cache_path:
+        embedding_cache = QueryEmbeddingCache(
+            config.query_embedding_cache_path,
+            max_size=config.query_embedding_cache_size,
+        )
+
+    llm_scheduler = None
+    if config.llm_max_concurrency:
+        llm_scheduler = shared_scheduler(
+            os.environ.get("OPENAI_BASE_URL", ""),
+            config.llm_max_concurrency,
+            reserved_slots=config.llm_reserved_slots,
+            max_queued=config.llm_max_queued,
+        )
+
+    truncate_later = config.chunking != "none" or bool(config.retrieval_cache_path)
+    if config.concurrent_branches:
+        pipeline = ConcurrentPipeline(concurrency_limit=len(config.retrievers))
+    else:
+        pipeline = Pipeline()
     pipeline.add_component(
         "document_joiner",
-        DocumentJoiner(join_mode=config.join_mode, top_k=config.top_k),
+        ScoreFusionJoiner(
+            retrievers=config.retrievers,
+            weights=config.join_weights,
+            join_mode=config.join_mode,
+            # truncated after aggregating passages and/or by the first-stage cache
+            top_k=None if truncate_later else config.top_k,
+        ),
     )
 
     if "bm25" in config.retrievers:
@@ -86,7 +231,7 @@ def get_pipeline(documents: List[Document], faqs: List[Document], config):
                 scale_score=True,
             ),
         )
-        pipeline.connect("bm25_retriever.documents", "document_joiner")
+        pipeline.connect("bm25_retriever.documents", "document_joiner.bm25")
 
     if "oracle" in config.retrievers:
         pipeline.add_component(
@@ -95,68 +240,118 @@ def get_pipeline(documents: List[Document], faqs: List[Document], config):
                 document_store=document_store, top_k=config.bm25_k, mode="oracle"
             ),
         )
-        pipeline.connect("oracle_retriever.documents", "document_joiner")
+        pipeline.connect("oracle_retriever.documents", "document_joiner.oracle")
 
     if "faq" in config.retrievers:
-        pipeline.add_component(
-            "faq_retriever",
-            FAQRetriever(
+        from marcel.faq_retriever import FAQRetriever
+
+        with memory_stage(memory_profiler, "faq_index"):
+            faq_retriever = FAQRetriever(
                 documents=documents,
                 faqs=faqs,
                 top_k=config.faq_k,
                 embedding_model=config.faq_embedding_model,
                 embedding_similarity_function=config.faq_embedding_similarity_function,
-            ),  # type: ignore
-        )
-        pipeline.connect("faq_retriever.documents", "document_joiner")
+                inference_backend=config.inference_backend,
+                embedding_cache=embedding_cache,
+            )
+        pipeline.add_component("faq_retriever", faq_retriever)  # type: ignore
+        pipeline.connect("faq_retriever.documents", "document_joiner.faq")
 
     if "dense" in config.retrievers:
-        pipeline.add_component(
-            "dense_embedder",
+        from haystack.components.embedders import SentenceTransformersTextEmbedder
+
+        dense_embedder = with_inference_backend(
             SentenceTransformersTextEmbedder(
-                model=config.embedding_model, progress_bar=False
+                model=config.embedding_model,
+                progress_bar=False,
+                backend=haystack_backend(config.inference_backend),
             ),
+            config.inference_backend,
         )
+        if embedding_cache is not None:
+            dense_embedder = CachedTextEmbedder(
+                dense_embedder,
+                embedding_cache,
+                inference_backend=config.inference_backend,
+            )
+        pipeline.add_component("dense_embedder", dense_embedder)
         pipeline.add_component(
             "dense_retriever",
-            InMemoryEmbeddingRetriever(
-                document_store=document_store,
-                top_k=config.dense_k,
-                scale_score=True,
+            get_embedding_retriever(
+                document_store, embedding_index, config.dense_k, config
             ),
         )
         pipeline.connect("dense_embedder.embedding", "dense_retriever.query_embedding")
-        pipeline.connect("dense_retriever.documents", "document_joiner")
+        pipeline.connect("dense_retriever.documents", "document_joiner.dense")
 
     if "hyde" in config.retrievers:
-        pipeline.add_component(
-            "hyde_embedder",
-            HyDE(
-                generator_model=config.hyde_generator_model,
-                embedding_model=config.embedding_model,
-                n=config.hyde_n,
-            ),
+        from marcel.hyde import HyDE
+
+        hyde = HyDE(
+            generator_model=config.hyde_generator_model,
+            embedding_model=config.embedding_model,
+            n=config.hyde_n,
+            inference_backend=config.inference_backend,
         )
+        if llm_scheduler is not None:
+            schedule_calls(
+                hyde.pipeline.get_component("generator"),
+                llm_scheduler,
+                config.hyde_priority,
+            )
+        pipeline.add_component("hyde_embedder", hyde)
         pipeline.add_component(
             "hyde_retriever",
-            InMemoryEmbeddingRetriever(
-                document_store=document_store, top_k=config.hyde_k, scale_score=True
+            get_embedding_retriever(
+                document_store, embedding_index, config.hyde_k, config
             ),
         )
         pipeline.connect("hyde_embedder.embedding", "hyde_retriever.query_embedding")
-        pipeline.connect("hyde_retriever.documents", "document_joiner")
+        pipeline.connect("hyde_retriever.documents", "document_joiner.hyde")
 
-    if config.use_reranker:
+    first_stage = "document_joiner"
+    if config.chunking != "none":
         pipeline.add_component(
-            "reranker",
-            SentenceTransformersSimilarityRanker(
-                model=config.reranker_model,
-                top_k=config.top_k,
+            "parent_aggregator",
+            ParentAggregator(
+                parents=documents,
+                mode=config.chunk_aggregation,
+                top_k=None if config.retrieval_cache_path else config.top_k,
             ),
         )
-        pipeline.connect("document_joiner", "reranker")
+        pipeline.connect("document_joiner", "parent_aggregator")
+        first_stage = "parent_aggregator"
+
+    if config.retrieval_cache_path:
+        pipeline = wrap_first_stage(pipeline, documents, faqs, config)
+        first_stage = "first_stage"
+
+    if config.use_reranker:
+        reranker = get_ranker(config.reranker_model, config)
+        if config.cascade_reranker_model:
+            from marcel.rankers import CascadeRanker
+
+            reranker = CascadeRanker(
+                first_stage=get_ranker(config.cascade_reranker_model, config),
+                second_stage=reranker,
+                m=config.cascade_m,
+                top_k=config.top_k,
+                compare_to_full=config.cascade_report,
+            )
+        pipeline.add_component("reranker", reranker)
+        pipeline.connect(first_stage, "reranker")
 
     if config.use_generator:
+        from haystack.components.builders import ChatPromptBuilder
+        from haystack.components.generators.chat import OpenAIChatGenerator
+        from haystack.utils import Secret
+
+        from marcel.components import (
+            ContentLinkNormalizer,
+            OpenAIChatGeneratorMultipleSamples,
+        )
+
         link_normalizer = ContentLinkNormalizer()
         prompt_builder = ChatPromptBuilder(
             variables=["documents"], required_variables=["documents", "query"]
@@ -171,20 +366,56 @@ def get_pipeline(documents: List[Document], faqs: List[Document], config):
                 "max_tokens": config.generation_max_tokens,
             },
         )
+        if llm_scheduler is not None:
+            schedule_calls(llm, llm_scheduler, config.llm_priority)
         # with n > 1 we get problems with Gemma on vLLM.
         # Therefore, send n independent requests with this wrapper component.
         multi_llm_wrapper = OpenAIChatGeneratorMultipleSamples(
-            llm, n=config.generation_n
+            llm,
+            n=config.generation_n,
+            adaptive=config.generation_adaptive,
+            min_samples=config.generation_min_samples,
+            wave_size=config.generation_wave_size,
+            agreement_threshold=config.generation_agreement_threshold,
         )
 
         pipeline.add_component("link_normalizer", link_normalizer)
         pipeline.add_component("prompt_builder", prompt_builder)
-        pipeline.add_component("llm", multi_llm_wrapper)
+        if config.answer_cache_path:
+            from haystack.components.embedders import SentenceTransformersTextEmbedder
+
+            from marcel.answer_cache import SemanticAnswerCache
+
+            question_embedder = with_inference_backend(
+                SentenceTransformersTextEmbedder(
+                    model=config.answer_cache_embedding_model,
+                    progress_bar=False,
+                    backend=haystack_backend(config.inference_backend),
+                ),
+                config.inference_backend,
+            )
+            if embedding_cache is not None:
+                question_embedder = CachedTextEmbedder(
+                    question_embedder,
+                    embedding_cache,
+                    inference_backend=config.inference_backend,
+                )
+            cached_llm = SemanticAnswerCache(
+                multi_llm_wrapper,
+                question_embedder,
+                cache_path=config.answer_cache_path,
+                threshold=config.answer_cache_threshold,
+                corpus_fingerprint=data_loader.corpus_fingerprint(documents),
+            )
+            pipeline.add_component("llm", cached_llm)
+            pipeline.connect("link_normalizer", "llm.documents")
+        else:
+            pipeline.add_component("llm", multi_llm_wrapper)
 
         if config.use_reranker:
             pipeline.connect("reranker", "link_normalizer")
         else:
-            pipeline.connect("document_joiner", "link_normalizer")
+            pipeline.connect(first_stage, "link_normalizer")
 
         pipeline.connect("link_normalizer", "prompt_builder")
         pipeline.connect("prompt_builder.prompt", "llm.messages")
@@ -192,7 +423,30 @@ def get_pipeline(documents: List[Document], faqs: List[Document], config):
     return pipeline
 
 
-def run_pipeline(pipeline, query):
+def wrap_first_stage(first_stage: Pipeline, documents, faqs, config) -> Pipeline:
+    """Move retrievers and joiner behind a component which caches their output per query."""
+    first_stage_config = {arg: getattr(config, arg) for arg in FIRST_STAGE_ARGS}
+    if "faq" in config.retrievers:
+        first_stage_config["faqs"] = data_loader.fingerprint(
+            [(faq.content, faq.meta) for faq in faqs]
+        )
+
+    pipeline = Pipeline()
+    pipeline.add_component(
+        "first_stage",
+        CachedFirstStage(
+            first_stage,
+            pipeline_runner=run_first_stage,
+            cache_path=config.retrieval_cache_path,
+            corpus_fingerprint=data_loader.corpus_fingerprint(documents),
+            config=first_stage_config,
+            top_k=config.top_k,
+        ),
+    )
+    return pipeline
+
+
+def first_stage_inputs(pipeline, query):
     pipeline_input = {}
     if "hyde_embedder" in pipeline.inputs():
         pipeline_input["hyde_embedder"] = {"text": query["question"]}
@@ -218,11 +472,32 @@ def run_pipeline(pipeline, query):
     if "faq_retriever" in pipeline.inputs():
         pipeline_input["faq_retriever"] = {"text": query["question"]}
 
+    return pipeline_input
+
+
+def first_stage_output(pipeline) -> str:
+    """Name of the component which returns the first-stage documents."""
+    for name in ["first_stage", "parent_aggregator"]:
+        if name in pipeline.graph.nodes:
+            return name
+    return "document_joiner"
+
+
+def run_first_stage(pipeline, query) -> List[Document]:
+    result = pipeline.run(first_stage_inputs(pipeline, query))
+    return result[first_stage_output(pipeline)]["documents"]
+
+
+def run_pipeline(pipeline, query):
+    final_retriever = first_stage_output(pipeline)
+    if final_retriever == "first_stage":
+        pipeline_input = {"first_stage": {"query": query}}
+    else:
+        pipeline_input = first_stage_inputs(pipeline, query)
+
     if "reranker" in pipeline.inputs():
         pipeline_input["reranker"] = {"query": query["question"]}
         final_retriever = "reranker"
-    else:
-        final_retriever = "document_joiner"
 
     try:
         try:
@@ -237,6 +512,8 @@ def run_pipeline(pipeline, query):
                 + [ChatMessage.from_user(user_prompt_template_rag)],
                 "template_variables": {"query": query["question"]},
             }
+            if "question" in pipeline.inputs().get("llm", {}):
+                pipeline_input["llm"] = {"question": query["question"]}
             result = pipeline.run(
                 pipeline_input,
                 include_outputs_from={final_retriever, "llm"},
@@ -254,28 +531,35 @@ def run_pipeline(pipeline, query):
                 "generated_answer": "",
                 "documents": result[final_retriever]["documents"],
             }
-    except Exception:
+    except Exception as error:
         logging.exception(f"Failed to generate response for {query['id']}")
-        result = {"generated_answer": "", "documents": []}
+        result = {"generated_answer": "", "documents": [], "error": repr(error)}
 
     return result
 
 
 def main(args):
-    documents = data_loader.load_documents(args.data_path)
-    queries = data_loader.load_queries(
-        args.query_path, skip_without_sources=args.skip_without_sources
-    )
+    memory_profiler = MemoryProfiler() if args.profile_memory else None
+    with memory_stage(memory_profiler, "load_data"):
+        documents = data_loader.load_documents(
+            args.data_path, dedup_threshold=args.dedup_threshold
+        )
+        aliases = alias_map(documents)
+        queries = data_loader.load_queries(
+            args.query_path,
+            skip_without_sources=args.skip_without_sources,
+            aliases=aliases,
+        )
 
-    faqs = []
-    if "faq" in args.retrievers:
-        faqs = data_loader.load_faqs(args.faq_path)
+        faqs = []
+        if "faq" in args.retrievers:
+            faqs = data_loader.load_faqs(args.faq_path, aliases=aliases)
 
     print(f"documents = {len(documents)}")
     print(f"queries = {len(queries)}")
     print(f"faqs = {len(faqs)}")
 
-    pipeline = get_pipeline(documents, faqs, args)
+    pipeline = get_pipeline(documents, faqs, args, memory_profiler=memory_profiler)
     config = vars(args)
     config["run_id"] = Path(args.out_path).name
 
@@ -286,10 +570,15 @@ def main(args):
         run_path=args.out_path,
         documents=documents,
         config=vars(args),
+        shard_index=args.shard_index,
+        shard_count=args.shard_count,
+        output_format=args.output_format,
+        memory_profiler=memory_profiler,
     )
 
 
-def parse_args():
+def parse_args(argv=None, require_io=True):
+    """`require_io=False` makes --query_path and --out_path optional (e.g., for the server)."""
     parser = argparse.ArgumentParser()
 
     # fmt: off
@@ -297,9 +586,14 @@ def parse_args():
     # Input / output paths
     # =======================================
     parser.add_argument("--data_path", type=str, required=True, help="Path to the JSONL file containing documents.")
-    parser.add_argument("--query_path", type=str, required=True, help="Path to the JSON file containing queries.")
+    parser.add_argument("--query_path", type=str, required=require_io, help="Path to the JSON file containing queries.")
     parser.add_argument("--faq_path", type=str, required=False, help="Path to FAQs (only for FAQ retriever).")
-    parser.add_argument("--out_path", type=str, required=True, help="Path where experiment output will be stored.")
+    parser.add_argument("--out_path", type=str, required=require_io, help="Path where experiment output will be stored.")
+    parser.add_argument("--dedup_threshold", type=float, required=False, help="Collapse near-duplicate pages (estimated Jaccard similarity of word shingles, e.g., 0.9) into one canonical page.")
+    parser.add_argument("--shard_index", type=int, default=0, help="Run only every --shard_count-th query, starting at this index (e.g., $SLURM_ARRAY_TASK_ID).")
+    parser.add_argument("--shard_count", type=int, default=1, help="Shards are written to <out_path>/shards/ and merged with merge_shards.py.")
+    parser.add_argument("--profile_memory", action="store_true", default=False, help="Write RSS and traced allocations per stage to memory.json (slows down the run).")
+    parser.add_argument("--output_format", type=str, default="json", choices=OUTPUT_FORMATS, help="compact: store contexts by reference to one content table per run (convert with run_output.py).")
     parser.add_argument("--skip-without-sources", action=argparse.BooleanOptionalAction, default=True, help="Only use queries which have ground-truth sources (useful for retriever-only evaluation).")
 
     # =======================================
@@ -307,8 +601,18 @@ def parse_args():
     # =======================================
     parser.add_argument("--top_k", type=int, default=50)
     parser.add_argument("--retrievers", type=str, nargs="+", choices=["bm25", "dense", "hyde", "faq", "oracle"], default=["bm25"])
-    parser.add_argument("--join_mode", type=str, default="reciprocal_rank_fusion")
-    parser.add_argument("--join_weights", type=float, nargs="+", required=False)
+    parser.add_argument("--join_mode", type=str, choices=JOIN_MODES, default="reciprocal_rank_fusion")
+    parser.add_argument("--join_weights", type=float, nargs="+", required=False, help="One weight per retriever, in the order of --retrievers.")
+    parser.add_argument("--concurrent_branches", action="store_true", default=False, help="Run the retrievers of a query concurrently (latency of the slowest retriever instead of their sum).")
+    parser.add_argument("--retrieval_cache_path", type=str, required=False, help="SQLite file to cache first-stage results (retrievers and joiner) across runs.")
+
+    # =======================================
+    # Passage-level retrieval
+    # =======================================
+    parser.add_argument("--chunking", type=str, choices=["none", "markdown"], default="none", help="Index passages split at markdown headers instead of full pages.")
+    parser.add_argument("--chunk_max_tokens", type=int, default=200, help="Maximum passage length in words.")
+    parser.add_argument("--index_path", type=str, required=False, help="Persistent index directory, updated incrementally when the documents change (see indexing.py).")
+    parser.add_argument("--chunk_aggregation", type=str, choices=["passages", "parent"], default="passages", help="Return retrieved passages of a page (passages) or the full page (parent).")
 
     # =======================================
     # BM25, Dense, FAQ, HyDE settings
@@ -321,18 +625,31 @@ def parse_args():
     parser.add_argument("--hyde_k", type=int, default=50)
     parser.add_argument("--hyde_n", type=int, default=3)
     parser.add_argument("--hyde_generator_model", type=str, default="neuralmagic/Meta-Llama-3.1-70B-Instruct-quantized.w8a8")
+    parser.add_argument("--hyde_priority", type=str, default="prefetch", choices=PRIORITIES, help="Priority class of HyDE requests (with --llm_max_concurrency).")
 
     # =======================================
     # Document embedding model (HyDE, Dense)
     # =======================================
     parser.add_argument("--embedding_model", type=str, default="all-MiniLM-L6-v2")
     parser.add_argument("--embedding_similarity_function", type=str, default="cosine")
+    parser.add_argument("--embedding_dtype", type=str, choices=EMBEDDING_DTYPES, default="float32", help="Store document embeddings compressed (float16, or int8 with per-vector scales); top candidates are rescored with float32 embeddings.")
+    parser.add_argument("--embedding_rescore_factor", type=int, default=4, help="Rescore the top k * factor compressed matches exactly.")
+    parser.add_argument("--embedding_quantization_report", action="store_true", default=False, help="Also search float32 exhaustively and report recall@k of the compressed search in stats.json.")
+    parser.add_argument("--query_embedding_cache_size", type=int, default=0, help="Query embeddings kept in memory, shared by the dense and FAQ retrievers (e.g., 10000; 0 disables the cache).")
+    parser.add_argument("--query_embedding_cache_path", type=str, required=False, help="SQLite file to cache query embeddings across runs.")
+    parser.add_argument("--inference_backend", type=str, choices=INFERENCE_BACKENDS, default="torch", help="Inference backend of all embedders and rerankers: onnx (ONNX Runtime, needs optimum[onnxruntime]) or torch_qint8 (dynamic int8 quantization, CPU). Compare with inference.py.")
+    parser.add_argument("--embedding_workers", type=int, default=1, help="Embed the corpus with this many CPU worker processes (e.g., $SLURM_CPUS_PER_TASK); torch threads are split among them.")
 
     # =======================================
     # Reranker
     # =======================================
     parser.add_argument("--use_reranker", action="store_true", default=False)
     parser.add_argument("--reranker_model", type=str)
+    parser.add_argument("--reranker_batch_size", type=int, default=16)
+    parser.add_argument("--reranker_cache_path", type=str, required=False, help="SQLite file to cache reranker scores across runs.")
+    parser.add_argument("--cascade_reranker_model", type=str, required=False, help="Cheap cross-encoder which pre-ranks all candidates; only the top --cascade_m are scored by --reranker_model.")
+    parser.add_argument("--cascade_m", type=int, default=10)
+    parser.add_argument("--cascade_report", action="store_true", default=False, help="Also rank all candidates with --reranker_model and report quality lost by the cascade in stats.json.")
 
     # =======================================
     # Generator
@@ -342,9 +659,26 @@ def parse_args():
     parser.add_argument("--generation_temperature", type=float, default=0.7)
     parser.add_argument("--generation_n", type=int, default=3)
     parser.add_argument("--generation_max_tokens", type=int, default=512)
+    parser.add_argument("--generation_adaptive", action="store_true", default=False, help="Draw --generation_min_samples, then --generation_wave_size more at a time, and stop before --generation_n once the samples agree.")
+    parser.add_argument("--generation_min_samples", type=int, default=2)
+    parser.add_argument("--generation_wave_size", type=int, default=1)
+    parser.add_argument("--generation_agreement_threshold", type=float, default=0.7, help="Minimum word overlap (Jaccard) of every pair of samples; non-answers agree with each other only.")
+    parser.add_argument("--llm_max_concurrency", type=int, required=False, help="Send at most this many concurrent requests to the LLM server (shared by all pipelines of the process).")
+    parser.add_argument("--llm_reserved_slots", type=int, default=0, help="Slots of --llm_max_concurrency which only interactive requests may use.")
+    parser.add_argument("--llm_max_queued", type=int, required=False, help="Backpressure: wait before the next query while this many batch/prefetch requests are queued.")
+    parser.add_argument("--llm_priority", type=str, default="batch", choices=PRIORITIES, help="Priority class of generator requests (interactive for the retrieval server).")
+    parser.add_argument("--answer_cache_path", type=str, required=False, help="SQLite file of a semantic answer cache: paraphrases of answered questions with the same sources reuse the answer.")
+    parser.add_argument("--answer_cache_threshold", type=float, default=0.95, help="Minimum cosine similarity of a question to a cached question.")
+    parser.add_argument("--answer_cache_embedding_model", type=str, default="all-MiniLM-L6-v2")
     # fmt: on
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+
+    for name in ["generation_n", "generation_min_samples", "generation_wave_size"]:
+        if getattr(args, name) < 1:
+            parser.error(f"--{name} must be at least 1")
+    if args.generation_adaptive and args.generation_min_samples > args.generation_n:
+        parser.error("--generation_min_samples must be at most --generation_n")
 
     if not args.join_weights:
         args.join_weights = [1] * len(args.retrievers)  # uniform
@@ -0,0 +1,96 @@
+"""Reading and writing the predictions of a run.
+
+- json: `output.json`, a list of predictions with the full content of every
+  retrieved document (the format read by `marcel_evaluation`).
+- compact: `output.jsonl` with one prediction per line, where every context
+  refers to its content by fingerprint, and `contents.jsonl` with every distinct
+  content of the run once.
+
+`load_predictions` reads either format into the `output.json` schema. Running
+this module converts a compact run to `output.json` for evaluation:
+
+    python src/marcel/run_output.py --run_path output/20250317-email/bm25
+"""
+
+import argparse
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+from marcel.data_loader import fingerprint
+
+OUTPUT_FORMATS = ["json", "compact"]
+OUTPUT_FILES = {"json": "output.json", "compact": "output.jsonl"}
+CONTENTS_FILE = "contents.jsonl"
+
+
+def output_exists(run_path) -> bool:
+    return any((Path(run_path) / name).exists() for name in OUTPUT_FILES.values())
+
+
+def write_predictions(
+    run_path, predictions: List[Dict[str, Any]], output_format="json"
+):
+    run_path = Path(run_path)
+    if output_format == "json":
+        with open(run_path / OUTPUT_FILES["json"], "w") as fout:
+            json.dump(predictions, fout)
+        return
+    if output_format != "compact":
+        raise ValueError(f"Invalid output format {output_format}.")
+
+    contents: Dict[str, str] = {}
+    records = []
+    for prediction in predictions:
+        contexts = []
+        for context in prediction["contexts"]:
+            content_id = fingerprint(context["content"])
+            contents[content_id] = context["content"]
+            contexts.append({**context, "content": content_id})
+        records.append({**prediction, "contexts": contexts})
+
+    # The content table is written first, so output.jsonl marks a complete run.
+    with open(run_path / CONTENTS_FILE, "w") as fout:
+        for content_id, content in contents.items():
+            fout.write(json.dumps({"id": content_id, "content": content}) + "\n")
+    with open(run_path / OUTPUT_FILES["compact"], "w") as fout:
+        for record in records:
+            fout.write(json.dumps(record) + "\n")
+
+
+def load_predictions(run_path) -> List[Dict[str, Any]]:
+    """Predictions of a run in the `output.json` schema."""
+    run_path = Path(run_path)
+    if (run_path / OUTPUT_FILES["json"]).exists():
+        with open(run_path / OUTPUT_FILES["json"]) as fin:
+            return json.load(fin)
+
+    with open(run_path / CONTENTS_FILE) as fin:
+        contents = {}
+        for line in fin:
+            row = json.loads(line)
+            contents[row["id"]] = row["content"]
+
+    predictions = []
+    with open(run_path / OUTPUT_FILES["compact"]) as fin:
+        for line in fin:
+            prediction = json.loads(line)
+            for context in prediction["contexts"]:
+                context["content"] = contents[context["content"]]
+            predictions.append(prediction)
+    return predictions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+
+    # fmt: off
+    parser.add_argument("--run_path", type=str, required=True, help="Run directory with output.jsonl and contents.jsonl.")
+    # fmt: on
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    write_predictions(args.run_path, load_predictions(args.run_path), "json")
@@ -0,0 +1,433 @@
+"""Long-running retrieval server which keeps the corpus, indexes and models warm.
+
+The pipeline is built once from the usual `retrievers.py` arguments and queries
+are answered with `run_pipeline`, so responses are identical to the entries of
+`output.json` of an experiment run.
+
+    POST /retrieve  {"id": ..., "question": ..., "sources": [...]}  -> prediction without generated answer
+    POST /rag       (same body)                                     -> prediction with generated answer
+    GET  /health, GET /stats
+
+With `--use_generator`, `/retrieve` is answered by a second pipeline without
+the generator, which shares the document store but holds its own copy of the
+query embedders and rankers, so retrieval requests neither wait for nor send
+requests to the LLM.
+
+Requests of concurrent clients are collected into batches (up to
+`--max_batch_size`, waiting at most `--max_batch_wait_ms` for more requests).
+The questions of a batch are embedded in one call per query embedder and
+identical queries are answered once. The queries then run concurrently (up to
+`--max_concurrency`), so a query waiting for the LLM delays neither the other
+queries of its batch nor the next batches. Calls into the models are
+serialized, as they are not thread-safe.
+
+Example:
+
+    python src/marcel/server.py --port 8765 -- \\
+        --data_path data/crawls/20250317/data.jsonl \\
+        --retrievers bm25 dense --embedding_model all-MiniLM-L6-v2
+
+    curl -s localhost:8765/retrieve -d '{"question": "When does the semester start?"}'
+
+With `--socket_path`, the server listens on a Unix socket instead of a TCP port.
+"""
+
+import argparse
+import json
+import logging
+import os
+import queue
+import socketserver
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from marcel.experiment_runner import to_prediction
+from marcel.inference import serialize_model_calls
+from marcel.stats import collect_stats
+
+logger = logging.getLogger(__name__)
+
+ENDPOINTS = ["/retrieve", "/rag"]
+
+
+def text_embedders(pipeline):
+    """Query (text) embedders of `pipeline`, including those of nested pipelines (e.g., FAQ retriever, first-stage cache)."""
+    for name in pipeline.graph.nodes:
+        instance = pipeline.get_component(name)
+        nested = getattr(instance, "pipeline", None)
+        if nested is not None:
+            yield from text_embedders(nested)
+        elif hasattr(instance, "base_embedder"):
+            # Cache misses of a CachedTextEmbedder use the batch embeddings.
+            yield instance.base_embedder
+        elif hasattr(instance, "embedding_backend") and not hasattr(
+            instance, "meta_fields_to_embed"
+        ):
+            yield instance
+
+
+class EmbeddingBatcher:
+    """Embeds the questions of a batch with one call per query embedder.
+
+    The `run` method of every embedder is wrapped to return the embedding of a
+    recent batch if there is one, and to embed the text otherwise. Embeddings of
+    the last `max_size` questions are kept, as queries of a batch may still run
+    when the next batch is embedded.
+    """
+
+    def __init__(self, pipeline, max_size: int = 1024):
+        self.max_size = max_size
+        self.embedders = list(text_embedders(pipeline))
+        self.embeddings: List[Dict[str, Any]] = []
+        for embedder in self.embedders:
+            embeddings: Dict[str, Any] = {}
+            embedder.run = self._batched(embedder.run, embeddings)
+            self.embeddings.append(embeddings)
+
+    @staticmethod
+    def _batched(run, embeddings):
+        def run_batched(text: str):
+            embedding = embeddings.get(text)
+            if embedding is not None:
+                return {"embedding": embedding}
+            return run(text=text)
+
+        return run_batched
+
+    def prime(self, texts: List[str]):
+        texts = list(dict.fromkeys(texts))
+        for embedder, embeddings in zip(self.embedders, self.embeddings):
+            missing = [text for text in texts if text not in embeddings]
+            if embedder.embedding_backend is None or len(missing) < 2:
+                continue
+            vectors = embedder.embedding_backend.embed(
+                [embedder.prefix + text + embedder.suffix for text in missing],
+                batch_size=embedder.batch_size,
+                show_progress_bar=False,
+                normalize_embeddings=embedder.normalize_embeddings,
+                precision=embedder.precision,
+                **(embedder.encode_kwargs or {}),
+            )
+            embeddings.update(zip(missing, vectors))
+            while len(embeddings) > self.max_size:
+                embeddings.pop(next(iter(embeddings)))
+
+
+class QueryBatcher:
+    """Collects queries of concurrent clients into batches and runs their queries concurrently.
+
+    One worker thread forms the batches and embeds their questions. The queries
+    run on a pool of `max_concurrency` threads. A result with an `error` (see
+    `run_pipeline`) is raised as `RuntimeError`.
+    """
+
+    def __init__(
+        self,
+        pipeline,
+        pipeline_runner,
+        max_batch_size: int = 16,
+        max_batch_wait: float = 0.005,
+        max_concurrency: int = 16,
+    ):
+        self.pipeline = pipeline
+        self.pipeline_runner = pipeline_runner
+        self.max_batch_size = max_batch_size
+        self.max_batch_wait = max_batch_wait
+        self.embedding_batcher = EmbeddingBatcher(
+            pipeline, max_size=max_batch_size + max_concurrency
+        )
+        self.queue: "queue.Queue[Any]" = queue.Queue()
+        self.pool = ThreadPoolExecutor(max_concurrency)
+        self.lock = threading.Lock()
+
+        self.requests = 0
+        self.batches = 0
+        self.coalesced = 0
+        self.seconds = 0.0
+        self.worker = threading.Thread(target=self._work, daemon=True)
+        self.worker.start()
+
+    def submit(self, query: Dict[str, Any]) -> "Future[Dict[str, Any]]":
+        future: "Future[Dict[str, Any]]" = Future()
+        self.queue.put((query, future))
+        return future
+
+    def run(self, query: Dict[str, Any]) -> Dict[str, Any]:
+        return self.submit(query).result()
+
+    def close(self):
+        self.queue.put(None)
+        self.worker.join()
+        self.pool.shutdown()
+
+    def _next_batch(self):
+        item = self.queue.get()
+        if item is None:
+            return None
+        batch = [item]
+        deadline = time.monotonic() + self.max_batch_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is None:
+                self.queue.put(None)  # stop after this batch
+                break
+            batch.append(item)
+        return batch
+
+    def _work(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self._run_batch(batch)
+            except Exception as error:
+                # E.g., in the embedders.
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+
+    def _run_batch(self, batch):
+        self.embedding_batcher.prime([query["question"] for query, _ in batch])
+        # Identical queries (question and sources) are answered once.
+        groups: Dict[str, List[Any]] = {}
+        for query, future in batch:
+            key = json.dumps([query["question"], query.get("sources", [])])
+            groups.setdefault(key, []).append((query, future))
+        with self.lock:
+            self.requests += len(batch)
+            self.batches += 1
+            self.coalesced += len(batch) - len(groups)
+        for group in groups.values():
+            self.pool.submit(self._run_query, group)
+
+    def _run_query(self, group):
+        start = time.perf_counter()
+        try:
+            result = self.pipeline_runner(self.pipeline, group[0][0])
+        except Exception as error:
+            for _, future in group:
+                future.set_exception(error)
+            return
+        duration = time.perf_counter() - start
+        with self.lock:
+            self.seconds += duration
+        for query, future in group:
+            if "error" in result:
+                future.set_exception(RuntimeError(result["error"]))
+            else:
+                future.set_result(to_prediction(query, result, duration))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch_size": self.requests / self.batches if self.batches else None,
+            "coalesced": self.coalesced,
+            "queued": self.queue.qsize(),
+            "seconds": self.seconds,
+        }
+
+
+def has_generator(pipeline) -> bool:
+    return "llm" in pipeline.graph.nodes
+
+
+def get_pipelines(documents, faqs, config):
+    """The pipeline of `config` and the one answering `/retrieve` (the same without a generator)."""
+    from marcel.retrievers import get_document_store, get_pipeline
+
+    document_store, embedding_index = get_document_store(documents, config)
+    pipeline = get_pipeline(
+        documents,
+        faqs,
+        config,
+        document_store=document_store,
+        embedding_index=embedding_index,
+    )
+    if not config.use_generator:
+        return pipeline, pipeline
+    retrieval_config = argparse.Namespace(**{**vars(config), "use_generator": False})
+    retrieval_pipeline = get_pipeline(
+        documents,
+        faqs,
+        retrieval_config,
+        document_store=document_store,
+        embedding_index=embedding_index,
+    )
+    return pipeline, retrieval_pipeline
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    server: Any
+
+    def _reply(self, status: int, body: Any):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._reply(200, {"status": "ok", "generator": self.server.generator})
+        elif self.path == "/stats":
+            stats = {
+                "server": self.server.batcher.stats(),
+                **collect_stats(self.server.batcher.pipeline),
+            }
+            if self.server.retrieval_batcher is not self.server.batcher:
+                stats["retrieval_server"] = self.server.retrieval_batcher.stats()
+            self._reply(200, stats)
+        else:
+            self._reply(404, {"error": f"Unknown path {self.path}."})
+
+    def do_POST(self):
+        if self.path not in ENDPOINTS:
+            self._reply(404, {"error": f"Unknown path {self.path}."})
+            return
+        if self.path == "/rag" and not self.server.generator:
+            self._reply(
+                400, {"error": "The server was started without --use_generator."}
+            )
+            return
+
+        try:
+            query = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            query.setdefault("id", None)
+            query.setdefault("sources", [])
+            if not isinstance(query.get("question"), str):
+                raise ValueError("The query has no question.")
+        except (TypeError, ValueError, AttributeError) as error:
+            self._reply(400, {"error": f"Invalid query: {error}"})
+            return
+
+        try:
+            if self.path == "/retrieve":
+                prediction = self.server.retrieval_batcher.run(query)
+                prediction.pop("generated_answer")
+            else:
+                prediction = self.server.batcher.run(query)
+        except Exception as error:
+            self._reply(500, {"error": f"Failed to answer the query: {error}"})
+            return
+        self._reply(200, prediction)
+
+    def address_string(self):
+        # Unix socket clients have no address.
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+class UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(
+    batcher: QueryBatcher,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    socket_path: Optional[str] = None,
+    retrieval_batcher: Optional[QueryBatcher] = None,
+):
+    """`retrieval_batcher` answers `/retrieve` (default: `batcher`)."""
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server: Any = UnixHTTPServer(socket_path, RequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), RequestHandler)
+    server.batcher = batcher
+    server.retrieval_batcher = retrieval_batcher or batcher
+    server.generator = has_generator(batcher.pipeline)
+    return server
+
+
+def main(args, retriever_args):
+    from marcel import data_loader
+    from marcel.dedup import alias_map
+    from marcel.retrievers import run_pipeline
+
+    documents = data_loader.load_documents(
+        retriever_args.data_path, dedup_threshold=retriever_args.dedup_threshold
+    )
+    faqs = []
+    if "faq" in retriever_args.retrievers:
+        faqs = data_loader.load_faqs(
+            retriever_args.faq_path, aliases=alias_map(documents)
+        )
+    print(f"documents = {len(documents)}")
+    print(f"faqs = {len(faqs)}")
+
+    pipeline, retrieval_pipeline = get_pipelines(documents, faqs, retriever_args)
+    pipelines = [pipeline]
+    if retrieval_pipeline is not pipeline:
+        pipelines.append(retrieval_pipeline)
+    batchers = []
+    for instance in pipelines:
+        instance.warm_up()
+        serialize_model_calls(instance)
+        batchers.append(
+            QueryBatcher(
+                instance,
+                run_pipeline,
+                max_batch_size=args.max_batch_size,
+                max_batch_wait=args.max_batch_wait_ms / 1000,
+                max_concurrency=args.max_concurrency,
+            )
+        )
+    batcher, retrieval_batcher = batchers[0], batchers[-1]
+
+    server = make_server(
+        batcher,
+        args.host,
+        args.port,
+        args.socket_path,
+        retrieval_batcher=retrieval_batcher,
+    )
+    print(f"Serving on {args.socket_path or f'http://{args.host}:{args.port}'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        for batcher in batchers:
+            batcher.close()
+
+
+def parse_args(argv=None):
+    from marcel.retrievers import parse_args as parse_retriever_args
+
+    parser = argparse.ArgumentParser(
+        usage="%(prog)s [server options] -- <retrievers.py options>",
+        allow_abbrev=False,
+    )
+
+    # fmt: off
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--socket_path", type=str, required=False, help="Listen on this Unix socket instead of --host/--port.")
+    parser.add_argument("--max_batch_size", type=int, default=16, help="Maximum number of concurrent requests per batch.")
+    parser.add_argument("--max_batch_wait_ms", type=float, default=5, help="Time to wait for more requests before running a batch.")
+    parser.add_argument("--max_concurrency", type=int, default=16, help="Maximum number of queries answered concurrently (e.g., waiting for the LLM).")
+    # fmt: on
+
+    args, retriever_argv = parser.parse_known_args(argv)
+    if retriever_argv[:1] == ["--"]:
+        retriever_argv = retriever_argv[1:]
+    return args, parse_retriever_args(retriever_argv, require_io=False)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main(*parse_args())
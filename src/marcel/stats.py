@@ -0,0 +1,26 @@
+from typing import Any, Dict
+
+from marcel.llm_scheduler import schedulers
+
+
+def collect_stats(pipeline) -> Dict[str, Any]:
+    """Gather run statistics (e.g., cache hit rates) from components exposing `stats()`."""
+    stats = {
+        name: instance.stats()
+        for name, instance in pipeline.walk()
+        if callable(getattr(instance, "stats", None))
+    }
+    llm_schedulers = schedulers(pipeline)
+    if llm_schedulers:
+        # Shared by all pipelines of the process which use the same server.
+        stats["llm_scheduler"] = [scheduler.stats() for scheduler in llm_schedulers]
+    return {name: value for name, value in stats.items() if value}
+
+
+def reset_stats(pipeline):
+    """Reset the statistics of all components (e.g., after warming up the pipeline)."""
+    for _, instance in pipeline.walk():
+        if callable(getattr(instance, "reset_stats", None)):
+            instance.reset_stats()
+    for scheduler in schedulers(pipeline):
+        scheduler.reset_stats()
@@ -0,0 +1,242 @@
+"""Run a grid of retriever configurations in one process.
+
+Documents, queries, FAQs and document stores (including corpus embeddings) are
+loaded once and shared by all configurations with the same settings. Rankers
+with the same model share one cross-encoder, and calls into every model are
+serialized so that pipelines can run concurrently in threads (up to
+`--max_workers`); this pays off most when runs wait on a generator server or
+on BM25 retrieval rather than on a local model. Every run is written to
+`<out_dir>/<run_id>/` exactly like a run of `retrievers.py`, and runs whose
+outputs exist are skipped.
+
+The grid file maps argument names of `retrievers.py` to lists of values. All
+combinations are run; a list of such mappings runs the union of their
+combinations. Example (`sweeps/rerankers.json`, shortened):
+
+    {
+        "reranker_model": ["jinaai/jina-reranker-v1-tiny-en", "mixedbread-ai/mxbai-rerank-base-v1", ...]
+    }
+
+    python src/marcel/sweep.py --grid sweeps/rerankers.json --out_dir output/20250317-email \\
+        --run_id "bm25_dense_rerank_{reranker_model}" -- \\
+        --data_path data/crawls/20250317/data.jsonl \\
+        --query_path data/queries/20250317-email.json \\
+        --retrievers bm25 dense --use_reranker ...
+"""
+
+import argparse
+import copy
+import itertools
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from marcel import data_loader
+from marcel.dedup import alias_map
+from marcel.experiment_runner import run_experiment
+from marcel.inference import pipeline_models, serialize_model_calls
+from marcel.retrievers import (
+    get_document_store,
+    get_pipeline,
+    run_pipeline,
+    store_settings,
+)
+from marcel.retrievers import (
+    parse_args as parse_retriever_args,
+)
+from marcel.run_output import output_exists
+
+logger = logging.getLogger(__name__)
+
+
+def slug(value) -> str:
+    if isinstance(value, list):
+        return "+".join(slug(v) for v in value)
+    return str(value).replace("/", "-")
+
+
+def expand_grid(grid, base, run_id=None) -> List[Tuple[str, argparse.Namespace]]:
+    """All configurations of `grid` (a mapping or a list of mappings) applied to the `base` arguments."""
+    configs = []
+    for mapping in grid if isinstance(grid, list) else [grid]:
+        for name in mapping:
+            if not hasattr(base, name):
+                raise ValueError(f"Unknown argument {name} in grid.")
+        names = list(mapping)
+        for values in itertools.product(*(mapping[name] for name in names)):
+            overrides = dict(zip(names, values))
+            config = copy.deepcopy(base)
+            for name, value in overrides.items():
+                setattr(config, name, value)
+            if "retrievers" in overrides and "join_weights" not in overrides:
+                config.join_weights = [1] * len(config.retrievers)
+
+            slugs = {name: slug(value) for name, value in overrides.items()}
+            if run_id:
+                config_run_id = run_id.format(**slugs)
+            else:
+                config_run_id = "_".join(
+                    f"{name}-{value}" for name, value in slugs.items()
+                )
+            configs.append((config_run_id, config))
+
+    run_ids = [config_run_id for config_run_id, _ in configs]
+    duplicates = sorted({r for r in run_ids if run_ids.count(r) > 1})
+    if duplicates:
+        raise ValueError(f"Run ids are not unique: {duplicates}")
+    backends = {config.inference_backend for _, config in configs}
+    if {"torch", "torch_qint8"} <= backends:
+        # Haystack shares one embedding model per model name across embedders.
+        raise ValueError("torch and torch_qint8 cannot be mixed in one sweep.")
+    return configs
+
+
+def share_models(pipeline, models: Dict[Any, Any], inference_backend: str):
+    """Warm up `pipeline`, reusing the cross-encoders in `models` (keyed by model and backend)."""
+    rankers = [c for c in pipeline_models(pipeline) if hasattr(c, "_cross_encoder")]
+    for ranker in rankers:
+        ranker._cross_encoder = models.get((ranker.model, inference_backend))
+
+    pipeline.warm_up()
+
+    for ranker in rankers:
+        if ranker._cross_encoder is None:
+            # E.g., CachedSimilarityRanker defers loading to the first cache miss,
+            # which would load the model in several runs (threads) at once.
+            ranker.warm_up()
+        ranker._cross_encoder = models.setdefault(
+            (ranker.model, inference_backend), ranker._cross_encoder
+        )
+    # Embedding models are shared by Haystack already.
+    serialize_model_calls(pipeline)
+
+
+class SharedResources:
+    """Loads documents, queries, FAQs and document stores once per distinct setting."""
+
+    def __init__(self):
+        self.documents: Dict[Any, Any] = {}
+        self.queries: Dict[Any, Any] = {}
+        self.faqs: Dict[Any, Any] = {}
+        self.stores: Dict[Any, Any] = {}
+        self.models: Dict[Any, Any] = {}
+
+    def get_documents(self, config):
+        key = (config.data_path, config.dedup_threshold)
+        if key not in self.documents:
+            self.documents[key] = data_loader.load_documents(
+                config.data_path, dedup_threshold=config.dedup_threshold
+            )
+        return self.documents[key]
+
+    def get_queries(self, config):
+        key = (config.data_path, config.dedup_threshold, config.query_path)
+        key += (config.skip_without_sources,)
+        if key not in self.queries:
+            self.queries[key] = data_loader.load_queries(
+                config.query_path,
+                skip_without_sources=config.skip_without_sources,
+                aliases=alias_map(self.get_documents(config)),
+            )
+        return self.queries[key]
+
+    def get_faqs(self, config):
+        if "faq" not in config.retrievers:
+            return []
+        key = (config.data_path, config.dedup_threshold, config.faq_path)
+        if key not in self.faqs:
+            self.faqs[key] = data_loader.load_faqs(
+                config.faq_path, aliases=alias_map(self.get_documents(config))
+            )
+        return self.faqs[key]
+
+    def get_document_store(self, config):
+        key = (config.data_path, config.dedup_threshold, config.index_path)
+        key += (json.dumps(store_settings(config), sort_keys=True),)
+        if key not in self.stores:
+            self.stores[key] = get_document_store(self.get_documents(config), config)
+        return self.stores[key]
+
+    def get_pipeline(self, config):
+        document_store, embedding_index = self.get_document_store(config)
+        pipeline = get_pipeline(
+            self.get_documents(config),
+            self.get_faqs(config),
+            config,
+            document_store=document_store,
+            embedding_index=embedding_index,
+        )
+        share_models(pipeline, self.models, config.inference_backend)
+        return pipeline
+
+
+def main(args, base):
+    with open(args.grid) as fin:
+        grid = json.load(fin)
+    configs = expand_grid(grid, base, run_id=args.run_id)
+
+    pending = []
+    for run_id, config in configs:
+        config.out_path = str(Path(args.out_dir) / run_id)
+        config.run_id = run_id
+        if output_exists(config.out_path):
+            print(f"{config.out_path} has outputs. SKIP.")
+        else:
+            pending.append(config)
+    print(f"runs = {len(configs)} ({len(pending)} pending)")
+
+    resources = SharedResources()
+    runs = [(config, resources.get_pipeline(config)) for config in pending]
+    print(f"document stores = {len(resources.stores)}")
+    print(f"cross-encoders = {len(resources.models)}")
+
+    def run(config, pipeline):
+        documents = resources.get_documents(config)
+        run_experiment(
+            pipeline,
+            run_pipeline,
+            queries=resources.get_queries(config),
+            run_path=config.out_path,
+            documents=documents,
+            config=vars(config),
+            shard_index=config.shard_index,
+            shard_count=config.shard_count,
+            output_format=config.output_format,
+        )
+
+    with ThreadPoolExecutor(args.max_workers) as pool:
+        futures = {
+            config.run_id: pool.submit(run, config, pipeline)
+            for config, pipeline in runs
+        }
+    failed = [run_id for run_id, future in futures.items() if future.exception()]
+    for run_id in failed:
+        logger.error("Run %s failed", run_id, exc_info=futures[run_id].exception())
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {len(runs)} runs failed: {failed}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        usage="%(prog)s [sweep options] -- <retrievers.py options>",
+        allow_abbrev=False,
+    )
+
+    # fmt: off
+    parser.add_argument("--grid", type=str, required=True, help="JSON file mapping retrievers.py argument names to lists of values.")
+    parser.add_argument("--out_dir", type=str, required=True, help="Runs are written to <out_dir>/<run_id>/.")
+    parser.add_argument("--run_id", type=str, required=False, help="Run id template with the grid arguments as fields, e.g., 'rerank_{reranker_model}_k{top_k}'. Defaults to all grid values.")
+    parser.add_argument("--max_workers", type=int, default=4, help="Runs executed concurrently.")
+    # fmt: on
+
+    args, retriever_argv = parser.parse_known_args(argv)
+    if retriever_argv[:1] == ["--"]:
+        retriever_argv = retriever_argv[1:]
+    return args, parse_retriever_args(retriever_argv + ["--out_path", args.out_dir])
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main(*parse_args())
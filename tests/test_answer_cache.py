@@ -0,0 +1,138 @@
+import json
+
+import pytest
+from haystack import Document
+from haystack.dataclasses import ChatMessage
+
+from marcel.answer_cache import SemanticAnswerCache
+
+
+class FakeGenerator:
+    def __init__(self):
+        self.calls = 0
+
+    def run(self, messages):
+        self.calls += 1
+        reply = ChatMessage.from_assistant(
+            f"answer {self.calls}", meta={"usage": {"total_tokens": 100}}
+        )
+        return {"replies": [reply]}
+
+    def to_dict(self):
+        return {"type": "FakeGenerator", "init_parameters": {"model": "m"}}
+
+
+class FakeEmbedder:
+    """Questions with the same first word get similar embeddings."""
+
+    EMBEDDINGS = {
+        "deadline": [1.0, 0.0, 0.0],
+        "Deadline": [0.99, 0.1, 0.0],
+        "library": [0.0, 1.0, 0.0],
+    }
+
+    def run(self, text):
+        return {"embedding": self.EMBEDDINGS[text.split()[0]]}
+
+    def warm_up(self):
+        pass
+
+    def to_dict(self):
+        return {"type": "FakeEmbedder", "init_parameters": {}}
+
+
+MESSAGES = [ChatMessage.from_system("system"), ChatMessage.from_user("prompt")]
+SOURCES = [
+    Document(content="a", meta={"url": "a"}),
+    Document(content="b", meta={"url": "b"}),
+]
+
+
+def ask(cache, question, documents=SOURCES):
+    return cache.run(messages=MESSAGES, question=question, documents=documents)[
+        "replies"
+    ][0].text
+
+
+def test_paraphrase_reuses_answer():
+    generator = FakeGenerator()
+    cache = SemanticAnswerCache(generator, FakeEmbedder(), threshold=0.95)
+
+    assert ask(cache, "deadline for enrollment?") == "answer 1"
+    assert ask(cache, "Deadline to enroll?") == "answer 1"  # paraphrase
+    assert ask(cache, "library opening hours?") == "answer 2"
+    assert ask(cache, "deadline for enrollment?", SOURCES[:1]) == "answer 3"
+    assert generator.calls == 3
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["saved_tokens"]) == (1, 3, 100)
+    assert stats["mean_hit_similarity"] == pytest.approx(0.995, abs=0.01)
+
+
+def test_threshold():
+    generator = FakeGenerator()
+    cache = SemanticAnswerCache(generator, FakeEmbedder(), threshold=0.999)
+    ask(cache, "deadline for enrollment?")
+    ask(cache, "Deadline to enroll?")
+    assert generator.calls == 2
+
+
+def test_persistence_and_invalidation(tmp_path):
+    path = str(tmp_path / "answers.sqlite")
+    cache = SemanticAnswerCache(
+        FakeGenerator(), FakeEmbedder(), path, corpus_fingerprint="c1"
+    )
+    ask(cache, "deadline for enrollment?")
+
+    generator = FakeGenerator()
+    cache = SemanticAnswerCache(
+        generator, FakeEmbedder(), path, corpus_fingerprint="c1"
+    )
+    assert ask(cache, "Deadline to enroll?") == "answer 1"
+    assert generator.calls == 0
+
+    # new crawl
+    cache = SemanticAnswerCache(
+        generator, FakeEmbedder(), path, corpus_fingerprint="c2"
+    )
+    ask(cache, "Deadline to enroll?")
+    assert generator.calls == 1
+
+
+def test_entries_of_concurrent_writers_are_kept(tmp_path):
+    path = str(tmp_path / "answers.sqlite")
+    # e.g., two processes, both of which have read the (empty) entries
+    first = SemanticAnswerCache(FakeGenerator(), FakeEmbedder(), path)
+    second = SemanticAnswerCache(FakeGenerator(), FakeEmbedder(), path)
+    ask(first, "deadline for enrollment?")
+    ask(second, "library opening hours?")
+    assert len(first.cache) == 2  # one row per question
+
+    generator = FakeGenerator()
+    cache = SemanticAnswerCache(generator, FakeEmbedder(), path)
+    assert ask(cache, "deadline for enrollment?") == "answer 1"
+    assert ask(cache, "library opening hours?") == "answer 1"
+    assert generator.calls == 0
+
+
+def test_rag_pipeline_with_answer_cache(tmp_path, monkeypatch):
+    from marcel.retrievers import get_pipeline, parse_args, run_pipeline
+
+    monkeypatch.setenv("OPENAI_BASE_URL", "http://localhost:1/v1")
+    monkeypatch.setenv("OPENAI_API_KEY", "key")
+    argv = ["--data_path", "d", "--query_path", "q", "--out_path", "o"]
+    argv += ["--retrievers", "bm25", "--top_k", "2", "--use_generator"]
+    argv += ["--answer_cache_path", str(tmp_path / "answers.sqlite")]
+    documents = [
+        Document(content="deadline enroll enrollment", meta={"url": "a"}),
+        Document(content="deadline enroll enrollment library", meta={"url": "b"}),
+    ]
+    pipeline = get_pipeline(documents, [], parse_args(argv))
+    llm = pipeline.get_component("llm")
+    llm.generator, llm.embedder = FakeGenerator(), FakeEmbedder()
+
+    first = run_pipeline(pipeline, {"id": 1, "question": "deadline for enrollment?"})
+    second = run_pipeline(pipeline, {"id": 2, "question": "Deadline to enroll?"})
+    assert first["generated_answer"] == second["generated_answer"] == ["answer 1"]
+    assert llm.stats()["hits"] == 1
+    assert json.dumps(pipeline.to_dict())
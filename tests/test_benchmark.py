@@ -0,0 +1,119 @@
+import json
+
+import numpy as np
+import pytest
+import sentence_transformers
+
+from marcel.benchmark import (
+    SyntheticCrawl,
+    bench_embedding_batching,
+    bench_retriever_config,
+    compare,
+    latency_stats,
+    write_synthetic_data,
+)
+from marcel.data_loader import load_documents, load_faqs, load_queries
+
+
+def test_synthetic_crawl_is_deterministic():
+    crawl = SyntheticCrawl(vocabulary_size=500, seed=1)
+    assert crawl.record(3) == SyntheticCrawl(vocabulary_size=500, seed=1).record(3)
+    assert crawl.record(3) != crawl.record(4)
+    assert crawl.record(3) != SyntheticCrawl(vocabulary_size=500, seed=2).record(3)
+
+
+def test_write_synthetic_data(tmp_path):
+    paths = write_synthetic_data(tmp_path, n_docs=20, n_queries=5, n_faqs=3)
+
+    documents = load_documents(paths["data_path"])
+    assert len(documents) == 20
+    assert all(doc.meta["links"] for doc in documents if "[1]:" in doc.content)
+
+    urls = {doc.meta["url"] for doc in documents}
+    queries = load_queries(paths["query_path"], skip_without_sources=True)
+    assert len(queries) == 5
+    assert all(source in urls for query in queries for source in query["sources"])
+
+    faqs = load_faqs(paths["faq_path"])
+    assert len(faqs) == 3
+
+    # existing files are reused
+    with open(paths["query_path"], "w") as fout:
+        json.dump([], fout)
+    write_synthetic_data(tmp_path, n_docs=20, n_queries=5, n_faqs=3)
+    assert load_queries(paths["query_path"]) == []
+
+    # ... unless they were generated with other parameters
+    write_synthetic_data(tmp_path, n_docs=20, n_queries=4, n_faqs=3, seed=1)
+    queries = load_queries(paths["query_path"])
+    assert len(queries) == 4
+    assert len(load_documents(paths["data_path"])) == 20
+    assert queries[0]["question"] == SyntheticCrawl(seed=1).query(0, 20)["question"]
+
+
+def test_latency_stats():
+    stats = latency_stats([0.1] * 99 + [1.1])
+    assert stats["n"] == 100
+    assert stats["p50_ms"] == pytest.approx(100)
+    assert stats["max_ms"] == pytest.approx(1100)
+    assert stats["qps"] == pytest.approx(100 / 11)
+    assert latency_stats([]) == {}
+
+
+def test_compare():
+    def report(p50):
+        return {
+            "results": {"1000": {"retrievers": {"bm25": {"latency": {"p50_ms": p50}}}}}
+        }
+
+    assert compare(report(10), report(15)) == {"1000/bm25": pytest.approx(0.5)}
+    assert compare(report(10), {"results": {}}) == {}
+
+
+def test_bench_retriever_config(tmp_path, monkeypatch):
+    from marcel import retrievers
+    from marcel.experiment_runner import WARM_UP_QUESTION
+
+    paths = write_synthetic_data(tmp_path, n_docs=30, n_queries=4, n_faqs=0)
+    queries = load_queries(paths["query_path"], skip_without_sources=True)
+    run_pipeline = retrievers.run_pipeline
+    questions = []
+
+    def failing_run_pipeline(pipeline, query):
+        questions.append(query["question"])
+        if query["id"] == queries[-1]["id"]:
+            return {"generated_answer": "", "documents": [], "error": "failed"}
+        return run_pipeline(pipeline, query)
+
+    monkeypatch.setattr(retrievers, "run_pipeline", failing_run_pipeline)
+    paths = {k: str(v) for k, v in paths.items() if v}
+    result = bench_retriever_config(paths, ["--retrievers", "bm25"])
+    assert questions[0] == WARM_UP_QUESTION
+    assert questions[1:] == [query["question"] for query in queries]
+    assert result["errors"] == 1
+    assert result["latency"]["n"] == 3
+
+
+class FakeSentenceTransformer:
+    def __init__(self, model, device=None):
+        pass
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        return np.ones((len(texts), 2))
+
+
+def test_bench_embedding_batching(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        sentence_transformers, "SentenceTransformer", FakeSentenceTransformer
+    )
+    paths = write_synthetic_data(tmp_path, n_docs=50, n_queries=1, n_faqs=0)
+    result = bench_embedding_batching(
+        paths["data_path"], "fake", n_docs=40, batch_size=8, max_batch_tokens=2048
+    )
+    assert result["n_docs"] == 40
+    assert result["fixed"]["batches"] == 5
+    assert 0 < result["fixed"]["padding_efficiency"] <= 1
+    assert (
+        result["token_budget"]["padding_efficiency"]
+        > result["fixed"]["padding_efficiency"]
+    )
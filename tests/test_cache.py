@@ -0,0 +1,58 @@
+import threading
+
+from marcel.cache import SQLiteCache
+
+
+def test_sqlite_cache_roundtrip():
+    cache = SQLiteCache()
+    assert cache.get("a") is None
+    assert cache.get("a", default=1) == 1
+
+    cache.put("a", {"score": 0.5})
+    cache.put_many({"b": [1, 2], "c": "text"})
+    assert cache.get("a") == {"score": 0.5}
+    assert cache.get_many(["b", "c", "missing"]) == {"b": [1, 2], "c": "text"}
+    assert "b" in cache
+    assert len(cache) == 3
+
+    cache.put("a", 1)  # overwrite
+    assert cache.get("a") == 1
+
+    cache.put_many({"p:1": 1, "p:2": 2, "q:1": 3})
+    assert cache.get_prefix("p:") == {"p:1": 1, "p:2": 2}
+
+    cache.delete_many(["a", "b", "p:1", "p:2", "q:1"])
+    assert cache.items() == [("c", "text")]
+
+
+def test_sqlite_cache_persistence(tmp_path):
+    path = tmp_path / "nested" / "cache.sqlite"
+    cache = SQLiteCache(str(path), table="scores")
+    cache.put_many({f"key-{i}": i for i in range(1200)})
+    cache.close()
+
+    cache = SQLiteCache(str(path), table="scores")
+    keys = [f"key-{i}" for i in range(1200)]
+    assert cache.get_many(keys) == {f"key-{i}": i for i in range(1200)}
+
+    # tables are independent
+    assert len(SQLiteCache(str(path), table="other")) == 0
+
+    # rollback journal, as the write-ahead log only works on one host
+    (mode,) = cache.connection.execute("PRAGMA journal_mode").fetchone()
+    assert mode == "delete"
+
+
+def test_sqlite_cache_threads():
+    cache = SQLiteCache()
+
+    def write(offset):
+        for i in range(100):
+            cache.put(f"{offset}-{i}", i)
+
+    threads = [threading.Thread(target=write, args=(t,)) for t in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(cache) == 400
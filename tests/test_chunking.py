@@ -0,0 +1,99 @@
+import textwrap
+
+from haystack import Document
+
+from marcel.chunking import (
+    ParentAggregator,
+    chunk_documents,
+    split_markdown,
+    split_sections,
+)
+
+CONTENT = textwrap.dedent(
+    """
+    Intro without header.
+
+    # Data science
+
+    Short section.
+
+    ## Admission
+
+    one two three four five six
+
+    seven eight nine ten
+
+    ## Contact
+
+    Mail us.
+    """
+).strip()
+
+
+def test_split_sections():
+    sections = split_sections(CONTENT)
+    assert len(sections) == 4
+    assert sections[0] == "Intro without header."
+    assert sections[1].startswith("# Data science")
+    assert sections[3] == "## Contact\n\nMail us."
+    assert split_sections("#hashtag is not a header") == ["#hashtag is not a header"]
+
+
+def test_split_markdown():
+    # everything fits
+    assert split_markdown(CONTENT, max_tokens=100) == [CONTENT]
+
+    passages = split_markdown(CONTENT, max_tokens=8)
+    assert passages == [
+        "Intro without header.\n\n# Data science\n\nShort section.",
+        "## Admission\n\none two three four five six",
+        "seven eight nine ten\n\n## Contact\n\nMail us.",
+    ]
+
+    # paragraphs longer than the limit are split into word windows
+    assert split_markdown("a b c d e", max_tokens=2) == ["a b", "c d", "e"]
+
+
+def test_chunk_documents():
+    parent = Document(content=CONTENT, meta={"url": "example.com", "links": {1: "x"}})
+    passages = chunk_documents([parent], max_tokens=8)
+    assert len(passages) == 3
+    assert all(p.meta["parent_id"] == parent.id for p in passages)
+    assert [p.meta["chunk_index"] for p in passages] == [0, 1, 2]
+    assert all(p.meta["url"] == "example.com" for p in passages)
+    assert all("links" not in p.meta for p in passages)
+    assert len({p.id for p in passages}) == 3
+
+
+def test_parent_aggregator():
+    a = Document(id="a", content="a0 a1 a2", meta={"url": "a"})
+    b = Document(id="b", content="b0 b1", meta={"url": "b"})
+
+    def passage(parent, i, score):
+        return Document(
+            content=f"{parent.id}{i}",
+            meta={"parent_id": parent.id, "chunk_index": i},
+            score=score,
+        )
+
+    ranked = [passage(a, 2, 0.9), passage(b, 0, 0.8), passage(a, 0, 0.7)]
+
+    result = ParentAggregator([a, b]).run(ranked)["documents"]
+    assert [(doc.id, doc.content, doc.score) for doc in result] == [
+        ("a", "a0\n\na2", 0.9),
+        ("b", "b0", 0.8),
+    ]
+    assert result[0].meta == {"url": "a"}
+
+    result = ParentAggregator([a, b], mode="parent", top_k=1).run(ranked)["documents"]
+    assert [(doc.id, doc.content, doc.score) for doc in result] == [
+        ("a", "a0 a1 a2", 0.9)
+    ]
+
+    # full pages (e.g., from the FAQ retriever) are kept as they are
+    page = Document(id="b", content="b0 b1", meta={"url": "b"}, score=0.95)
+    result = ParentAggregator([a, b]).run([page] + ranked)["documents"]
+    assert [(doc.id, doc.content, doc.score) for doc in result] == [
+        ("b", "b0 b1", 0.95),
+        ("a", "a0\n\na2", 0.9),
+    ]
@@ -1,11 +1,20 @@
+import itertools
+import threading
+
+import pytest
 from haystack import Document
+from haystack.dataclasses import ChatMessage
 
 from marcel.components import (
     ContentLinkNormalizer,
     MostRelevantFirstReranker,
     MostRelevantLastReranker,
+    OpenAIChatGeneratorMultipleSamples,
     RandomReranker,
     clean_unlinked_references,
+    is_non_answer,
+    samples_agree,
+    word_overlap,
 )
 
 
@@ -127,3 +136,74 @@ def test_clean_unlinked_references():
     content = "[            Forward                               ][60]"
     matched = "[60]"
     assert clean_unlinked_references(content, matched) == ""
+
+
+def test_samples_agree():
+    assert is_non_answer("Unfortunately, I do not have any knowledge about fees.")
+    assert is_non_answer("Leider habe ich keine Informationen zu diesem Thema.")
+    assert not is_non_answer("The fee is 300 EUR.")
+    assert word_overlap("The fee is 300 EUR.", "the fee is 300 eur") == 1.0
+
+    assert samples_agree(["The fee is 300 EUR.", "The fee is 300 EUR!"], 0.7)
+    assert not samples_agree(["The fee is 300 EUR.", "Ask the office."], 0.7)
+    assert samples_agree(
+        [
+            "Unfortunately, I do not have any knowledge about fees.",
+            "Unfortunately, I don't have any information about the fee.",
+        ],
+        0.7,
+    )
+    assert not samples_agree(
+        ["The fee is 300 EUR.", "I do not have any information about fees."], 0.0
+    )
+
+
+class ScriptedGenerator:
+    def __init__(self, texts):
+        self.texts = itertools.cycle(texts)
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def run(self, messages):
+        with self.lock:
+            self.calls += 1
+            return {"replies": [ChatMessage.from_assistant(next(self.texts))]}
+
+    def to_dict(self):
+        return {"type": "ScriptedGenerator", "init_parameters": {}}
+
+
+def test_adaptive_sampling():
+    messages = [ChatMessage.from_user("What is the fee?")]
+
+    base = ScriptedGenerator(["The fee is 300 EUR."])
+    generator = OpenAIChatGeneratorMultipleSamples(base, n=5, adaptive=True)
+    assert len(generator.run(messages=messages)["replies"]) == 2
+    assert base.calls == 2
+
+    base = ScriptedGenerator(["The fee is 300 EUR.", "Ask the student office."])
+    generator = OpenAIChatGeneratorMultipleSamples(
+        base, n=5, adaptive=True, wave_size=2
+    )
+    assert len(generator.run(messages=messages)["replies"]) == 5  # 2 + 2 + 1
+    generator.base_generator = ScriptedGenerator(["The fee is 300 EUR."])
+    generator.run(messages=messages)
+
+    stats = generator.stats()
+    assert (stats["queries"], stats["samples"], stats["early_stops"]) == (2, 7, 1)
+    assert stats["saved_samples"] == 3
+    assert generator.to_dict()["init_parameters"]["adaptive"] is True
+
+    with pytest.raises(ValueError):
+        OpenAIChatGeneratorMultipleSamples(base, n=5, adaptive=True, wave_size=0)
+    with pytest.raises(ValueError):
+        OpenAIChatGeneratorMultipleSamples(base, n=1, adaptive=True)
+
+
+def test_fixed_sampling():
+    base = ScriptedGenerator(["The fee is 300 EUR."])
+    generator = OpenAIChatGeneratorMultipleSamples(base, n=3)
+    replies = generator.run(messages=[ChatMessage.from_user("q")])["replies"]
+    assert len(replies) == 3
+    assert generator.stats() == {}
+    assert "adaptive" not in generator.to_dict()["init_parameters"]
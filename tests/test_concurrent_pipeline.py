@@ -0,0 +1,102 @@
+import time
+from typing import List
+
+import numpy as np
+from haystack import Document, component
+from haystack.components.embedders.backends import sentence_transformers_backend
+
+from marcel.concurrent_pipeline import ConcurrentPipeline
+from marcel.fusion import ScoreFusionJoiner
+from marcel.retrievers import get_pipeline, parse_args, run_pipeline
+
+
+@component
+class SlowRetriever:
+    def __init__(self, seconds: float, content: str):
+        self.seconds = seconds
+        self.content = content
+
+    @component.output_types(documents=List[Document])
+    def run(self, query: str):
+        time.sleep(self.seconds)
+        return {"documents": [Document(content=self.content, score=1.0)]}
+
+
+def test_branches_run_concurrently():
+    pipeline = ConcurrentPipeline(concurrency_limit=2)
+    pipeline.add_component("bm25_retriever", SlowRetriever(0.3, "a"))
+    pipeline.add_component("hyde_retriever", SlowRetriever(0.3, "b"))
+    pipeline.add_component(
+        "document_joiner", ScoreFusionJoiner(retrievers=["bm25", "hyde"])
+    )
+    pipeline.connect("bm25_retriever.documents", "document_joiner.bm25")
+    pipeline.connect("hyde_retriever.documents", "document_joiner.hyde")
+
+    start = time.perf_counter()
+    result = pipeline.run(
+        {"bm25_retriever": {"query": "q"}, "hyde_retriever": {"query": "q"}}
+    )
+    assert time.perf_counter() - start < 0.55
+    contents = {doc.content for doc in result["document_joiner"]["documents"]}
+    assert contents == {"a", "b"}
+
+
+def test_same_results_as_sequential_pipeline():
+    documents = [
+        Document(content=f"page {i} about topic {i % 3}", meta={"url": str(i)})
+        for i in range(20)
+    ]
+    argv = ["--data_path", "d", "--query_path", "q", "--out_path", "o"]
+    argv += ["--retrievers", "bm25", "oracle", "--top_k", "5"]
+    sequential = get_pipeline(documents, [], parse_args(argv))
+    concurrent = get_pipeline(
+        documents, [], parse_args(argv + ["--concurrent_branches"])
+    )
+    assert isinstance(concurrent, ConcurrentPipeline)
+
+    query = {"id": 1, "question": "topic 2", "sources": ["2", "5"]}
+    expected = run_pipeline(sequential, query)["documents"]
+    result = run_pipeline(concurrent, query)["documents"]
+    assert [doc.id for doc in result] == [doc.id for doc in expected]
+    assert [doc.score for doc in result] == [doc.score for doc in expected]
+
+
+class FakeSentenceTransformer:
+    words = ["paris", "rome", "berlin", "lives"]
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def encode(self, texts, **kwargs):
+        counts = [[text.lower().count(word) for word in self.words] for text in texts]
+        return np.array(counts, dtype=np.float32) + 0.01
+
+
+def test_faq_retriever_in_concurrent_pipeline(monkeypatch):
+    monkeypatch.setattr(
+        sentence_transformers_backend, "SentenceTransformer", FakeSentenceTransformer
+    )
+    monkeypatch.setattr(
+        sentence_transformers_backend._SentenceTransformersEmbeddingBackendFactory,
+        "_instances",
+        {},
+    )
+    documents = [
+        Document(content="Jean lives in Paris.", meta={"url": "jean"}),
+        Document(content="Giorgio lives in Rome.", meta={"url": "giorgio"}),
+    ]
+    faqs = [Document(content="Who lives in Rome?", meta={"sources": ["giorgio"]})]
+    argv = ["--data_path", "d", "--retrievers", "bm25", "faq"]
+    sequential = get_pipeline(documents, faqs, parse_args(argv, require_io=False))
+    concurrent = get_pipeline(
+        documents, faqs, parse_args(argv + ["--concurrent_branches"], require_io=False)
+    )
+
+    query = {"id": 1, "question": "Who lives in Rome?", "sources": []}
+    expected = run_pipeline(sequential, query)
+    result = run_pipeline(concurrent, query)
+    assert "error" not in result
+    assert result["documents"][0].meta["url"] == "giorgio"
+    assert [doc.id for doc in result["documents"]] == [
+        doc.id for doc in expected["documents"]
+    ]
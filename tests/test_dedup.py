@@ -0,0 +1,88 @@
+import json
+from pathlib import Path
+
+from haystack import Document
+
+from marcel.data_loader import load_documents, load_queries
+from marcel.dedup import (
+    alias_map,
+    collapse_near_duplicates,
+    lsh_params,
+    near_duplicate_clusters,
+    resolve_urls,
+)
+
+PAGE = " ".join(f"word{i}" for i in range(200))
+
+
+def test_lsh_params():
+    bands, rows = lsh_params(0.9, 128)
+    assert bands * rows == 128
+    assert abs((1 / bands) ** (1 / rows) - 0.9) < 0.1
+
+
+def test_near_duplicate_clusters():
+    texts = [
+        PAGE,
+        "Other page about enrollment deadlines and fees.",
+        PAGE + " Print view",
+        PAGE.replace("word100", "changed"),
+        "",
+        "",
+    ]
+    clusters = near_duplicate_clusters(texts, threshold=0.8)
+    # Empty pages are never considered duplicates.
+    assert clusters == [[0, 2, 3]]
+    assert near_duplicate_clusters([PAGE, PAGE[:200]], threshold=0.8) == []
+
+
+def test_near_duplicate_clusters_compares_all_bucket_members():
+    # 1 and 2 share a bucket with the dissimilar 0, which comes first.
+    texts = [
+        "w23 w7 w23 w48 w59 w0 w15 w7 w31 w38 w58 w30",
+        "w37 w7 w23 w48 w59 w0 w15 w7 w31 w48 w58 w30",
+        "w23 w7 w23 w48 w59 w0 w15 w7 w31 w48 w52 w30",
+    ]
+    assert near_duplicate_clusters(texts, threshold=0.5, num_perm=16) == [[1, 2]]
+
+
+def test_collapse_near_duplicates():
+    docs = [
+        Document(content=PAGE, meta={"url": "uni.de/page/print"}),
+        Document(content=PAGE, meta={"url": "uni.de/page"}),
+        Document(content="Unrelated.", meta={"url": "uni.de/other"}),
+    ]
+    collapsed = collapse_near_duplicates(docs, threshold=0.9)
+    assert [doc.meta["url"] for doc in collapsed] == ["uni.de/page", "uni.de/other"]
+    assert collapsed[0].meta["aliases"] == ["uni.de/page/print"]
+    assert "aliases" not in collapsed[1].meta
+
+    aliases = alias_map(collapsed)
+    assert aliases == {"uni.de/page/print": "uni.de/page"}
+    assert resolve_urls(["uni.de/page/print", "uni.de/page"], aliases) == [
+        "uni.de/page"
+    ]
+
+
+def test_load_with_dedup(tmpdir):
+    docs = [
+        {"url": "https://uni.de/page?print=1", "content": PAGE, "og": {}},
+        {"url": "https://uni.de/page", "content": PAGE, "og": {}},
+        {"url": "https://uni.de/other", "content": "Unrelated.", "og": {}},
+    ]
+    data_path = Path(tmpdir) / "documents.jsonl"
+    with open(data_path, "w") as fout:
+        for doc in docs:
+            fout.write(json.dumps(doc) + "\n")
+    query_path = Path(tmpdir) / "queries.json"
+    with open(query_path, "w") as fout:
+        json.dump([{"id": "q", "sources": ["https://uni.de/page?print=1"]}], fout)
+
+    loaded = load_documents(data_path)
+    deduplicated = load_documents(data_path, dedup_threshold=0.9)
+    assert len(loaded) == 3
+    assert len(deduplicated) == 2
+    assert deduplicated[0].meta["fingerprint"] != loaded[1].meta["fingerprint"]
+
+    queries = load_queries(query_path, aliases=alias_map(deduplicated))
+    assert queries[0]["sources"] == ["uni.de/page"]
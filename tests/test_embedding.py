@@ -0,0 +1,67 @@
+import numpy as np
+from haystack import Document
+
+from marcel import embedding
+from marcel.embedding import (
+    BatchedDocumentEmbedder,
+    embed_documents_parallel,
+    embed_texts,
+    encode_batched,
+    token_budget_batches,
+)
+
+
+class FakeModel:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, batch_size, **kwargs):
+        assert batch_size == len(texts)
+        self.calls.append(list(texts))
+        return np.array([[len(text), 1.0] for text in texts])
+
+
+def test_embed_texts_restores_order():
+    model = FakeModel()
+    texts = ["a", "ccc", "bb", "dddd", ""]
+    embeddings = embed_texts(texts, "fake", shard_size=2, model_factory=lambda: model)
+    assert embeddings.dtype == np.float32
+    assert embeddings[:, 0].tolist() == [1, 3, 2, 4, 0]
+    # Shards are formed from length-sorted texts.
+    assert model.calls == [["dddd", "ccc"], ["bb", "a"], [""]]
+
+
+def test_embed_documents_parallel(monkeypatch):
+    monkeypatch.setattr(
+        embedding, "load_sentence_transformer", lambda *args: FakeModel()
+    )
+    docs = [Document(content="apple"), Document(content=None)]
+    embedded = embed_documents_parallel(docs, "fake", workers=1)
+    assert [doc.embedding for doc in embedded] == [[5.0, 1.0], [0.0, 1.0]]
+    assert docs[0].embedding is None
+    assert embed_texts([], "fake", model_factory=FakeModel).shape == (0, 0)
+
+
+def test_token_budget_batches():
+    lengths = np.array([10, 100, 20, 30, 10])
+    batches = token_budget_batches(lengths, max_tokens=60)
+    assert [b.tolist() for b in batches] == [[1], [3, 2], [0, 4]]
+    assert all(len(b) * lengths[b].max() <= 60 or len(b) == 1 for b in batches)
+
+
+def test_encode_batched():
+    model = FakeModel()
+    texts = ["one", "one two three four", "one two", ""]
+    embeddings = encode_batched(model, texts, max_tokens=12)
+    assert embeddings[:, 0].tolist() == [3, 18, 7, 0]
+    assert model.calls == [["one two three four", "one two"], ["one", ""]]
+
+
+def test_batched_document_embedder():
+    embedder = BatchedDocumentEmbedder(model="fake", prefix="passage: ")
+    embedder.embedding_backend = type("Backend", (), {"model": FakeModel()})()
+    inputs = [Document(content="a"), Document(content="bb")]
+    docs = embedder.run(inputs)["documents"]
+    assert [doc.embedding for doc in docs] == [[10.0, 1.0], [11.0, 1.0]]
+    assert all(doc.embedding is None for doc in inputs)
+    assert embedder.to_dict()["init_parameters"]["max_batch_tokens"] == 8192
@@ -0,0 +1,76 @@
+from marcel.embedding_cache import CachedTextEmbedder, QueryEmbeddingCache
+
+
+class FakeTextEmbedder:
+    def __init__(self, model="m", prefix=""):
+        self.model = model
+        self.prefix = prefix
+        self.suffix = ""
+        self.normalize_embeddings = False
+        self.precision = "float32"
+        self.texts = []
+
+    def run(self, text):
+        self.texts.append(text)
+        return {"embedding": [float(len(self.prefix + text)), 1.0]}
+
+    def warm_up(self):
+        pass
+
+    def to_dict(self):
+        return {"type": "FakeTextEmbedder", "init_parameters": {"model": self.model}}
+
+
+def test_lru_eviction():
+    cache = QueryEmbeddingCache(max_size=2)
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+    assert cache.get("a") == [1.0]  # "b" is now least recently used
+    cache.put("c", [3.0])
+    assert cache.get("b") is None
+    assert cache.get("a") == [1.0] and cache.get("c") == [3.0]
+    assert cache.stats()["size"] == 2
+
+
+def test_persistent_cache(tmp_path):
+    path = str(tmp_path / "query_embeddings.sqlite")
+    cache = QueryEmbeddingCache(path)
+    cache.put("a", [0.1, 0.2])
+
+    cache = QueryEmbeddingCache(path)
+    assert cache.get("a") == [0.1, 0.2]
+    assert cache.get("a") == [0.1, 0.2]
+    stats = cache.stats()
+    assert (stats["persistent_hits"], stats["hits"], stats["misses"]) == (1, 1, 0)
+
+
+def test_embedders_share_cache():
+    cache = QueryEmbeddingCache()
+    dense_base, faq_base = FakeTextEmbedder(), FakeTextEmbedder()
+    dense = CachedTextEmbedder(dense_base, cache)
+    faq = CachedTextEmbedder(faq_base, cache)
+
+    assert dense.run(text="question")["embedding"] == [8.0, 1.0]
+    assert faq.run(text="question")["embedding"] == [8.0, 1.0]
+    dense.run(text="question")
+    assert dense_base.texts == ["question"]
+    assert faq_base.texts == []
+    assert dense.stats()["hits"] == 1 and faq.stats()["hits"] == 1
+    assert cache.stats()["hit_rate"] == 2 / 3
+
+
+def test_key_includes_model_and_prefix():
+    cache = QueryEmbeddingCache()
+    embedders = [
+        CachedTextEmbedder(FakeTextEmbedder(), cache),
+        CachedTextEmbedder(FakeTextEmbedder(model="other"), cache),
+        CachedTextEmbedder(FakeTextEmbedder(prefix="query: "), cache),
+        CachedTextEmbedder(FakeTextEmbedder(), cache, inference_backend="onnx"),
+    ]
+    for embedder in embedders:
+        embedder.run(text="question")
+    assert [len(embedder.base_embedder.texts) for embedder in embedders] == [1] * 4
+    assert embedders[2].run(text="q")["embedding"] == [8.0, 1.0]
+
+    data = embedders[0].to_dict()
+    assert data["init_parameters"]["cache_max_size"] == 10000
@@ -0,0 +1,87 @@
+import random
+
+import pytest
+from haystack import Document
+from haystack.components.joiners import DocumentJoiner
+
+from marcel.fusion import ScoreFusionJoiner
+
+
+def ranked(ids, scores=None):
+    scores = scores or [1 - i / 10 for i in range(len(ids))]
+    return [Document(id=id_, content=id_, score=s) for id_, s in zip(ids, scores)]
+
+
+def copy(doc):
+    return Document.from_dict(doc.to_dict())
+
+
+@pytest.mark.parametrize(
+    "join_mode",
+    [
+        "reciprocal_rank_fusion",
+        "merge",
+        "concatenate",
+        "distribution_based_rank_fusion",
+    ],
+)
+@pytest.mark.parametrize("weights", [None, [0.7, 0.3]])
+def test_fusion_matches_document_joiner(join_mode, weights):
+    rng = random.Random(0)
+    for _ in range(20):
+        ids = [str(i) for i in range(30)]
+        bm25 = ranked(
+            rng.sample(ids, 10), sorted(rng.random() for _ in range(10))[::-1]
+        )
+        dense = ranked(
+            rng.sample(ids, 10), sorted(rng.random() for _ in range(10))[::-1]
+        )
+
+        if join_mode in ["concatenate", "distribution_based_rank_fusion"]:
+            weights = None  # unweighted in Haystack
+        joiner = DocumentJoiner(join_mode=join_mode, weights=weights, top_k=5)
+        fusion = ScoreFusionJoiner(["bm25", "dense"], weights, join_mode, top_k=5)
+
+        expected = joiner.run(documents=[[*map(copy, bm25)], [*map(copy, dense)]])
+        actual = fusion.run(bm25=bm25, dense=dense)
+        assert [doc.id for doc in actual["documents"]] == [
+            doc.id for doc in expected["documents"]
+        ]
+        assert [doc.score for doc in actual["documents"]] == pytest.approx(
+            [doc.score for doc in expected["documents"]]
+        )
+
+
+def test_fusion_weights_follow_retriever_names():
+    fusion = ScoreFusionJoiner(["bm25", "dense"], weights=[1, 0], join_mode="merge")
+    result = fusion.run(dense=ranked(["a", "b"]), bm25=ranked(["b", "a"]))
+    assert [doc.id for doc in result["documents"]] == ["b", "a"]
+    assert [doc.score for doc in result["documents"]] == [1.0, 0.9]
+
+
+def test_comb_mnz():
+    fusion = ScoreFusionJoiner(["bm25", "dense"], join_mode="comb_mnz")
+    bm25 = ranked(["a", "b", "c"], [3, 2, 1])
+    dense = ranked(["b", "d"], [0.9, 0.1])
+    result = fusion.run(bm25=bm25, dense=dense)["documents"]
+    # b: (0.5 * 0.5 + 0.5 * 1) * 2, a: 0.5 * 1, c and d: 0
+    assert [doc.id for doc in result] == ["b", "a", "c", "d"]
+    assert [doc.score for doc in result] == [1.5, 0.5, 0, 0]
+
+
+def test_fusion_only_materializes_top_k():
+    bm25 = ranked(["a", "b", "c"])
+    fusion = ScoreFusionJoiner(["bm25"], top_k=2)
+    result = fusion.run(bm25=bm25)["documents"]
+    assert [doc.id for doc in result] == ["a", "b"]
+    assert [doc.score for doc in bm25] == [1, 0.9, 0.8]  # inputs not mutated
+    assert result[0] is not bm25[0]
+
+    assert fusion.run(bm25=[])["documents"] == []
+
+
+def test_fusion_validation():
+    with pytest.raises(ValueError):
+        ScoreFusionJoiner(["bm25"], join_mode="foo")
+    with pytest.raises(ValueError):
+        ScoreFusionJoiner(["bm25", "dense"], weights=[1])
@@ -0,0 +1,115 @@
+from dataclasses import replace
+
+import numpy as np
+import pytest
+from haystack import Document
+
+from marcel import indexing
+from marcel.indexing import build_document_store, index_settings, update_index
+
+
+def page(url, content):
+    return Document(content=content, meta={"url": url, "fingerprint": url + content})
+
+
+def fake_embed(calls):
+    def embed_documents(documents, embedding_model, **kwargs):
+        calls.append([doc.content for doc in documents])
+        if not embedding_model:
+            return documents
+        return [
+            replace(doc, embedding=[float(len(doc.content)), 1.0]) for doc in documents
+        ]
+
+    return embed_documents
+
+
+def test_update_index_only_embeds_changes(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(indexing, "embed_documents", fake_embed(calls))
+    settings = index_settings(embedding_model="fake")
+
+    old = [page("a", "apple"), page("b", "banana"), page("c", "cherry")]
+    _, stats = update_index(old, tmp_path, settings)
+    assert stats["pages_added"] == 3
+    assert calls == [["apple", "banana", "cherry"]]
+
+    new = [page("a", "apple"), page("b", "blueberry"), page("d", "date")]
+    documents, stats = update_index(new, tmp_path, settings)
+    assert calls[-1] == ["blueberry", "date"]
+    assert stats["pages_added"] == 2
+    assert stats["pages_removed"] == 2
+    assert stats["documents_kept"] == 1
+    assert sorted(doc.content for doc in documents) == ["apple", "blueberry", "date"]
+
+    # Persisted with embeddings, nothing to do on an unchanged snapshot.
+    _, stored = indexing.load_index(tmp_path)
+    assert {doc.content: doc.embedding for doc in stored}["apple"] == [5.0, 1.0]
+    _, stats = update_index(new, tmp_path, settings)
+    assert calls[-1] == []
+    assert stats["documents_added"] == stats["documents_removed"] == 0
+
+
+def test_update_index_rebuilds_on_settings_change(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(indexing, "embed_documents", fake_embed(calls))
+    pages = [page("a", "# A\n\none\n\n# B\n\ntwo")]
+
+    update_index(pages, tmp_path, index_settings(embedding_model="fake"))
+    # Sparse-only runs can reuse the embedded index.
+    _, stats = update_index(pages, tmp_path, index_settings())
+    assert stats["documents_added"] == 0
+
+    documents, stats = update_index(
+        pages, tmp_path, index_settings(chunking="markdown", chunk_max_tokens=3)
+    )
+    assert stats["documents_added"] == 2
+    assert all(doc.meta["fingerprint"] == "a" + pages[0].content for doc in documents)
+
+
+def test_sparse_update_of_embedded_index(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(indexing, "embed_documents", fake_embed(calls))
+    update_index([page("a", "apple")], tmp_path, index_settings(embedding_model="fake"))
+
+    # A BM25 run on a new snapshot embeds nothing and keeps the embedded index.
+    pages = [page("a", "apple"), page("b", "banana")]
+    documents, stats = update_index(pages, tmp_path, index_settings())
+    assert stats["documents_added"] == 1
+    # fake_embed embeds with a model only
+    assert [doc.embedding for doc in documents] == [None, None]
+    settings, stored = indexing.load_index(tmp_path)
+    assert settings["embedding_model"] == "fake"
+    assert [doc.content for doc in stored] == ["apple"]
+
+
+def test_build_document_store_bm25(tmp_path):
+    pages = [page("a", "apple pie"), page("b", "banana bread")]
+    store = build_document_store(pages, index_settings(), index_path=str(tmp_path))
+    assert store.count_documents() == 2
+    assert store.bm25_retrieval("banana", top_k=1)[0].meta["url"] == "b"
+
+
+def test_update_index_rebuilds_inconsistent_index(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(indexing, "embed_documents", fake_embed(calls))
+    settings = index_settings(embedding_model="fake")
+    pages = [page("a", "apple"), page("b", "banana")]
+    update_index(pages, tmp_path, settings)
+
+    # A stale embedding matrix with fewer rows than documents.
+    np.save(tmp_path / "embeddings.npy", np.zeros((1, 2), dtype=np.float32))
+    with pytest.raises(ValueError):
+        indexing.load_index(tmp_path)
+    documents, stats = update_index(pages, tmp_path, settings)
+    assert stats["documents_added"] == 2
+    assert len(documents) == 2
+    assert len(indexing.load_index(tmp_path)[1]) == 2
+
+    # documents.jsonl of another update (e.g., interrupted before index.json).
+    indexing.save_index(tmp_path, settings, documents)
+    (tmp_path / "index.json").rename(tmp_path / "old.json")
+    indexing.save_index(tmp_path, settings, documents[:1])
+    (tmp_path / "old.json").rename(tmp_path / "index.json")
+    with pytest.raises(ValueError):
+        indexing.load_index(tmp_path)
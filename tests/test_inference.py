@@ -0,0 +1,88 @@
+import threading
+
+import torch
+from haystack.components.rankers import SentenceTransformersSimilarityRanker
+
+from marcel.inference import haystack_backend, serialize_calls, with_inference_backend
+from marcel.rankers import CachedSimilarityRanker
+
+
+class FakeEmbedder:
+    def __init__(self):
+        self.embedding_backend = None
+        self.warm_ups = 0
+
+    def warm_up(self):
+        self.warm_ups += 1
+        model = torch.nn.Sequential(torch.nn.Linear(4, 4), torch.nn.ReLU())
+        self.embedding_backend = type("Backend", (), {"model": model})()
+
+
+def test_haystack_backend():
+    assert haystack_backend("onnx") == "onnx"
+    assert haystack_backend("torch_qint8") == "torch"
+    assert haystack_backend("torch") == "torch"
+
+
+def test_with_inference_backend_quantizes_after_warm_up():
+    embedder = with_inference_backend(FakeEmbedder(), "torch_qint8")
+    embedder.warm_up()
+    embedder.warm_up()
+    assert embedder.warm_ups == 2
+    layer = embedder.embedding_backend.model[0]
+    assert not isinstance(layer, torch.nn.Linear)
+    assert layer.weight().dtype == torch.qint8
+    output = embedder.embedding_backend.model(torch.ones(1, 4))
+    assert output.shape == (1, 4)
+
+    embedder = with_inference_backend(FakeEmbedder(), "torch")
+    embedder.warm_up()
+    assert isinstance(embedder.embedding_backend.model[0], torch.nn.Linear)
+
+
+def test_with_inference_backend_is_serialized():
+    ranker = with_inference_backend(
+        SentenceTransformersSimilarityRanker(model="fake-model"), "torch_qint8"
+    )
+    parameters = ranker.to_dict()["init_parameters"]
+    assert parameters["backend"] == "torch"
+    assert parameters["inference_backend"] == "torch_qint8"
+
+    ranker = with_inference_backend(
+        SentenceTransformersSimilarityRanker(model="fake-model"), "torch"
+    )
+    assert "inference_backend" not in ranker.to_dict()["init_parameters"]
+
+
+def test_reranker_cache_is_keyed_by_backend():
+    base_ranker = SentenceTransformersSimilarityRanker(model="fake-model")
+    torch_key = CachedSimilarityRanker(base_ranker)._key("q", "d")
+    onnx_key = CachedSimilarityRanker(base_ranker, inference_backend="onnx")._key(
+        "q", "d"
+    )
+    assert torch_key.startswith("fake-model:sigmoid:")
+    assert onnx_key.startswith("fake-model:sigmoid:onnx:")
+
+
+class FakeModel:
+    def predict(self, pairs):
+        return [0.0] * len(pairs)
+
+
+def test_serialize_calls():
+    model = FakeModel()
+    serialize_calls(model)
+    lock = model._marcel_lock
+    serialize_calls(model)  # idempotent
+    assert model._marcel_lock is lock
+    assert model.predict([1, 2]) == [0.0, 0.0]
+
+    lock.acquire()
+    result = []
+    thread = threading.Thread(target=lambda: result.append(model.predict([1])))
+    thread.start()
+    thread.join(timeout=0.1)
+    assert not result  # waits for the lock
+    lock.release()
+    thread.join()
+    assert result == [[0.0]]
@@ -0,0 +1,148 @@
+import threading
+import time
+
+import pytest
+from haystack import Document
+
+from marcel.llm_scheduler import LLMScheduler, schedulers, shared_scheduler
+
+
+class Request:
+    """Holds a slot of `scheduler` in a thread until released."""
+
+    def __init__(self, scheduler, priority, key, started):
+        self.release = threading.Event()
+        self.thread = threading.Thread(
+            target=self._run, args=(scheduler, priority, key, started)
+        )
+        self.thread.start()
+
+    def _run(self, scheduler, priority, key, started):
+        with scheduler.slot(priority, key):
+            started.append(key)
+            self.release.wait()
+
+
+def finish(requests):
+    for request in requests:
+        request.release.set()
+    for request in requests:
+        request.thread.join()
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+def submit(scheduler, priority, key, started, waiting=None):
+    """Start a request and wait until it runs (or until `waiting` requests wait)."""
+    request = Request(scheduler, priority, key, started)
+    if waiting is None:
+        wait_until(lambda: key in started)
+    else:
+        wait_until(lambda: len(scheduler.waiting) == waiting)
+    return request
+
+
+def test_concurrency_cap():
+    scheduler = LLMScheduler(max_concurrency=2)
+
+    def request():
+        with scheduler.slot("batch", None):
+            time.sleep(0.02)
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = scheduler.stats()
+    assert stats["max_in_flight"] == 2
+    assert stats["priorities"]["batch"]["requests"] == 8
+
+
+def test_priority_and_fair_share():
+    scheduler = LLMScheduler(max_concurrency=2)
+    started = []
+    running = [submit(scheduler, "batch", "a", started)]
+    running.append(submit(scheduler, "batch", "x", started))
+    later = [
+        submit(scheduler, "prefetch", "p", started, waiting=1),
+        submit(scheduler, "batch", "a", started, waiting=2),
+        submit(scheduler, "batch", "b", started, waiting=3),
+        submit(scheduler, "interactive", "i", started, waiting=4),
+    ]
+
+    finish([running[1]])
+    wait_until(lambda: len(started) == 3)
+    finish([later[3]])
+    wait_until(lambda: len(started) == 4)
+    # "b" overtakes the second request of "a", which still has one running
+    assert started == ["a", "x", "i", "b"]
+    finish([running[0], *later[:3]])
+    assert started == ["a", "x", "i", "b", "a", "p"]
+
+
+def test_reserved_slots():
+    scheduler = LLMScheduler(max_concurrency=2, reserved_slots=1)
+    started = []
+    batch = submit(scheduler, "batch", "b1", started)
+    waiting = submit(scheduler, "batch", "b2", started, waiting=1)
+    interactive = submit(scheduler, "interactive", "i", started)
+    assert started == ["b1", "i"]
+    finish([batch, waiting, interactive])
+    assert started == ["b1", "i", "b2"]
+    with pytest.raises(ValueError):
+        LLMScheduler(max_concurrency=1, reserved_slots=1)
+
+
+def test_backpressure():
+    scheduler = LLMScheduler(max_concurrency=1, max_queued=1)
+    started = []
+    running = submit(scheduler, "batch", "a", started)
+    queued = submit(scheduler, "batch", "b", started, waiting=1)
+
+    admitted = threading.Event()
+    thread = threading.Thread(
+        target=lambda: (scheduler.wait_for_capacity(), admitted.set())
+    )
+    thread.start()
+    assert not admitted.wait(0.05)
+    finish([running])
+    assert admitted.wait(5)
+    finish([queued])
+    thread.join()
+
+
+def test_generator_requests_are_scheduled(tmp_path, monkeypatch):
+    from marcel.mock_llm import MockLLM, start_server
+    from marcel.retrievers import get_pipeline, parse_args, run_pipeline
+    from marcel.stats import collect_stats
+
+    mock = MockLLM(ttft_ms=10, tokens_per_second=0)
+    server, base_url = start_server(mock)
+    monkeypatch.setenv("OPENAI_BASE_URL", base_url)
+    monkeypatch.setenv("OPENAI_API_KEY", "mock")
+    argv = ["--data_path", "d", "--retrievers", "bm25", "--top_k", "1"]
+    argv += ["--use_generator", "--generation_model", "m", "--generation_n", "3"]
+    argv += ["--llm_max_concurrency", "1"]
+    pipeline = get_pipeline(
+        [Document(content="semester start", meta={"url": "a"})],
+        [],
+        parse_args(argv, require_io=False),
+    )
+    try:
+        result = run_pipeline(pipeline, {"id": 1, "question": "semester start?"})
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert len(result["generated_answer"]) == 3
+    assert mock.stats()["max_in_flight"] == 1
+    assert schedulers(pipeline) == [shared_scheduler(base_url, 1)]
+    stats = collect_stats(pipeline)["llm_scheduler"][0]
+    assert stats["priorities"]["batch"]["requests"] == 3
+    with pytest.raises(ValueError):
+        shared_scheduler(base_url, 2)
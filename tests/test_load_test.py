@@ -0,0 +1,130 @@
+import json
+import time
+
+import pytest
+
+from marcel.benchmark import write_synthetic_data
+from marcel.load_test import (
+    arrival_times,
+    capacity,
+    failed,
+    main,
+    open_loop,
+    parse_args,
+    repeat,
+)
+
+
+@pytest.fixture(autouse=True)
+def openai_env(monkeypatch):
+    # main() points the OpenAI client at the mock server through the environment.
+    for name in ["OPENAI_BASE_URL", "OPENAI_API_KEY", "OPENAI_MAX_RETRIES"]:
+        monkeypatch.delenv(name, raising=False)
+
+
+def test_repeat():
+    assert repeat([1, 2], 5) == [1, 2, 1, 2, 1]
+    assert repeat([], 5) == []
+
+
+def test_arrival_times():
+    times = arrival_times(2000, rate=10, seed=1)
+    assert times == sorted(times)
+    assert 180 < times[-1] < 220
+
+
+def test_open_loop_queueing():
+    def slow_runner(pipeline, query):
+        time.sleep(0.05)
+        return {"documents": [query], "generated_answer": ""}
+
+    queries = list(range(20))
+    # 100 q/s offered, 2 clients serve at most 40 q/s: queries wait
+    result = open_loop(None, slow_runner, queries, 100, max_clients=2)
+    assert result["queue_delay"]["p95_ms"] > 50
+    assert result["latency"]["p50_ms"] > result["queue_delay"]["p50_ms"]
+    assert result["throughput_qps"] < 45
+
+    result = open_loop(None, slow_runner, queries[:5], 20, max_clients=8)
+    assert result["queue_delay"]["p95_ms"] < 25
+
+
+def test_capacity():
+    def result(config, concurrency, qps, p99, error_rate=0.0):
+        return {
+            "config": config,
+            "mode": "closed",
+            "concurrency": concurrency,
+            "throughput_qps": qps,
+            "latency": {"p99_ms": p99},
+            "error_rate": error_rate,
+        }
+
+    results = [
+        result("a", 1, 1.0, 100),
+        result("a", 4, 3.0, 400),
+        result("a", 16, 5.0, 2000),
+        result("a", 8, 4.0, 500, error_rate=0.2),
+        result("b", 1, 1.0, 1500),
+    ]
+    report = capacity(results, slo_p99_ms=1000)
+    assert report["a"]["load"] == "4 clients"
+    assert report["b"] is None
+
+
+def test_load_test(tmp_path):
+    paths = write_synthetic_data(tmp_path / "data", n_docs=30, n_queries=4, n_faqs=0)
+    out_path = tmp_path / "report.json"
+    argv = ["--concurrency", "1", "4", "--arrival_rates", "50", "--n_queries", "8"]
+    argv += ["--out_path", str(out_path), "--slo_p99_ms", "10000"]
+    argv += ["--configs", "", "--generation_n 1"]
+    argv += ["--ttft_ms", "20", "--tokens_per_second", "0", "--max_retries", "0"]
+    argv += ["--", "--data_path", str(paths["data_path"])]
+    argv += ["--query_path", str(paths["query_path"]), "--retrievers", "bm25"]
+    argv += ["--top_k", "3", "--use_generator", "--generation_n", "2"]
+    main(*parse_args(argv))
+
+    with open(out_path) as fin:
+        report = json.load(fin)
+    first, second, third, single_sample = report["results"][:4]
+    assert (first["concurrency"], second["concurrency"]) == (1, 4)
+    assert first["queries"] == 8 and first["failures"] == 0
+    assert first["server"]["requests"] == 16  # n independent samples per query
+    assert second["server"]["max_in_flight"] > 2
+    assert second["throughput_qps"] > first["throughput_qps"]
+    assert first["latency"]["p50_ms"] >= 20
+    assert third["mode"] == "open" and third["arrival_rate"] == 50
+    assert single_sample["config"] == "--generation_n 1"
+    assert single_sample["server"]["requests"] == 8
+    assert set(report["capacity"]) == {"", "--generation_n 1"}
+    assert "| default | 4 clients |" in (tmp_path / "report.md").read_text()
+
+
+def test_failed_results():
+    from marcel.retrievers import get_pipeline, parse_args, run_pipeline
+
+    argv = ["--data_path", "d", "--retrievers", "bm25"]
+    # no documents: an empty, but correct result
+    pipeline = get_pipeline([], [], parse_args(argv, require_io=False))
+    result = run_pipeline(pipeline, {"id": 1, "question": "semester start?"})
+    assert result == {"generated_answer": "", "documents": []}
+    assert not failed(result)
+
+    def fail(**kwargs):
+        raise RuntimeError("retriever down")
+
+    pipeline.get_component("bm25_retriever").run = fail
+    result = run_pipeline(pipeline, {"id": 1, "question": "semester start?"})
+    assert result["documents"] == [] and "retriever down" in result["error"]
+    assert failed(result)
+
+
+def test_failures_are_counted(tmp_path):
+    paths = write_synthetic_data(tmp_path / "data", n_docs=30, n_queries=4, n_faqs=0)
+    argv = ["--concurrency", "2", "--out_path", str(tmp_path / "report.json")]
+    argv += ["--ttft_ms", "0", "--error_rate", "1", "--max_retries", "0"]
+    argv += ["--", "--data_path", str(paths["data_path"])]
+    argv += ["--query_path", str(paths["query_path"]), "--use_generator"]
+    report = main(*parse_args(argv))
+    assert report["results"][0]["failures"] == 4
+    assert report["results"][0]["server"]["errors"] == 4 * 3
@@ -0,0 +1,96 @@
+import json
+import tracemalloc
+
+import numpy as np
+import pytest
+from haystack import Document
+
+from marcel.experiment_runner import run_experiment
+from marcel.memory import MemoryProfiler, growth_per_query, memory_stage
+
+
+def test_stages():
+    profiler = MemoryProfiler()
+    try:
+        with profiler.stage("outer"):
+            with profiler.stage("inner"):
+                temporary = np.ones(20 * 1024**2 // 8)  # 20 MB, freed below
+                del temporary
+            kept = np.ones(5 * 1024**2 // 8)
+        with profiler.stage("outer"):
+            pass
+    finally:
+        profiler.close()
+
+    inner, outer = profiler.stages["inner"], profiler.stages["outer"]
+    assert inner["traced_peak_mb"] > 19
+    assert abs(inner["traced_delta_mb"]) < 1
+    assert outer["traced_peak_mb"] > 19  # includes the peak of the nested stage
+    assert 4 < outer["traced_delta_mb"] < 6
+    assert outer["top_allocations"][0]["size_mb"] > 4
+    assert "outer#2" in profiler.stages
+    assert not tracemalloc.is_tracing()
+    del kept
+
+
+def test_growth_per_query():
+    assert growth_per_query([1.0]) is None
+    assert growth_per_query([10.0, 10.5, 11.0, 11.5]) == pytest.approx(0.5)
+
+
+def test_memory_stage_without_profiler():
+    with memory_stage(None, "noop"):
+        pass
+
+
+class FakePipeline:
+    def warm_up(self):
+        pass
+
+    def to_dict(self):
+        return {"components": {}}
+
+    def walk(self):
+        return []
+
+
+def test_run_experiment_writes_memory_json(tmp_path, monkeypatch):
+    monkeypatch.setenv("SLURM_CPUS_PER_TASK", "4")
+    leak = []
+
+    def leaky_runner(pipeline, query):
+        leak.append(bytearray(1024**2))
+        return {
+            "generated_answer": "",
+            "documents": [Document(content="a", meta={"url": "a"}, score=1.0)],
+        }
+
+    queries = [{"id": i, "question": "q", "sources": []} for i in range(10)]
+    run_experiment(
+        FakePipeline(),
+        leaky_runner,
+        queries=queries,
+        run_path=tmp_path,
+        config={},
+        memory_profiler=MemoryProfiler(),
+    )
+
+    with open(tmp_path / "memory.json") as fin:
+        memory = json.load(fin)
+    assert set(memory["stages"]) == {"model_load", "queries"}
+    assert memory["queries"]["n"] == 10
+    assert 900 < memory["queries"]["traced_growth_per_query_kb"] < 1200
+    assert memory["suggested_slurm_request"]["mem-per-cpu"].endswith("M")
+
+
+def test_get_pipeline_stages():
+    from marcel.retrievers import get_pipeline, parse_args
+
+    profiler = MemoryProfiler()
+    try:
+        config = parse_args(["--data_path", "d", "--profile_memory"], require_io=False)
+        documents = [Document(content="semester start", meta={"url": "a"})]
+        get_pipeline(documents, [], config, memory_profiler=profiler)
+    finally:
+        profiler.close()
+    assert list(profiler.stages) == ["corpus_embedding", "store_write"]
@@ -0,0 +1,96 @@
+import json
+
+import pytest
+from haystack import Document
+
+from marcel.experiment_runner import run_experiment, shard_path, shard_queries
+from marcel.merge_shards import interleave, merge_shards
+
+
+class FakePipeline:
+    def warm_up(self):
+        pass
+
+    def to_dict(self):
+        return {"components": {}}
+
+    def walk(self):
+        return []
+
+
+def fake_runner(pipeline, query):
+    document = Document(content=query["question"], meta={"url": "u"}, score=1.0)
+    return {"generated_answer": "", "documents": [document]}
+
+
+def write_queries(path, n):
+    queries = [{"id": i, "question": f"q{i}", "sources": ["u"]} for i in range(n)]
+    with open(path, "w") as fout:
+        json.dump(queries, fout)
+    return queries
+
+
+def run(queries, run_path, query_path, **kwargs):
+    config = {"query_path": str(query_path), "skip_without_sources": True, **kwargs}
+    run_experiment(
+        FakePipeline(),
+        fake_runner,
+        queries=queries,
+        run_path=run_path,
+        config=config,
+        **kwargs,
+    )
+
+
+def test_shard_queries():
+    queries = list(range(10))
+    shards = [shard_queries(queries, i, 3) for i in range(3)]
+    assert shards == [[0, 3, 6, 9], [1, 4, 7], [2, 5, 8]]
+    assert interleave(shards) == queries
+    with pytest.raises(ValueError):
+        shard_queries(queries, 3, 3)
+
+
+def test_merge_shards(tmp_path):
+    query_path = tmp_path / "queries.json"
+    queries = write_queries(query_path, 10)
+    run(queries, tmp_path / "full", query_path, shard_index=0, shard_count=1)
+    for index in range(3):
+        run(queries, tmp_path / "sharded", query_path, shard_index=index, shard_count=3)
+    assert (shard_path(tmp_path / "sharded", 2, 3) / "output.json").exists()
+    assert not (tmp_path / "sharded" / "output.json").exists()
+
+    merge_shards(tmp_path / "sharded")
+
+    full = json.loads((tmp_path / "full" / "output.json").read_text())
+    merged = json.loads((tmp_path / "sharded" / "output.json").read_text())
+    assert [p["id"] for p in merged] == [p["id"] for p in full]
+    assert [p["contexts"] for p in merged] == [p["contexts"] for p in full]
+    config = json.loads((tmp_path / "sharded" / "config.json").read_text())
+    full_config = json.loads((tmp_path / "full" / "config.json").read_text())
+    assert config == full_config
+    assert "shard_count" not in config and "shard_index" not in config
+
+    # merged runs are skipped
+    run(queries, tmp_path / "sharded", query_path, shard_index=0, shard_count=3)
+
+
+def test_merge_shards_validates(tmp_path):
+    query_path = tmp_path / "queries.json"
+    queries = write_queries(query_path, 6)
+    for index in range(2):
+        run(queries, tmp_path / "run", query_path, shard_index=index, shard_count=3)
+    with pytest.raises(ValueError, match="Missing or unfinished shards"):
+        merge_shards(tmp_path / "run")
+
+    run(queries, tmp_path / "run", query_path, shard_index=2, shard_count=3)
+    write_queries(query_path, 7)  # query file changed after the run
+    with pytest.raises(ValueError, match="missing \\[6\\]"):
+        merge_shards(tmp_path / "run")
+
+    output_path = shard_path(tmp_path / "run", 1, 3) / "output.json"
+    predictions = json.loads(output_path.read_text())
+    predictions[0]["id"] = 0
+    output_path.write_text(json.dumps(predictions))
+    with pytest.raises(ValueError, match="Duplicate query ids"):
+        merge_shards(tmp_path / "run")
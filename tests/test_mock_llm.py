@@ -0,0 +1,85 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+import pytest
+
+from marcel.mock_llm import MockLLM, start_server
+
+MESSAGES = [{"role": "user", "content": "When does the semester start?"}]
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def serve(**kwargs):
+        mock = MockLLM(**kwargs)
+        server, base_url = start_server(mock)
+        servers.append(server)
+        client = openai.OpenAI(base_url=base_url, api_key="mock", max_retries=0)
+        return mock, client
+
+    yield serve
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_completion(serve):
+    mock, client = serve(ttft_ms=0, tokens_per_second=0, completion_tokens=20)
+    response = client.chat.completions.create(
+        model="m", messages=MESSAGES, n=3, max_tokens=5
+    )
+    assert len(response.choices) == 3
+    assert len(response.choices[0].message.content.split()) == 5
+    assert response.choices[0].finish_reason == "length"
+    assert response.usage.prompt_tokens == 5
+    assert response.usage.completion_tokens == 15
+    assert mock.stats()["requests"] == 1
+
+
+def test_streaming(serve):
+    _, client = serve(ttft_ms=0, tokens_per_second=0, completion_tokens=4)
+    stream = client.chat.completions.create(
+        model="m",
+        messages=MESSAGES,
+        stream=True,
+        stream_options={"include_usage": True},
+    )
+    chunks = list(stream)
+    text = "".join(c.choices[0].delta.content or "" for c in chunks if c.choices)
+    assert len(text.split()) == 4
+    assert chunks[-1].usage.completion_tokens == 4
+
+
+def test_latency_model(serve):
+    _, client = serve(ttft_ms=50, tokens_per_second=100, completion_tokens=10)
+    start = time.perf_counter()
+    client.chat.completions.create(model="m", messages=MESSAGES)
+    assert time.perf_counter() - start >= 0.15
+
+    mock = MockLLM(ttft_ms=100, latency_distribution="lognormal", seed=1)
+    samples = sorted(mock.sample_ttft() for _ in range(2000))
+    assert 0.08 < sum(samples) / len(samples) < 0.12
+    assert samples[-20] > 2 * samples[1000]  # long tail
+
+
+def test_errors(serve):
+    mock, client = serve(ttft_ms=0, error_rate=1.0, error_status=429)
+    with pytest.raises(openai.RateLimitError):
+        client.chat.completions.create(model="m", messages=MESSAGES)
+    assert mock.stats()["errors"] == 1
+
+
+def test_max_concurrency(serve):
+    mock, client = serve(ttft_ms=50, tokens_per_second=0, max_concurrency=2)
+
+    def request(_):
+        return client.chat.completions.create(model="m", messages=MESSAGES)
+
+    with ThreadPoolExecutor(6) as pool:
+        list(pool.map(request, range(6)))
+    stats = mock.stats()
+    assert stats["max_in_flight"] == 2
+    assert stats["mean_queue_ms"] > 0
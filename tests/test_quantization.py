@@ -0,0 +1,115 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+from haystack import Document
+from haystack.components.retrievers.in_memory import InMemoryEmbeddingRetriever
+from haystack.document_stores.in_memory import InMemoryDocumentStore
+
+from marcel.quantization import (
+    QuantizedEmbeddingIndex,
+    QuantizedEmbeddingRetriever,
+    quantize,
+)
+
+
+def random_documents(n=300, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    embeddings = rng.normal(size=(n, dim)).astype(np.float32)
+    return [
+        Document(content=f"doc {i}", embedding=embedding.tolist())
+        for i, embedding in enumerate(embeddings)
+    ]
+
+
+def test_quantize_int8():
+    embeddings = np.array([[0.5, -1.0, 0.25], [0.0, 0.0, 0.0]], dtype=np.float32)
+    codes, scales = quantize(embeddings, "int8")
+    assert codes.dtype == np.int8
+    assert codes[0].tolist() == [64, -127, 32]
+    np.testing.assert_allclose(codes * scales[:, None], embeddings, atol=0.01)
+    with pytest.raises(ValueError):
+        quantize(embeddings, "int4")
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+@pytest.mark.parametrize("similarity_function", ["cosine", "dot_product"])
+def test_retriever_matches_float32(dtype, similarity_function):
+    documents = random_documents()
+    query = np.random.default_rng(1).normal(size=32).tolist()
+
+    store = InMemoryDocumentStore(embedding_similarity_function=similarity_function)
+    store.write_documents(documents)
+    baseline = InMemoryEmbeddingRetriever(store, top_k=10, scale_score=True)
+    expected = baseline.run(query_embedding=query)["documents"]
+
+    index = QuantizedEmbeddingIndex(documents, dtype, similarity_function)
+    retriever = QuantizedEmbeddingRetriever(
+        index, top_k=10, scale_score=True, compare_to_exact=True
+    )
+    result = retriever.run(query_embedding=query)["documents"]
+
+    assert [doc.id for doc in result] == [doc.id for doc in expected]
+    assert [doc.score for doc in result] == pytest.approx(
+        [doc.score for doc in expected], rel=1e-5
+    )
+    assert all(doc.embedding is None for doc in result)
+
+    stats = retriever.stats()
+    assert stats["recall_at_k_vs_float32"] == 1.0
+    ratio = stats["compressed_bytes"] / stats["float32_bytes"]
+    assert ratio < (0.51 if dtype == "float16" else 0.33)
+
+
+def test_retriever_without_rescoring_candidates():
+    documents = random_documents(n=1000)
+    index = QuantizedEmbeddingIndex(documents, "int8")
+    retriever = QuantizedEmbeddingRetriever(
+        index, top_k=20, rescore_factor=1, compare_to_exact=True
+    )
+    for seed in range(5):
+        query = np.random.default_rng(seed).normal(size=32).tolist()
+        assert len(retriever.run(query_embedding=query)["documents"]) == 20
+    assert retriever.stats()["recall_at_k_vs_float32"] > 0.8
+
+
+class FakeEmbeddingModel:
+    def encode(self, texts, batch_size, **kwargs):
+        rng = np.random.default_rng(len(texts))
+        return rng.normal(size=(len(texts), 256)).astype(np.float32)
+
+
+def test_document_store_memory(monkeypatch):
+    from marcel import embedding, indexing
+    from marcel.retrievers import get_document_store, parse_args
+
+    monkeypatch.setattr(
+        embedding, "load_sentence_transformer", lambda *args: FakeEmbeddingModel()
+    )
+    monkeypatch.setattr(
+        indexing,
+        "embed_documents",
+        lambda documents, model, **kwargs: embedding.embed_documents_parallel(
+            documents, model, workers=1
+        ),
+    )
+    pages = [Document(content=f"page {i}", meta={"url": str(i)}) for i in range(2000)]
+
+    def retained_mb(dtype):
+        argv = ["--data_path", "d", "--retrievers", "dense"]
+        config = parse_args(argv + ["--embedding_dtype", dtype], require_io=False)
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            store = get_document_store(pages, config)
+            retained = tracemalloc.get_traced_memory()[0] - before
+        finally:
+            tracemalloc.stop()
+        assert store[0].count_documents() == len(pages)
+        return retained / 1024**2
+
+    float32, int8 = retained_mb("float32"), retained_mb("int8")
+    # The input pages do not keep the float embeddings alive.
+    assert all(page.embedding is None for page in pages)
+    assert float32 > 10
+    assert int8 < float32 / 4
@@ -0,0 +1,129 @@
+from dataclasses import replace
+
+import numpy as np
+import pytest
+from haystack import Document
+from haystack.components.rankers import SentenceTransformersSimilarityRanker
+
+from marcel.rankers import CachedSimilarityRanker, CascadeRanker
+
+
+class FakeCrossEncoder:
+    """Scores a pair by the number of shared words."""
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, pairs, batch_size, activation_fn, convert_to_numpy):
+        self.calls.append(list(pairs))
+        return np.array(
+            [len(set(q.lower().split()) & set(d.lower().split())) for q, d in pairs],
+            dtype=float,
+        )
+
+
+def get_ranker(cache_path=None, top_k=10):
+    base_ranker = SentenceTransformersSimilarityRanker(
+        model="fake-model", top_k=top_k, scale_score=False
+    )
+    base_ranker._cross_encoder = FakeCrossEncoder()
+    return CachedSimilarityRanker(base_ranker, cache_path=cache_path)
+
+
+documents = [
+    Document(id="a", content="the cat sat on the mat"),
+    Document(id="b", content="a dog in the house"),
+    Document(id="c", content="the cat and the dog"),
+]
+
+
+def test_cached_ranker_ranks_documents():
+    ranker = get_ranker(top_k=2)
+    result = ranker.run(query="cat dog", documents=documents)["documents"]
+    assert [doc.id for doc in result] == ["c", "a"]
+    assert [doc.score for doc in result] == [2, 1]
+    assert documents[0].score is None  # inputs are not mutated
+
+
+def test_cached_ranker_scores_only_uncached_pairs(tmp_path):
+    path = str(tmp_path / "scores.sqlite")
+    ranker = get_ranker(path)
+    ranker.run(query="cat", documents=documents[:2])
+    ranker.run(query="cat", documents=documents)
+    calls = ranker.base_ranker._cross_encoder.calls
+    assert [len(call) for call in calls] == [2, 1]
+    assert ranker.stats() == {"hits": 2, "misses": 3, "hit_rate": 0.4}
+
+    # persisted across instances, model is never needed
+    ranker = get_ranker(path)
+    ranker.base_ranker._cross_encoder = None
+    result = ranker.run(query="cat", documents=documents, top_k=1)["documents"]
+    assert [doc.id for doc in result] == ["a"]
+    assert ranker.stats()["misses"] == 0
+
+
+def test_cached_ranker_batches_across_queries():
+    ranker = get_ranker()
+    scores = ranker.score_pairs([("cat", documents[0]), ("dog", documents[1])])
+    assert scores == [1, 1]
+    assert len(ranker.base_ranker._cross_encoder.calls) == 1
+
+
+def test_cached_ranker_serialization():
+    data = get_ranker().to_dict()
+    assert data["init_parameters"]["cache_path"] is None
+    assert data["init_parameters"]["init_parameters"]["model"] == "fake-model"
+
+
+class ContentLengthRanker:
+    """Cheap first stage which prefers short documents."""
+
+    def __init__(self):
+        self.pairs = 0
+
+    def run(self, query, documents, top_k):
+        self.pairs += len(documents)
+        ranked = sorted(documents, key=lambda doc: len(doc.content))
+        ranked = [replace(doc, score=-len(doc.content)) for doc in ranked]
+        return {"documents": ranked[:top_k]}
+
+    def warm_up(self):
+        pass
+
+    def to_dict(self):
+        return {"type": "ContentLengthRanker", "init_parameters": {}}
+
+
+def test_cascade_ranker():
+    first_stage, second_stage = ContentLengthRanker(), get_ranker()
+    cascade = CascadeRanker(first_stage, second_stage, m=2, top_k=3)
+    result = cascade.run(query="the cat", documents=documents)["documents"]
+
+    # b and c survive the first stage (shortest), a is appended
+    assert [doc.id for doc in result] == ["c", "b", "a"]
+    assert [doc.score for doc in result] == pytest.approx([2, 1, 1 - 1e-6])
+    assert result[2].meta["first_stage_score"] == -len(documents[0].content)
+    assert first_stage.pairs == 3
+    assert second_stage.stats()["misses"] == 2
+
+    stats = cascade.stats()
+    assert stats["second_stage_pairs"] == 2
+    assert stats["second_stage_pairs_saved"] == pytest.approx(1 / 3)
+    assert "overlap_at_k_vs_full" not in stats
+
+
+def test_cascade_ranker_compare_to_full():
+    cascade = CascadeRanker(
+        ContentLengthRanker(), get_ranker(), m=1, compare_to_full=True
+    )
+    result = cascade.run(query="the cat", documents=documents, top_k=2)["documents"]
+    assert [doc.id for doc in result] == ["b", "c"]
+
+    # full ranking: a (3) > c (2) > b (1)
+    stats = cascade.stats()
+    assert stats["overlap_at_k_vs_full"] == 0.5
+    assert stats["top1_agreement_vs_full"] == 0.0
+    assert stats["second_stage"]["misses"] == 3
+    assert [doc.score for doc in result][0] == 1  # not overwritten by full ranking
+
+    assert cascade.to_dict()["init_parameters"]["m"] == 1
@@ -0,0 +1,99 @@
+import json
+
+from haystack import Document, Pipeline
+from haystack.components.joiners import DocumentJoiner
+from haystack.components.retrievers.in_memory import InMemoryBM25Retriever
+from haystack.document_stores.in_memory import InMemoryDocumentStore
+
+from marcel.experiment_runner import run_experiment
+from marcel.retrieval_cache import CachedFirstStage
+
+documents = [
+    Document(id="a", content="apple banana", meta={"url": "a"}),
+    Document(id="b", content="banana cranberry", meta={"url": "b"}),
+    Document(id="c", content="cranberry date", meta={"url": "c"}),
+]
+
+
+def get_first_stage():
+    store = InMemoryDocumentStore()
+    store.write_documents(documents)
+    pipeline = Pipeline()
+    pipeline.add_component("bm25_retriever", InMemoryBM25Retriever(store, top_k=3))
+    pipeline.add_component("document_joiner", DocumentJoiner())
+    pipeline.connect("bm25_retriever", "document_joiner")
+    return pipeline
+
+
+class Runner:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, pipeline, query):
+        self.calls += 1
+        result = pipeline.run({"bm25_retriever": {"query": query["question"]}})
+        return result["document_joiner"]["documents"]
+
+
+def test_cached_first_stage(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    query = {"id": "q1", "question": "banana", "sources": []}
+
+    runner = Runner()
+    first_stage = CachedFirstStage(
+        get_first_stage(), runner, cache_path=path, config={"bm25_k": 3}
+    )
+    expected = first_stage.run(query=query)["documents"]
+    assert {doc.id for doc in expected[:2]} == {"a", "b"}
+    assert first_stage.run(query=query)["documents"] == expected
+    assert runner.calls == 1
+    assert first_stage.stats()["hit_rate"] == 0.5
+
+    # shared across instances with another top_k
+    runner = Runner()
+    first_stage = CachedFirstStage(
+        get_first_stage(), runner, cache_path=path, config={"bm25_k": 3}, top_k=1
+    )
+    assert first_stage.run(query=query)["documents"] == expected[:1]
+    assert runner.calls == 0
+
+
+def test_cached_first_stage_keys(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    runner = Runner()
+    first_stage = CachedFirstStage(get_first_stage(), runner, cache_path=path)
+    first_stage.run(query={"id": "q1", "question": "banana"})
+    first_stage.run(query={"id": "q2", "question": "banana"})
+    first_stage.run(query={"id": "q1", "question": "date"})
+    assert runner.calls == 3
+
+    # other corpus or first-stage configuration
+    for kwargs in [{"corpus_fingerprint": "x"}, {"config": {"bm25_k": 1}}]:
+        other = CachedFirstStage(get_first_stage(), runner, cache_path=path, **kwargs)
+        other.run(query={"id": "q1", "question": "banana"})
+    assert runner.calls == 5
+
+
+def test_cached_first_stage_serialization():
+    first_stage = CachedFirstStage(get_first_stage(), Runner(), top_k=5)
+    data = first_stage.to_dict()["init_parameters"]
+    assert data["top_k"] == 5
+    assert "document_joiner" in data["pipeline"]["components"]
+
+
+def test_warm_up_is_not_counted_or_reused(tmp_path):
+    runner = Runner()
+    first_stage = CachedFirstStage(get_first_stage(), runner)
+    pipeline = Pipeline()
+    pipeline.add_component("first_stage", first_stage)
+
+    def pipeline_runner(pipeline, query):
+        result = pipeline.run({"first_stage": {"query": query}})
+        return {"generated_answer": "", "documents": result["first_stage"]["documents"]}
+
+    queries = [{"id": "q1", "question": "banana", "sources": []}]
+    run_experiment(pipeline, pipeline_runner, queries, tmp_path, config={})
+    # warm-up and query are both retrieved, but only the query is counted
+    assert runner.calls == 2
+    with open(tmp_path / "stats.json") as fin:
+        assert json.load(fin)["first_stage"]["misses"] == 1
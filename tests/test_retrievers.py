@@ -0,0 +1,61 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from marcel.benchmark import HEAVY_MODULES, STARTUP_SCRIPT
+from marcel.retrievers import parse_args
+
+SRC = Path(__file__).parent.parent / "src"
+
+
+def test_import_does_not_load_heavy_modules():
+    output = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT % HEAVY_MODULES],
+        env={"PYTHONPATH": str(SRC)},
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    assert json.loads(output.splitlines()[-1])["modules"] == []
+
+
+def test_parse_args():
+    args = parse_args(
+        [
+            "--data_path",
+            "d",
+            "--query_path",
+            "q",
+            "--out_path",
+            "o",
+            "--retrievers",
+            "bm25",
+            "dense",
+        ]
+    )
+    assert args.retrievers == ["bm25", "dense"]
+    assert args.join_weights == [1, 1]
+    assert args.inference_backend == "torch"
+
+
+@pytest.mark.parametrize(
+    "argv",
+    [
+        ["--generation_n", "0"],
+        ["--generation_min_samples", "0"],
+        ["--generation_wave_size", "0"],
+        [
+            "--generation_adaptive",
+            "--generation_n",
+            "2",
+            "--generation_min_samples",
+            "3",
+        ],
+    ],
+)
+def test_parse_args_rejects_invalid_generation_settings(argv):
+    with pytest.raises(SystemExit):
+        parse_args(["--data_path", "d", *argv], require_io=False)
@@ -0,0 +1,81 @@
+import json
+
+from haystack import Document
+
+from marcel.experiment_runner import run_experiment, to_prediction
+from marcel.merge_shards import merge_shards
+from marcel.run_output import (
+    CONTENTS_FILE,
+    load_predictions,
+    output_exists,
+    write_predictions,
+)
+
+
+class FakePipeline:
+    def warm_up(self):
+        pass
+
+    def to_dict(self):
+        return {"components": {}}
+
+    def walk(self):
+        return []
+
+
+def fake_runner(pipeline, query):
+    documents = [
+        Document(content="shared page", meta={"url": "a"}, score=2.0),
+        Document(content=f"page {query['id']}", meta={"url": "b"}, score=1.0),
+    ]
+    return {"generated_answer": "", "documents": documents}
+
+
+def without_duration(run_path):
+    return [
+        {k: v for k, v in prediction.items() if k != "duration"}
+        for prediction in load_predictions(run_path)
+    ]
+
+
+QUERIES = [{"id": i, "question": f"q{i}", "sources": ["a"]} for i in range(4)]
+
+
+def test_round_trip(tmp_path):
+    predictions = [to_prediction(q, fake_runner(None, q), 0.1) for q in QUERIES]
+    write_predictions(tmp_path, predictions, "compact")
+    assert not (tmp_path / "output.json").exists()
+    assert output_exists(tmp_path)
+
+    with open(tmp_path / CONTENTS_FILE) as fin:
+        contents = [json.loads(line)["content"] for line in fin]
+    assert sorted(contents) == ["page 0", "page 1", "page 2", "page 3", "shared page"]
+    assert load_predictions(tmp_path) == predictions
+
+
+def test_run_experiment_compact(tmp_path):
+    def run(run_path, output_format, **kwargs):
+        run_experiment(
+            FakePipeline(),
+            fake_runner,
+            queries=QUERIES,
+            run_path=run_path,
+            config={"output_format": output_format},
+            output_format=output_format,
+            **kwargs,
+        )
+
+    run(tmp_path / "json", "json")
+    run(tmp_path / "compact", "compact")
+    assert without_duration(tmp_path / "compact") == without_duration(tmp_path / "json")
+
+    for index in range(2):
+        run(tmp_path / "sharded", "compact", shard_index=index, shard_count=2)
+    merge_shards(tmp_path / "sharded")
+    assert (tmp_path / "sharded" / "output.jsonl").exists()
+    assert without_duration(tmp_path / "sharded") == without_duration(tmp_path / "json")
+
+    # a finished run is skipped in either format
+    (tmp_path / "compact" / "output.jsonl").write_text("")
+    run(tmp_path / "compact", "json")
+    assert not (tmp_path / "compact" / "output.json").exists()
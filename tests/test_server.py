@@ -0,0 +1,199 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from haystack import Document, Pipeline, component
+
+from marcel.retrievers import get_pipeline, run_pipeline
+from marcel.server import EmbeddingBatcher, QueryBatcher, make_server, parse_args
+
+DOCUMENTS = [
+    Document(content="The semester starts in October.", meta={"url": "a"}),
+    Document(content="Enrollment deadline for master programs.", meta={"url": "b"}),
+    Document(content="The library is open on weekends.", meta={"url": "c"}),
+]
+
+
+def bm25_pipeline():
+    _, config = parse_args(["--", "--data_path", "d", "--retrievers", "bm25"])
+    config.top_k = 2
+    return get_pipeline(DOCUMENTS, [], config)
+
+
+@pytest.fixture
+def server():
+    batcher = QueryBatcher(bm25_pipeline(), run_pipeline, max_batch_wait=0.05)
+    server = make_server(batcher, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+    batcher.close()
+
+
+def post(url, body):
+    request = urllib.request.Request(url, data=json.dumps(body).encode())
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def test_retrieve_matches_run_pipeline(server):
+    query = {"id": 1, "question": "When does the semester start?", "sources": ["a"]}
+    prediction = post(server + "/retrieve", query)
+    expected = run_pipeline(bm25_pipeline(), query)
+
+    assert prediction["id"] == 1
+    assert "generated_answer" not in prediction
+    assert [c["url"] for c in prediction["contexts"]] == [
+        doc.meta["url"] for doc in expected["documents"]
+    ]
+
+
+def test_concurrent_requests_are_batched(server):
+    questions = ["semester start", "library weekends", "semester start"] * 4
+    with ThreadPoolExecutor(len(questions)) as pool:
+        predictions = list(
+            pool.map(lambda q: post(server + "/retrieve", {"question": q}), questions)
+        )
+    assert [p["contexts"][0]["url"] for p in predictions] == ["a", "c", "a"] * 4
+
+    with urllib.request.urlopen(server + "/stats") as response:
+        stats = json.loads(response.read())["server"]
+    assert stats["requests"] == len(questions)
+    assert stats["batches"] < len(questions)
+    assert stats["coalesced"] > 0
+
+
+def test_invalid_requests(server):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        post(server + "/retrieve", {"text": "no question"})
+    assert error.value.code == 400
+    with pytest.raises(urllib.error.HTTPError) as error:
+        post(server + "/rag", {"question": "semester"})  # no generator
+    assert error.value.code == 400
+
+
+def serve(batcher):
+    server = make_server(batcher, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def test_pipeline_errors_are_reported():
+    def failing_runner(pipeline, query):
+        return {"generated_answer": "", "documents": [], "error": "LLM down"}
+
+    batcher = QueryBatcher(bm25_pipeline(), failing_runner)
+    server, url = serve(batcher)
+    try:
+        with pytest.raises(urllib.error.HTTPError) as error:
+            post(url + "/retrieve", {"question": "semester"})
+        assert error.value.code == 500
+        assert "LLM down" in json.loads(error.value.read())["error"]
+    finally:
+        server.shutdown()
+        server.server_close()
+        batcher.close()
+
+
+def test_queries_run_concurrently():
+    def slow_runner(pipeline, query):
+        time.sleep(0.3)  # e.g., waiting for the LLM
+        return run_pipeline(pipeline, query)
+
+    batcher = QueryBatcher(bm25_pipeline(), slow_runner, max_batch_size=2)
+    server, url = serve(batcher)
+    questions = ["semester start", "library weekends", "enrollment", "master"]
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(len(questions)) as pool:
+            predictions = list(
+                pool.map(lambda q: post(url + "/retrieve", {"question": q}), questions)
+            )
+        assert time.perf_counter() - start < 0.3 * len(questions) / 2
+        assert [p["contexts"][0]["url"] for p in predictions] == ["a", "c", "b", "b"]
+    finally:
+        server.shutdown()
+        server.server_close()
+        batcher.close()
+
+
+@component
+class FakeTextEmbedder:
+    def __init__(self):
+        self.prefix, self.suffix = "", ""
+        self.batch_size = 32
+        self.normalize_embeddings = False
+        self.precision = "float32"
+        self.encode_kwargs = None
+        self.embedding_backend = self
+        self.calls = []
+
+    def embed(self, texts, **kwargs):
+        self.calls.append(texts)
+        return [[float(len(text))] for text in texts]
+
+    @component.output_types(embedding=list)
+    def run(self, text: str):
+        return {"embedding": self.embed([text])[0]}
+
+
+def test_embedding_batcher():
+    embedder = FakeTextEmbedder()
+    pipeline = Pipeline()
+    pipeline.add_component("dense_embedder", embedder)
+    batcher = EmbeddingBatcher(pipeline)
+    assert batcher.embedders == [embedder]
+
+    batcher.prime(["a", "bb", "a"])
+    assert embedder.calls == [["a", "bb"]]
+    result = pipeline.run({"dense_embedder": {"text": "bb"}})
+    assert np.allclose(result["dense_embedder"]["embedding"], [2.0])
+    assert len(embedder.calls) == 1  # looked up
+
+    pipeline.run({"dense_embedder": {"text": "ccc"}})
+    assert embedder.calls[-1] == ["ccc"]
+
+
+def test_retrieve_sends_no_llm_requests(monkeypatch):
+    from marcel.mock_llm import MockLLM, start_server
+    from marcel.server import get_pipelines
+
+    mock = MockLLM(ttft_ms=1, tokens_per_second=0)
+    llm_server, base_url = start_server(mock)
+    monkeypatch.setenv("OPENAI_BASE_URL", base_url)
+    monkeypatch.setenv("OPENAI_API_KEY", "mock")
+    argv = ["--", "--data_path", "d", "--retrievers", "bm25", "--top_k", "2"]
+    _, config = parse_args(argv + ["--use_generator", "--generation_model", "m"])
+    pipeline, retrieval_pipeline = get_pipelines(DOCUMENTS, [], config)
+    batcher = QueryBatcher(pipeline, run_pipeline)
+    retrieval_batcher = QueryBatcher(retrieval_pipeline, run_pipeline)
+    server = make_server(batcher, port=0, retrieval_batcher=retrieval_batcher)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        prediction = post(url + "/retrieve", {"question": "semester start"})
+        assert prediction["contexts"][0]["url"] == "a"
+        assert mock.stats()["requests"] == 0
+
+        prediction = post(url + "/rag", {"question": "semester start"})
+        assert prediction["generated_answer"]
+        assert mock.stats()["requests"] == config.generation_n
+        with urllib.request.urlopen(url + "/stats") as response:
+            stats = json.loads(response.read())
+        assert stats["retrieval_server"]["requests"] == 1
+        assert stats["server"]["requests"] == 1
+    finally:
+        server.shutdown()
+        server.server_close()
+        batcher.close()
+        retrieval_batcher.close()
+        llm_server.shutdown()
+        llm_server.server_close()
@@ -0,0 +1,159 @@
+import json
+
+import numpy as np
+import pytest
+from haystack.components.rankers import sentence_transformers_similarity
+
+from marcel import sweep
+from marcel.benchmark import write_synthetic_data
+from marcel.sweep import expand_grid, main, parse_args, share_models
+
+
+def test_expand_grid():
+    _, base = parse_args(
+        ["--grid", "g", "--out_dir", "o", "--", "--data_path", "d", "--query_path", "q"]
+    )
+    configs = expand_grid(
+        [
+            {"top_k": [5, 10], "reranker_model": ["org/tiny"]},
+            {"retrievers": [["bm25", "dense"]]},
+        ],
+        base,
+    )
+    assert [run_id for run_id, _ in configs] == [
+        "top_k-5_reranker_model-org-tiny",
+        "top_k-10_reranker_model-org-tiny",
+        "retrievers-bm25+dense",
+    ]
+    assert configs[1][1].top_k == 10
+    assert configs[2][1].join_weights == [1, 1]
+    assert base.top_k == 50  # not modified
+
+    configs = expand_grid({"top_k": [5]}, base, run_id="bm25_k{top_k}")
+    assert configs[0][0] == "bm25_k5"
+
+    with pytest.raises(ValueError):
+        expand_grid({"top_kk": [5]}, base)
+    with pytest.raises(ValueError):
+        expand_grid({"top_k": [5, 10]}, base, run_id="same")
+    with pytest.raises(ValueError):
+        expand_grid({"inference_backend": ["torch", "torch_qint8"]}, base)
+
+
+class FakeCrossEncoder:
+    loads = 0
+
+    def __init__(self, *args, **kwargs):
+        FakeCrossEncoder.loads += 1
+
+    def predict(self, pairs, **kwargs):
+        return np.array([float(len(text)) for _, text in pairs])
+
+
+class FakeRanker:
+    def __init__(self, model):
+        self.model = model
+        self._cross_encoder = None
+        self.loads = 0
+
+    def warm_up(self):
+        if self._cross_encoder is None:
+            self.loads += 1
+            self._cross_encoder = FakeCrossEncoder()
+
+    def run(self):
+        pass
+
+
+class FakePipeline:
+    def __init__(self, **components):
+        self.components = components
+        self.graph = type("Graph", (), {"nodes": list(components)})()
+
+    def get_component(self, name):
+        return self.components[name]
+
+    def warm_up(self):
+        for component in self.components.values():
+            component.warm_up()
+
+
+def test_share_models():
+    models = {}
+    first, second, other = FakeRanker("a"), FakeRanker("a"), FakeRanker("b")
+    share_models(FakePipeline(reranker=first), models, "torch")
+    share_models(FakePipeline(reranker=second, other=other), models, "torch")
+
+    assert first._cross_encoder is second._cross_encoder
+    assert (first.loads, second.loads, other.loads) == (1, 0, 1)
+    assert len(models) == 2
+
+
+def test_main(tmp_path, monkeypatch):
+    paths = write_synthetic_data(tmp_path / "data", n_docs=30, n_queries=4, n_faqs=0)
+    grid_path = tmp_path / "grid.json"
+    grid_path.write_text(json.dumps({"top_k": [3, 5], "bm25_k": [10]}))
+
+    stores = []
+    get_document_store = sweep.get_document_store
+
+    def counting_get_document_store(documents, config):
+        stores.append(config.top_k)
+        return get_document_store(documents, config)
+
+    monkeypatch.setattr(sweep, "get_document_store", counting_get_document_store)
+    argv = [
+        "--grid", str(grid_path),
+        "--out_dir", str(tmp_path / "out"),
+        "--run_id", "bm25_k{top_k}",
+        "--",
+        "--data_path", str(paths["data_path"]),
+        "--query_path", str(paths["query_path"]),
+        "--retrievers", "bm25",
+    ]  # fmt: skip
+    main(*parse_args(argv))
+
+    assert len(stores) == 1  # shared by both runs
+    for top_k in [3, 5]:
+        run_path = tmp_path / "out" / f"bm25_k{top_k}"
+        predictions = json.loads((run_path / "output.json").read_text())
+        assert len(predictions) == 4
+        assert all(len(p["contexts"]) == top_k for p in predictions)
+        config = json.loads((run_path / "config.json").read_text())
+        assert config["run_id"] == f"bm25_k{top_k}"
+        assert config["out_path"] == str(run_path)
+
+    # existing runs are skipped
+    monkeypatch.setattr(sweep, "get_document_store", None)
+    main(*parse_args(argv))
+
+
+def test_main_shares_cached_rankers(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(
+        sentence_transformers_similarity, "CrossEncoder", FakeCrossEncoder
+    )
+    monkeypatch.setattr(FakeCrossEncoder, "loads", 0)
+    paths = write_synthetic_data(tmp_path / "data", n_docs=30, n_queries=4, n_faqs=0)
+    grid_path = tmp_path / "grid.json"
+    grid_path.write_text(json.dumps({"top_k": [3, 4, 5]}))
+    argv = [
+        "--grid", str(grid_path),
+        "--out_dir", str(tmp_path / "out"),
+        "--run_id", "rerank_k{top_k}",
+        "--max_workers", "3",
+        "--",
+        "--data_path", str(paths["data_path"]),
+        "--query_path", str(paths["query_path"]),
+        "--retrievers", "bm25",
+        "--use_reranker", "--reranker_model", "org/fake",
+        "--reranker_cache_path", str(tmp_path / "reranker_scores.sqlite"),
+    ]  # fmt: skip
+    main(*parse_args(argv))
+
+    # loaded once before the runs start, not on the first cache miss of every run
+    assert FakeCrossEncoder.loads == 1
+    assert "cross-encoders = 1" in capsys.readouterr().out
+    for top_k in [3, 4, 5]:
+        run_path = tmp_path / "out" / f"rerank_k{top_k}"
+        predictions = json.loads((run_path / "output.json").read_text())
+        assert all(len(p["contexts"]) == top_k for p in predictions)